@@ -22,15 +22,24 @@ import subprocess
 import shutil
 import webbrowser
 import base64
+import struct
+import errno
+import asyncio
+import multiprocessing
+import math
+import weakref
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Callable
 from pathlib import Path
+from abc import ABC, abstractmethod
 import socketserver
 import ssl
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.exceptions import InvalidTag
 import psutil
 import requests
 from rich.console import Console
@@ -44,7 +53,14 @@ import pytz
 import pkg_resources
 from packaging import version
 import ipaddress
+import itertools
 import queue
+import select
+import selectors
+import tracemalloc
+from collections import deque, OrderedDict
+from array import array
+import concurrent.futures
 import unittest
 from flask import Flask, request, redirect, flash, render_template_string, send_from_directory, jsonify
 from flask_socketio import SocketIO
@@ -117,10 +133,88 @@ CONFIG = {
     "LOCALES": ["United States", "Canada", "United Kingdom", "Germany", "France"],
     "MIN_SPEED_KBPS": 56,
     "MAX_BANDWIDTH_KBPS": 1000,
+    "MAX_CONNECTION_KBPS": 1000,    # Ceiling for one connection; MIN_SPEED_KBPS is its guaranteed floor
+    "CHAIN_BANDWIDTH_KBPS": 5000,   # Ceiling for all the chain's nodes together
     "RATE_LIMIT": 100,
-    "HEALTH_CHECK_INTERVAL": 30
+    "CLIENT_RATE_LIMIT": 50,       # Requests per minute from one client address
+    "DESTINATION_RATE_LIMIT": 100,  # Requests per minute to one destination host
+    "RATE_LIMIT_KEYS": 4096,       # Clients (and destinations) tracked before the least recent is evicted
+    "HEALTH_CHECK_INTERVAL": 30,
+    "NODE_ENGINE": "threaded",
+    "CIPHER": "fernet",
+    "HOP_POOL_SIZE": 2,           # Warm TLS links each node keeps to its successor (0 disables)
+    "HOP_POOL_MAX_SIZE": 8,
+    "HOP_POOL_IDLE_TIMEOUT": 60,  # Seconds before an unused warm link is evicted
+    "MUX": True,                  # Multiplex streams over one link between asyncio nodes
+    "INTERACTIVE_PORTS": [22, 23, 53, 3389, 5222, 5900, 6667],  # Destinations whose streams are scheduled as interactive
+    "MUX_WINDOW": 262144,         # Per-stream receive window on multiplexed links (bytes)
+    "DNS_CACHE_SIZE": 1024,       # Host names cached by an exit node
+    "DNS_CACHE_TTL": 300,         # Longest time a resolved name is cached (seconds)
+    "DNS_NEGATIVE_TTL": 30,       # Time a failed lookup is cached (seconds)
+    "EXIT_ATTEMPT_DELAY": 0.25,   # Seconds before an exit node races the next address (RFC 8305)
+    "EXIT_CONNECT_TIMEOUT": 5,
+    "MAX_HANDLERS": 256,          # Connections a node serves at once
+    "ACCEPT_BACKLOG": 128,        # Connections waiting for a handler before new ones are refused
+    "RELAY_BUFFER_MIN": 4096,     # Read size a relayed connection starts at (bytes)
+    "RELAY_BUFFER_MAX": 262144,   # Read size sustained bulk transfers grow to (bytes)
+    "HANDSHAKE_TIMEOUT": 10,      # Seconds a connection may take to send its SOCKS5 request or CONNECT frame
+    "CONNECT_TIMEOUT": 30,        # Seconds to reach the destination through the rest of the chain
+    "IDLE_TIMEOUT": 300,          # Seconds a connection or tunnel may pass no traffic
+    "TIMER_TICK": 0.1,            # Timer wheel resolution (seconds)
+    "UDP_BATCH": 64,              # Datagrams drained from a UDP socket per read pass
+    "LINK_EMULATION": False,      # Delay traffic between nodes as if over the distance between their locales
+    "LINK_JITTER_MS": 2.0,        # Standard deviation of emulated link delay
+    "LINK_LOSS": 0.001,           # Share of emulated link chunks lost (and retransmitted)
+    "NODE_WORKERS": 1,            # Processes serving each node's port with SO_REUSEPORT (1 disables)
+    "CHAIN_RUNTIME": "per-node",  # "per-node": own threads per node; "shared": one event loop for the chain
+    "SOCKET_PROFILE": "interactive"  # TCP options for listeners, hop links and exit connections (a SOCKET_PROFILES name)
 }
 
+# Data plane implementations a chain can run its nodes on
+NODE_ENGINES = ("threaded", "asyncio")
+CHAIN_RUNTIMES = ("per-node", "shared")
+
+# Inter-node frames: type (1 byte), payload length (4 bytes, big-endian), payload
+FRAME_HEADER = struct.Struct("!BI")
+FRAME_CONNECT = 0x10  # Encrypted SOCKS5 CONNECT request for the next node
+FRAME_REPLY = 0x11    # Encrypted SOCKS5 reply travelling back toward the client
+FRAME_DATA = 0x12     # Encrypted relay payload
+FRAME_EOF = 0x13      # Sender has no more DATA for this direction (half-close)
+FRAME_MUX_HELLO = 0x14   # Opens a multiplexed link; carries the sender's per-stream window
+FRAME_MUX_OPEN = 0x15    # New stream on a multiplexed link; carries its SOCKS5 CONNECT request
+FRAME_MUX_REPLY = 0x16   # SOCKS5 reply for a multiplexed stream
+FRAME_MUX_DATA = 0x17    # Stream payload
+FRAME_MUX_EOF = 0x18     # Stream half-close
+FRAME_MUX_WINDOW = 0x19  # Flow-control credit: receiver consumed this many more stream bytes
+FRAME_MUX_RESET = 0x1A   # Stream aborted
+FRAME_UDP = 0x1B         # Batch of datagrams on a UDP ASSOCIATE circuit (see pack_datagrams)
+FRAME_TYPES = (FRAME_CONNECT, FRAME_REPLY, FRAME_DATA, FRAME_EOF, FRAME_MUX_HELLO, FRAME_MUX_OPEN,
+               FRAME_MUX_REPLY, FRAME_MUX_DATA, FRAME_MUX_EOF, FRAME_MUX_WINDOW, FRAME_MUX_RESET, FRAME_UDP)
+FRAME_MAX_PAYLOAD = 16 * 1024 * 1024
+SOCKS_ATYP_IPV4 = 1
+SOCKS_ATYP_DOMAIN = 3
+SOCKS_ATYP_IPV6 = 4
+SOCKS_ADDRESS_TYPES = (SOCKS_ATYP_IPV4, SOCKS_ATYP_DOMAIN, SOCKS_ATYP_IPV6)
+SOCKS_REFUSED = b"\x05\x05\x00\x01" + b"\x00" * 6  # Sent at once to connections a saturated node cannot serve
+SOCKS_METHOD_NO_AUTH = 0
+SOCKS_HANDSHAKE_READ = 4096  # Largest read while parsing a SOCKS5 greeting and request
+SOCKS_CMD_CONNECT = 1
+SOCKS_CMD_UDP_ASSOCIATE = 3
+SOCKS_UDP_ASSOCIATE_REQUEST = b"\x05\x03\x00\x01" + b"\x00" * 6  # Forwarded between nodes; only the exit binds sockets
+UDP_DATAGRAM = struct.Struct("!H")  # Length of each datagram in a FRAME_UDP batch
+UDP_DATAGRAM_MAX = 0xFFFF  # Largest address plus data a batch length can describe
+MUX_STREAM = struct.Struct("!I")         # Stream id leading every multiplexed frame's plaintext
+MUX_WINDOW_UPDATE = struct.Struct("!I")  # Window size (HELLO) or credit (WINDOW)
+MUX_CHUNK = 16384                        # Largest DATA frame, so no stream hogs the link
+MUX_BATCH = 256 * 1024                   # Stream bytes written per link writer pass
+MUX_HIGH_WATER = 1024 * 1024             # Queued bytes per link before writers wait
+SCHEDULING_CLASSES = {"interactive": 2, "default": 1}  # Link share weight of each stream class
+EARTH_RADIUS_KM = 6371.0
+FIBRE_KM_PER_S = 200000.0      # Light in optical fibre, about two thirds of c
+ROUTE_STRETCH = 1.3            # Cable routes are longer than the great circle
+LINK_RTO_MIN = 0.2             # Least retransmission timeout a lost chunk costs (Linux TCP's minimum)
+LINK_EMULATION_HOLD = 1024 * 1024  # Bytes a stream may have in flight on an emulated link
+
 # IoT manufacturer OUIs for realistic MAC addresses
 IOT_OUIS = [
     "00:0D:3F",  # Samsung (Smart Fridge, Smart TV)
@@ -339,31 +433,78 @@ class ProxyNode:
         locale (Dict): Locale information (country, timezone, etc.).
         virtual_ip (str): Virtual IP address.
         virtual_mac (str): Virtual MAC address.
-        server (socketserver.ThreadingTCPServer): TCP server instance.
+        server (AdmissionTCPServer): TCP server instance.
+        prev_node (Optional[ProxyNode]): Previous node in the chain, set when it starts.
+        hop_pool (Optional[HopConnectionPool]): Warm links to the next node, while running.
+        hop_pool_size (int): Minimum warm links kept to the next node (0 disables pooling).
+        mux (bool): Multiplex streams over one link when the next node runs the asyncio engine.
+        mux_window (int): Per-stream receive window advertised on multiplexed links.
+        relay_buffer_max (int): Largest read size a relayed connection grows to.
+        udp_batch (int): Most datagrams drained from a UDP socket per read pass.
+        engine (str): Data plane implementation ("threaded" or "asyncio").
+        cipher (str): Session cipher for links this node opens (a SESSION_CIPHERS name).
+        socket_profile (str): TCP options for the node's sockets (a SOCKET_PROFILES name).
+        async_engine (Optional[AsyncNodeEngine]): asyncio data plane when engine is "asyncio".
+        server_context (Optional[SSLContext]): Listener context, built on first use.
+        client_context (Optional[HopTLSContext]): Context for links to the next node, built on first use.
+        dns_cache (DNSCache): Resolver cache for domain-name destinations when this is the exit node.
+        exit_connector (ExitConnector): Races destination addresses and records connect latency when this is the exit node.
+        workers (int): Worker processes to serve the port with (1 serves it in this process).
+        worker_pool (Optional[NodeWorkers]): Running worker processes.
+        worker_index (Optional[int]): This process's index when it is one of the node's workers.
+        runtime (Optional[ChainRuntime]): Shared event loop hosting the node, in place of its own threads.
+        admission (AdmissionControl): Caps concurrent connection handlers and queues or refuses the rest.
+        timeouts (Dict[str, float]): Handshake, connect and idle deadlines for inbound connections, in seconds.
         active (bool): Node status.
         stats (Dict): Performance statistics.
         fernet (Fernet): Symmetric encryption instance.
         rsa_private_key (RSAPrivateKey): RSA private key.
         rsa_public_key (RSAPublicKey): RSA public key.
         rate_limit (int): Maximum requests per minute.
-        request_timestamps (Queue): Timestamps of recent requests.
-        bandwidth_limit_kbps (float): Bandwidth limit in kbps.
-        bucket_tokens (float): Current tokens in bandwidth bucket.
-        bucket_capacity (float): Maximum tokens in bandwidth bucket.
-        last_refill (float): Last bucket refill time.
+        rate_limiter (SlidingWindowLimiter): Request admission for `rate_limit`, rebuilt when the limit changes.
+        client_limits (RateLimitTable): Per-client-address request limits.
+        destination_limits (RateLimitTable): Per-destination-host request limits.
+        bandwidth (ShapingClass): The node's class in the chain's traffic shaper; each connection opens a flow on it.
+        interactive_ports (set): Destination ports whose multiplexed streams are scheduled as interactive.
+        link_emulation (bool): Whether traffic to adjacent nodes is delayed as if over the distance between locales.
+        link_jitter (float): Standard deviation of the emulated delay (seconds).
+        link_loss (float): Share of emulated link chunks lost.
+        emulators (Dict[int, LinkEmulator]): Emulated links to adjacent nodes, by their port.
+        scheduling (Dict[str, LatencySamples]): Time frames waited in multiplexed link schedulers, by stream class.
         lock (Lock): Threading lock for synchronization.
         health_check_thread (Thread): Thread for health checks.
         running (Event): Event to control health check loop.
         timezone (tzinfo): Timezone for locale-specific timestamps.
         health_check_interval (int): Interval for health checks in seconds.
     """
-    def __init__(self, host: str, port: int, locale: Dict, virtual_ip: str, virtual_mac: str, health_check_interval: int = 30):
+    def __init__(self, host: str, port: int, locale: Dict, virtual_ip: str, virtual_mac: str, health_check_interval: int = 30, engine: str = "threaded", cipher: str = "fernet"):
         self.host = host
         self.port = port
         self.locale = locale
         self.virtual_ip = virtual_ip
         self.virtual_mac = virtual_mac
         self.server = None
+        self.prev_node = None
+        self.hop_pool = None
+        self.hop_pool_size = CONFIG["HOP_POOL_SIZE"]
+        self.mux = CONFIG["MUX"]
+        self.mux_window = CONFIG["MUX_WINDOW"]
+        self.relay_buffer_max = CONFIG["RELAY_BUFFER_MAX"]
+        self.udp_batch = CONFIG["UDP_BATCH"]
+        self.engine = engine if engine in NODE_ENGINES else CONFIG["NODE_ENGINE"]
+        self.cipher = cipher if cipher in SESSION_CIPHERS else CONFIG["CIPHER"]
+        self.socket_profile = CONFIG["SOCKET_PROFILE"]
+        self.async_engine = None
+        self.server_context = None
+        self.client_context = None
+        self.dns_cache = DNSCache()
+        self.exit_connector = ExitConnector()
+        self.workers = CONFIG["NODE_WORKERS"]
+        self.worker_pool = None
+        self.worker_index = None
+        self.runtime = None
+        self.admission = AdmissionControl()
+        self.timeouts = {"handshake": CONFIG["HANDSHAKE_TIMEOUT"], "connect": CONFIG["CONNECT_TIMEOUT"], "idle": CONFIG["IDLE_TIMEOUT"]}
         self.active = False
         self.stats = {
             "requests": 0,
@@ -372,7 +513,12 @@ class ProxyNode:
             "latency": 0.0,
             "errors": 0,
             "connection_time": 0.0,
-            "bandwidth_kbps": 0.0
+            "bandwidth_kbps": 0.0,
+            "dns_hit_rate": 0.0,
+            "rejected": 0,
+            "queue_ms": 0.0,
+            "reaped": 0,
+            "datagrams": 0
         }
         key_file = CERT_DIR / f"fernet_{port}.key"
         try:
@@ -391,11 +537,20 @@ class ProxyNode:
         self.rsa_private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
         self.rsa_public_key = self.rsa_private_key.public_key()
         self.rate_limit = CONFIG["RATE_LIMIT"]
-        self.request_timestamps = queue.Queue()
-        self.bandwidth_limit_kbps = CONFIG["MAX_BANDWIDTH_KBPS"]
-        self.bucket_tokens = self.bandwidth_limit_kbps * 1000 / 8  # Bytes per second
-        self.bucket_capacity = self.bucket_tokens
-        self.last_refill = time.time()
+        self.rate_limiter = SlidingWindowLimiter(self.rate_limit)
+        self.interactive_ports = set(CONFIG["INTERACTIVE_PORTS"])
+        self.link_emulation = CONFIG["LINK_EMULATION"]
+        self.link_jitter = CONFIG["LINK_JITTER_MS"] / 1000
+        self.link_loss = CONFIG["LINK_LOSS"]
+        self.emulators = {}
+        self.scheduling = {traffic_class: LatencySamples() for traffic_class in SCHEDULING_CLASSES}
+        self.client_limits = RateLimitTable(CONFIG["CLIENT_RATE_LIMIT"])
+        self.destination_limits = RateLimitTable(CONFIG["DESTINATION_RATE_LIMIT"])
+        self.bandwidth = ShapingClass(
+            CONFIG["MAX_BANDWIDTH_KBPS"] * 1000 / 8,
+            flow_min_rate=CONFIG["MIN_SPEED_KBPS"] * 1000 / 8,
+            flow_max_rate=CONFIG["MAX_CONNECTION_KBPS"] * 1000 / 8
+        )
         self.lock = threading.Lock()
         self.health_check_thread = None
         self.running = threading.Event()
@@ -448,12 +603,12 @@ class ProxyNode:
         try:
             encrypted_data = self.fernet.encrypt(data)
             if next_node:
-                full_raw_key = base64.urlsafe_b64decode(self.fernet._encryption_key + self.fernet._signing_key)
+                full_raw_key = self.fernet._signing_key + self.fernet._encryption_key
                 encrypted_key = next_node.rsa_public_key.encrypt(
                     full_raw_key,
                     padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
                 )
-                return encrypted_key + b"||" + encrypted_data
+                return len(encrypted_key).to_bytes(2, 'big') + encrypted_key + encrypted_data
             return encrypted_data
         except Exception as e:
             logging.error(f"Encryption error in node {self.port}: {e}")
@@ -475,8 +630,9 @@ class ProxyNode:
             Exception: If decryption fails.
         """
         try:
-            if prev_node and b"||" in data:
-                encrypted_key, encrypted_data = data.split(b"||", 1)
+            if prev_node:
+                key_length = int.from_bytes(data[:2], 'big')
+                encrypted_key, encrypted_data = data[2:2 + key_length], data[2 + key_length:]
                 fernet_key = self.rsa_private_key.decrypt(
                     encrypted_key,
                     padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
@@ -490,6 +646,47 @@ class ProxyNode:
             self.stats["errors"] += 1
             return data
 
+    def create_session(self, next_node: 'ProxyNode') -> Tuple['SessionCipher', bytes]:
+        """
+        Generate a per-circuit session key for the link to the next node.
+
+        Args:
+            next_node (ProxyNode): Node the session key is wrapped for.
+
+        Returns:
+            Tuple[SessionCipher, bytes]: Session cipher (this node's configured cipher) and
+            the key RSA-wrapped with next_node's public key.
+        """
+        session_key = os.urandom(32)
+        wrapped_key = next_node.rsa_public_key.encrypt(
+            session_key,
+            padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
+        )
+        return SESSION_CIPHERS[self.cipher](session_key, initiator=True), wrapped_key
+
+    def accept_session(self, cipher_id: int, wrapped_key: bytes) -> 'SessionCipher':
+        """
+        Unwrap a session key sent by the previous node.
+
+        Args:
+            cipher_id (int): Cipher chosen by the previous node.
+            wrapped_key (bytes): Session key RSA-wrapped with this node's public key.
+
+        Returns:
+            SessionCipher: Session cipher for the link.
+
+        Raises:
+            ValueError: If the cipher is unknown or the key cannot be unwrapped.
+        """
+        cipher = next((c for c in SESSION_CIPHERS.values() if c.cipher_id == cipher_id), None)
+        if not cipher:
+            raise ValueError(f"Unknown session cipher {cipher_id}")
+        session_key = self.rsa_private_key.decrypt(
+            wrapped_key,
+            padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()), algorithm=hashes.SHA256(), label=None)
+        )
+        return cipher(session_key, initiator=False)
+
     def check_rate_limit(self) -> bool:
         """
         Check if the node is within the rate limit.
@@ -497,61 +694,184 @@ class ProxyNode:
         Returns:
             bool: True if within rate limit, False otherwise.
         """
-        with self.lock:
-            current_time = time.time()
-            while not self.request_timestamps.empty() and self.request_timestamps.qsize() > self.rate_limit:
-                self.request_timestamps.get()
-            while not self.request_timestamps.empty():
-                if current_time - self.request_timestamps.queue[0] > 60:
-                    self.request_timestamps.get()
-                else:
-                    break
-            self.request_timestamps.put(current_time)
-            return self.request_timestamps.qsize() <= self.rate_limit
+        limiter = self.rate_limiter
+        if limiter.limit != self.rate_limit:
+            limiter = self.rate_limiter = SlidingWindowLimiter(self.rate_limit)
+        return limiter.allow()
+
+    def check_keyed_limits(self, client: str, destination: Optional[str] = None) -> bool:
+        """
+        Check a client request against the per-client and per-destination rate limits.
+
+        A request the client's limit refuses is not counted against the
+        destination, so one noisy client cannot use up a destination's
+        allowance for everyone else.
+
+        Args:
+            client (str): Client IP address.
+            destination (Optional[str]): Requested host, or None when there is none (UDP ASSOCIATE).
+
+        Returns:
+            bool: True if both limits allow the request, False otherwise.
+        """
+        if not self.client_limits.allow(client):
+            logging.warning(f"Node {self.port} rate limit exceeded for client {client}")
+            return False
+        if destination is not None and not self.destination_limits.allow(destination.lower()):
+            logging.warning(f"Node {self.port} rate limit exceeded for destination {destination}")
+            return False
+        return True
+
+    def traffic_class(self, request: bytes) -> str:
+        """
+        Scheduling class of a stream, from the destination port of its CONNECT request.
 
-    def refill_bucket(self):
-        """Refill token bucket based on elapsed time."""
-        now = time.time()
-        elapsed = now - self.last_refill
-        self.bucket_tokens = min(self.bucket_capacity, self.bucket_tokens + elapsed * (self.bandwidth_limit_kbps * 1000 / 8))
-        self.last_refill = now
+        Args:
+            request (bytes): SOCKS5 CONNECT request opening the stream.
+
+        Returns:
+            str: "interactive" for a port in `interactive_ports`, "default" otherwise.
+        """
+        try:
+            port = parse_socks_address(request[3:])[1]
+        except ValueError:
+            return "default"
+        return "interactive" if port in self.interactive_ports else "default"
+
+    def link_emulator(self, peer: Optional['ProxyNode']) -> Optional['LinkEmulator']:
+        """
+        The emulated link to an adjacent node.
+
+        Args:
+            peer (Optional[ProxyNode]): Previous or next node; None for a client or destination.
+
+        Returns:
+            Optional[LinkEmulator]: The link, or None when link emulation is off or there is no peer.
+        """
+        if not self.link_emulation or peer is None:
+            return None
+        emulator = self.emulators.get(peer.port)
+        if emulator is None:
+            emulator = self.emulators[peer.port] = LinkEmulator(self.locale, peer.locale, self.link_jitter, self.link_loss)
+        return emulator
 
     def throttle_bandwidth(self, data_size: int) -> float:
         """
-        Simulate bandwidth throttling using token bucket.
+        Reserve bandwidth and block the calling thread until it is available; no lock is held while waiting.
 
         Args:
             data_size (int): Size of data to transmit in bytes.
 
         Returns:
-            float: Time taken for throttling.
+            float: Seconds spent waiting.
+        """
+        wait = self.bandwidth.reserve(data_size)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def account_upstream(self, data_size: int, flow: Optional['ShapedFlow'] = None) -> float:
+        """
+        Record bytes relayed toward the target and reserve bandwidth for them.
+
+        Args:
+            data_size (int): Size of the outgoing chunk in bytes.
+            flow (Optional[ShapedFlow]): The connection's flow; the node's own otherwise.
+
+        Returns:
+            float: Seconds the relay should pause before reading more.
         """
         with self.lock:
-            self.refill_bucket()
-            if data_size > self.bucket_tokens:
-                sleep_time = (data_size - self.bucket_tokens) / (self.bandwidth_limit_kbps * 1000 / 8)
-                time.sleep(sleep_time)
-                self.bucket_tokens = 0
-            else:
-                self.bucket_tokens -= data_size
-            return time.time() - self.last_refill
+            self.stats["bytes_sent"] += data_size
+            self.stats["bandwidth_kbps"] = (data_size * 8 / 1000) / max(self.stats["latency"], 0.001)
+        return (flow or self.bandwidth).reserve(data_size)
+
+    def account_downstream(self, data_size: int) -> float:
+        """
+        Record bytes relayed back toward the client.
+
+        Args:
+            data_size (int): Size of the incoming chunk in bytes.
+
+        Returns:
+            float: Seconds the relay should pause (downstream is not throttled).
+        """
+        with self.lock:
+            self.stats["bytes_received"] += data_size
+        return 0.0
+
+    def reserve_bandwidth(self, data_size: int) -> float:
+        """
+        Reserve bandwidth without blocking, for callers that wait on their own.
+
+        Args:
+            data_size (int): Size of data to transmit in bytes.
+
+        Returns:
+            float: Seconds the caller must wait before transmitting.
+        """
+        return self.bandwidth.reserve(data_size)
+
+    def tls_contexts(self) -> Tuple[ssl.SSLContext, 'HopTLSContext']:
+        """
+        Get the node's server and client SSL contexts, building them on first use.
+
+        The contexts outlive restarts, so the certificate is loaded once and
+        session tickets issued by the server context stay valid.
+
+        Returns:
+            Tuple[SSLContext, HopTLSContext]: Listener context and next-hop client context.
+        """
+        with self.lock:
+            if not self.server_context:
+                self.server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+                self.server_context.load_cert_chain(certfile=CERT_FILE, keyfile=KEY_FILE)
+                self.client_context = HopTLSContext(ssl.PROTOCOL_TLS_CLIENT)
+                self.client_context.check_hostname = False
+                self.client_context.verify_mode = ssl.CERT_NONE
+            return self.server_context, self.client_context
+
+    def resolve_destination(self, dest: bytes) -> Tuple[str, List[str], int]:
+        """
+        Resolve a SOCKS5 destination to candidate addresses, blocking the calling thread.
+
+        Args:
+            dest (bytes): Destination (ATYP, DST.ADDR, DST.PORT).
+
+        Returns:
+            Tuple[str, List[str], int]: Requested host, addresses to try in order, and the port.
+
+        Raises:
+            ValueError: If the destination is malformed.
+            OSError: If a domain name does not resolve.
+        """
+        host, port = parse_socks_address(dest)
+        if dest[0] != SOCKS_ATYP_DOMAIN:
+            return host, [host], port
+        try:
+            return host, self.dns_cache.lookup(host), port
+        finally:
+            self.stats["dns_hit_rate"] = self.dns_cache.stats["hit_rate"]
 
     def health_check(self):
-        """Periodically check node health and restart if necessary."""
-        while self.running.is_set():
+        """Periodically check node health and restart if necessary; a restart hands over to the new start's thread."""
+        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        while self.running.is_set() and self.health_check_thread is threading.current_thread():
             try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                    s.settimeout(2)
-                    s.connect((self.host, self.port))
+                with context.wrap_socket(socket.create_connection((self.host, self.port), timeout=2), server_hostname=self.host) as s:
                     s.sendall(b"\x05\x01\x00")
-                    if s.recv(2) == b"\x05\x00":
+                    if recv_exactly(s, 2) in (b"\x05\x00", SOCKS_REFUSED[:2]):  # A saturated node is still up
                         self.active = True
-                    else:
+                    elif self.running.is_set():
                         self.active = False
                         console.print(f"[yellow]Node {self.port} failed health check, restarting...[/yellow]")
                         logging.warning(f"Node {self.port} failed health check, restarting")
                         self.restart()
             except Exception as e:
+                if not self.running.is_set():
+                    break
                 self.active = False
                 console.print(f"[yellow]Node {self.port} health check failed: {e}, restarting...[/yellow]")
                 logging.warning(f"Node {self.port} health check failed: {e}")
@@ -577,109 +897,286 @@ class ProxyNode:
         Raises:
             Exception: If server startup fails.
         """
+        self.running.set()  # Cleared by stop(), e.g. during a restart
+        if next_node:
+            next_node.prev_node = self
+        if self.workers > 1 and self.worker_index is None:
+            self.start_workers(next_node)
+            return
+        if self.engine == "asyncio" or self.runtime:
+            self.start_async(next_node)
+            return
         try:
             class SOCKS5Handler(socketserver.BaseRequestHandler):
                 def handle(self):
-                    start_time = time.time()
-                    with self.server.node.lock:
-                        self.server.node.stats["requests"] += 1
-                        self.server.node.stats["connection_time"] = time.time()
-                    if not self.server.node.check_rate_limit():
-                        self.request.sendall(b"\x05\x08\x00\x01" + b"\x00" * 4 + b"\x00\x00")
-                        logging.warning(f"Node {self.server.node.port} rate limit exceeded")
-                        return
+                    # Nothing sent yet counts as idle: warm links from the previous node wait here
+                    self.target = None
+                    self.deadline = ConnectionDeadline(self.server.node, self.abort)
                     try:
-                        data = self.request.recv(2)
-                        if data != b"\x05\x01\x00":
-                            self.request.sendall(b"\x05\xff")
-                            return
-                        self.request.sendall(b"\x05\x00")
-                        data = self.request.recv(4)
-                        if len(data) < 4:
-                            return
-                        cmd, _, atyp = data[1:4]
-                        if atyp == 1:
-                            addr = self.request.recv(4)
-                            ip = socket.inet_ntoa(addr)
-                            port = int.from_bytes(self.request.recv(2), 'big')
-                        else:
-                            self.request.sendall(b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                        first = self.request.recv(SOCKS_HANDSHAKE_READ)
+                        if not first:
+                            return  # Pooled link closed unused, or a bare TCP probe
+                        start_time = time.time()
+                        with self.server.node.lock:
+                            self.server.node.stats["requests"] += 1
+                            self.server.node.stats["connection_time"] = time.time()
+                            self.server.node.stats["queue_ms"] = self.server.node.admission.stats["queue_ms"]
+                        if not self.server.node.check_rate_limit():
+                            self.request.sendall(b"\x05\x08\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                            logging.warning(f"Node {self.server.node.port} rate limit exceeded")
                             return
-                        if cmd == 1:
-                            if next_node:
-                                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                                    try:
-                                        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
-                                        context.check_hostname = False
-                                        context.verify_mode = ssl.CERT_NONE
-                                        sock = context.wrap_socket(sock, server_hostname=next_node.host)
-                                        sock.connect((next_node.host, next_node.port))
-                                        connect_request = b"\x05\x01\x00\x01" + addr + port.to_bytes(2, 'big')
-                                        encrypted_request = self.server.node.encrypt_data(connect_request, next_node)
-                                        sock.sendall(encrypted_request)
-                                        self.server.node.throttle_bandwidth(len(encrypted_request))
-                                        reply = sock.recv(10)
-                                        decrypted_reply = self.server.node.decrypt_data(reply, next_node)
-                                        if decrypted_reply.startswith(b"\x05\x00"):
-                                            self.request.sendall(b"\x05\x00\x00\x01" + addr + port.to_bytes(2, 'big'))
-                                            self.tunnel(self.request, sock, next_node)
-                                        else:
-                                            self.request.sendall(b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")
-                                    except Exception as e:
-                                        self.request.sendall(b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")
-                                        logging.error(f"Node {self.server.node.port} forwarding error: {e}")
-                                        self.server.node.stats["errors"] += 1
-                            else:
-                                try:
-                                    with socket.create_connection((ip, port), timeout=5) as sock:
-                                        context = ssl.create_default_context()
-                                        sock = context.wrap_socket(sock, server_hostname=ip)
-                                        self.request.sendall(b"\x05\x00\x00\x01" + addr + port.to_bytes(2, 'big'))
-                                        self.tunnel(self.request, sock, None)
-                                        with self.server.node.lock:
-                                            self.server.node.stats["bytes_sent"] += len(data)
-                                            self.server.node.stats["bytes_received"] += len(data)
-                                except Exception as e:
-                                    self.request.sendall(b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")
-                                    logging.error(f"Exit node {self.server.node.port} connection error: {e}")
-                                    self.server.node.stats["errors"] += 1
+                        self.deadline.enter("handshake")
+                        if first[0] in FRAME_TYPES:
+                            self.handle_hop(first)
                         else:
-                            self.request.sendall(b"\x05\x07\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                            self.handle_client(first)
                         with self.server.node.lock:
                             self.server.node.stats["latency"] = time.time() - start_time
                             self.server.node.stats["connection_time"] = time.time() - self.server.node.stats["connection_time"]
                     except Exception as e:
                         logging.error(f"Node {self.server.node.port} error: {e}")
                         self.server.node.stats["errors"] += 1
-                        self.request.sendall(b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                    finally:
+                        self.deadline.cancel()
 
-                def tunnel(self, client_sock, target_sock, next_node: Optional['ProxyNode']):
+                def abort(self):
+                    """Tear down the connection from the timer wheel when a deadline passes."""
+                    abort_socket(self.request)
+                    if self.target:
+                        abort_socket(self.target)
+
+                def handle_client(self, first: bytes):
                     """
-                    Tunnel data between client and target sockets.
+                    Serve a SOCKS5 client: greeting, CONNECT request, then the tunnel.
 
                     Args:
-                        client_sock (socket): Client socket.
-                        target_sock (socket): Target socket.
-                        next_node (Optional[ProxyNode]): Next node in the chain.
+                        first (bytes): First bytes already read from the client.
                     """
                     try:
+                        handshake = SocksHandshake()
+                        data = first
                         while True:
-                            data = client_sock.recv(8192)
-                            if not data:
+                            reply = handshake.feed(data)
+                            if reply:
+                                self.request.sendall(reply)
+                            if handshake.finished:
                                 break
-                            encrypted_data = self.server.node.encrypt_data(data, next_node)
-                            self.server.node.throttle_bandwidth(len(encrypted_data))
-                            target_sock.sendall(encrypted_data)
-                            with self.server.node.lock:
-                                self.server.node.stats["bytes_sent"] += len(encrypted_data)
-                                self.server.node.stats["bandwidth_kbps"] = (len(encrypted_data) * 8 / 1000) / max(self.server.node.stats["latency"], 0.001)
-                            response = target_sock.recv(8192)
-                            if not response:
-                                break
-                            decrypted_response = self.server.node.decrypt_data(response, next_node)
-                            client_sock.sendall(decrypted_response)
-                            with self.server.node.lock:
-                                self.server.node.stats["bytes_received"] += len(response)
+                            data = self.request.recv(SOCKS_HANDSHAKE_READ)
+                            if not data:
+                                return  # Client hung up mid-handshake (e.g. a health check)
+                        if handshake.state == "failed":
+                            return
+                        cmd, dest = handshake.command, handshake.destination
+                        if cmd not in (SOCKS_CMD_CONNECT, SOCKS_CMD_UDP_ASSOCIATE):
+                            self.request.sendall(b"\x05\x07\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                            return
+                        host = parse_socks_address(dest)[0] if cmd == SOCKS_CMD_CONNECT else None
+                        if not self.server.node.check_keyed_limits(self.client_address[0], host):
+                            self.request.sendall(b"\x05\x02\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                            return
+                        if cmd == SOCKS_CMD_UDP_ASSOCIATE:
+                            self.serve_udp(dest)
+                            return
+                        self.deadline.enter("connect")
+                        try:
+                            target_sock, target_codec = self.connect_upstream(dest)
+                        except Exception:
+                            self.request.sendall(b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                            return
+                        self.request.sendall(b"\x05\x00\x00" + dest)
+                        if handshake.buffer:
+                            # Data the client sent before waiting for the reply
+                            early = bytes(handshake.buffer)
+                            try:
+                                if target_codec:
+                                    target_codec.send_frame(target_sock, FRAME_DATA, early)
+                                else:
+                                    target_sock.sendall(early)
+                            except OSError:
+                                target_sock.close()
+                                raise
+                            self.server.node.account_upstream(len(early))
+                        self.tunnel(self.request, target_sock, None, target_codec)
+                    except ConnectionError:
+                        return  # Client hung up mid-request (e.g. a health check)
+                    except Exception:
+                        self.request.sendall(b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                        raise
+
+                def handle_hop(self, first: bytes):
+                    """
+                    Serve the previous node: decrypt its CONNECT frame, extend the circuit and tunnel.
+
+                    Args:
+                        first (bytes): First byte already read from the previous node.
+
+                    Raises:
+                        ValueError: If the previous node does not open with a valid CONNECT frame.
+                    """
+                    node = self.server.node
+                    client_codec = HopCodec(node, node.prev_node)
+                    client_codec.feed(first)
+                    frame_type, request = client_codec.read_frame(self.request)
+                    if frame_type != FRAME_CONNECT:
+                        raise ValueError(f"Malformed CONNECT frame (type {frame_type:#x}) from previous node")
+                    if request[1:2] == bytes([SOCKS_CMD_UDP_ASSOCIATE]):
+                        parse_socks_request(request, SOCKS_CMD_UDP_ASSOCIATE)
+                        self.serve_udp_hop(client_codec)
+                        return
+                    dest = parse_socks_request(request)
+                    self.deadline.enter("connect")
+                    try:
+                        target_sock, target_codec = self.connect_upstream(dest)
+                    except Exception:
+                        client_codec.send_frame(self.request, FRAME_REPLY, b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                        return
+                    client_codec.send_frame(self.request, FRAME_REPLY, b"\x05\x00\x00" + dest)
+                    self.tunnel(self.request, target_sock, client_codec, target_codec)
+
+                def connect_upstream(self, dest: bytes) -> Tuple[socket.socket, Optional[HopCodec]]:
+                    """
+                    Open the next leg of the circuit.
+
+                    Args:
+                        dest (bytes): SOCKS5 destination (ATYP, DST.ADDR, DST.PORT); domain
+                            names are forwarded unresolved and resolved by the exit node.
+
+                    Returns:
+                        Tuple[socket, Optional[HopCodec]]: Framed link to the next node, or the
+                        plain exit connection to the destination (no codec).
+
+                    Raises:
+                        Exception: If the next node or the destination cannot be reached.
+                    """
+                    node = self.server.node
+                    if not next_node:
+                        try:
+                            return node.exit_connector.connect(*node.resolve_destination(dest), SOCKET_PROFILES[node.socket_profile]), None
+                        except Exception as e:
+                            logging.error(f"Exit node {node.port} connection error: {e}")
+                            node.stats["errors"] += 1
+                            raise
+                    sock = None
+                    try:
+                        sock = node.hop_pool.checkout()
+                        codec = HopCodec(node, next_node)
+                        connect_request = b"\x05\x01\x00" + dest
+                        node.throttle_bandwidth(codec.send_frame(sock, FRAME_CONNECT, connect_request))
+                        frame_type, reply = codec.read_frame(sock)
+                        if frame_type != FRAME_REPLY or not reply.startswith(b"\x05\x00"):
+                            raise ConnectionError(f"Node {next_node.port} refused CONNECT")
+                        node.hop_pool.remember(sock)
+                        return sock, codec
+                    except Exception as e:
+                        if sock:
+                            sock.close()
+                        logging.error(f"Node {node.port} forwarding error: {e}")
+                        node.stats["errors"] += 1
+                        raise
+
+                def serve_udp(self, requested: bytes):
+                    """
+                    Serve a SOCKS5 UDP ASSOCIATE: bind the client's UDP socket, extend the circuit and relay
+                    datagrams until the client closes its TCP connection.
+
+                    Args:
+                        requested (bytes): SOCKS5 address the client will send from (zeros if unknown).
+                    """
+                    node = self.server.node
+                    self.deadline.enter("connect")
+                    client = ClientDatagrams(node, requested)
+                    try:
+                        try:
+                            upstream = self.associate_upstream()
+                        except Exception:
+                            self.request.sendall(b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                            return
+                        try:
+                            self.request.sendall(b"\x05\x00\x00" + client.address)
+                            self.deadline.enter("idle")
+                            relay_datagrams(node, client, upstream, control=self.request, deadline=self.deadline)
+                        finally:
+                            upstream.close()
+                    finally:
+                        client.close()
+
+                def serve_udp_hop(self, client_codec: 'HopCodec'):
+                    """
+                    Serve a UDP ASSOCIATE forwarded by the previous node: extend the circuit and relay
+                    datagram batches until the previous node closes the link.
+
+                    Args:
+                        client_codec (HopCodec): Frame codec for the link from the previous node.
+                    """
+                    node = self.server.node
+                    self.deadline.enter("connect")
+                    try:
+                        upstream = self.associate_upstream()
+                    except Exception:
+                        client_codec.send_frame(self.request, FRAME_REPLY, b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                        return
+                    try:
+                        client_codec.send_frame(self.request, FRAME_REPLY, b"\x05\x00\x00\x01" + b"\x00" * 6)
+                        self.deadline.enter("idle")
+                        relay_datagrams(node, LinkDatagrams(self.request, client_codec), upstream, deadline=self.deadline)
+                    finally:
+                        upstream.close()
+
+                def associate_upstream(self):
+                    """
+                    Open the next leg of a UDP ASSOCIATE circuit.
+
+                    Returns:
+                        LinkDatagrams or DestinationDatagrams: Framed link to the next node, or the
+                        exit node's destination sockets.
+
+                    Raises:
+                        Exception: If the next node cannot be reached or refuses.
+                    """
+                    node = self.server.node
+                    if not next_node:
+                        return DestinationDatagrams(node)
+                    sock = None
+                    try:
+                        sock = node.hop_pool.checkout()
+                        codec = HopCodec(node, next_node)
+                        codec.send_frame(sock, FRAME_CONNECT, SOCKS_UDP_ASSOCIATE_REQUEST)
+                        frame_type, reply = codec.read_frame(sock)
+                        if frame_type != FRAME_REPLY or not reply.startswith(b"\x05\x00"):
+                            raise ConnectionError(f"Node {next_node.port} refused UDP ASSOCIATE")
+                        node.hop_pool.remember(sock)
+                        self.target = sock
+                        return LinkDatagrams(sock, codec)
+                    except Exception as e:
+                        if sock:
+                            sock.close()
+                        logging.error(f"Node {node.port} forwarding error: {e}")
+                        node.stats["errors"] += 1
+                        raise
+
+                def tunnel(self, client_sock, target_sock, client_codec: Optional['HopCodec'], target_codec: Optional['HopCodec']):
+                    """
+                    Tunnel data between client and target sockets in both directions at once.
+
+                    Args:
+                        client_sock (socket): Client socket (SOCKS5 client or previous node).
+                        target_sock (socket): Target socket (next node or destination).
+                        client_codec (Optional[HopCodec]): Frame codec when the client is the previous node.
+                        target_codec (Optional[HopCodec]): Frame codec when the target is the next node.
+                    """
+                    node = self.server.node
+                    self.target = target_sock
+                    self.deadline.enter("idle")
+                    flow = node.bandwidth.flow()
+                    try:
+                        DuplexRelay(
+                            RelayPump(client_sock, target_sock, client_codec, target_codec,
+                                      lambda size: node.account_upstream(size, flow),
+                                      node.link_emulator(next_node) if target_codec else None),
+                            RelayPump(target_sock, client_sock, target_codec, client_codec, node.account_downstream,
+                                      node.link_emulator(node.prev_node) if client_codec else None),
+                            buffer_size=node.relay_buffer_max, deadline=self.deadline
+                        ).run()
                     except socket.timeout:
                         logging.warning(f"Timeout in tunnel for node {self.server.node.port}")
                         self.server.node.stats["errors"] += 1
@@ -696,16 +1193,25 @@ class ProxyNode:
                         except Exception as e:
                             logging.error(f"Error closing sockets in node {self.server.node.port}: {e}")
 
-            self.server = socketserver.ThreadingTCPServer((self.host, self.port), SOCKS5Handler)
+            self.server = AdmissionTCPServer((self.host, self.port), SOCKS5Handler, bind_and_activate=False)
+            self.server.request_queue_size = self.admission.backlog
             self.server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-            context.load_cert_chain(certfile=CERT_FILE, keyfile=KEY_FILE)
-            self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+            if self.worker_index is not None:
+                self.server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            SOCKET_PROFILES[self.socket_profile].apply(self.server.socket, listener=True)
+            self.server.server_bind()
+            self.server.server_activate()
+            self.server.context = self.tls_contexts()[0]
+            self.server.refusals = TLSRefusals(self.server.context)
             self.server.node = self
             self.active = True
             threading.Thread(target=self.server.serve_forever, daemon=True).start()
-            self.health_check_thread = threading.Thread(target=self.health_check, daemon=True)
-            self.health_check_thread.start()
+            if next_node:
+                self.hop_pool = HopConnectionPool(self, next_node, size=self.hop_pool_size)
+                self.hop_pool.start()
+            if self.worker_index is None:  # The parent health-checks the port for all workers
+                self.health_check_thread = threading.Thread(target=self.health_check, daemon=True)
+                self.health_check_thread.start()
             console.print(f"[green]Started node on {self.host}:{self.port} ({self.locale['country']}, MAC: {self.virtual_mac})[/green]")
             logging.info(f"Node started on {self.host}:{self.port}, MAC: {self.virtual_mac} at {self.get_local_time()}")
         except Exception as e:
@@ -714,6 +1220,57 @@ class ProxyNode:
             self.active = False
             self.stats["errors"] += 1
 
+    def start_async(self, next_node: Optional['ProxyNode'] = None):
+        """
+        Start the proxy node on the asyncio data plane.
+
+        Args:
+            next_node (Optional[ProxyNode]): Next node in the chain.
+        """
+        try:
+            self.async_engine = AsyncNodeEngine(self, next_node, loop=self.runtime.loop if self.runtime else None)
+            self.async_engine.start()
+            self.active = True
+            if self.worker_index is None and not self.runtime:  # A runtime health-checks all its nodes
+                self.health_check_thread = threading.Thread(target=self.health_check, daemon=True)
+                self.health_check_thread.start()
+            console.print(f"[green]Started async node on {self.host}:{self.port} ({self.locale['country']}, MAC: {self.virtual_mac})[/green]")
+            logging.info(f"Async node started on {self.host}:{self.port}, MAC: {self.virtual_mac} at {self.get_local_time()}")
+        except Exception as e:
+            console.print(f"[red]Failed to start async node on {self.host}:{self.port}: {e}[/red]")
+            logging.error(f"Async node start failed on {self.host}:{self.port}: {e}")
+            self.async_engine = None
+            self.active = False
+            self.stats["errors"] += 1
+
+    def start_workers(self, next_node: Optional['ProxyNode'] = None):
+        """
+        Start the proxy node as `workers` processes sharing its port.
+
+        Args:
+            next_node (Optional[ProxyNode]): Next node in the chain.
+        """
+        if not hasattr(socket, "SO_REUSEPORT"):
+            console.print(f"[yellow]SO_REUSEPORT unavailable; node {self.port} runs in a single process[/yellow]")
+            logging.warning(f"SO_REUSEPORT unavailable, node {self.port} runs in a single process")
+            self.workers = 1
+            self.start(next_node)
+            return
+        try:
+            self.worker_pool = NodeWorkers(self, next_node, self.workers)
+            self.worker_pool.start()
+            self.active = True
+            self.health_check_thread = threading.Thread(target=self.health_check, daemon=True)
+            self.health_check_thread.start()
+            console.print(f"[green]Started node on {self.host}:{self.port} with {self.workers} workers ({self.locale['country']}, MAC: {self.virtual_mac})[/green]")
+            logging.info(f"Node started on {self.host}:{self.port} with {self.workers} workers, MAC: {self.virtual_mac} at {self.get_local_time()}")
+        except Exception as e:
+            console.print(f"[red]Failed to start workers for node {self.host}:{self.port}: {e}[/red]")
+            logging.error(f"Worker start failed on {self.host}:{self.port}: {e}")
+            self.worker_pool = None
+            self.active = False
+            self.stats["errors"] += 1
+
     def stop(self):
         """
         Stop the proxy node gracefully.
@@ -723,16 +1280,37 @@ class ProxyNode:
         """
         with self.lock:
             self.running.clear()
-            if self.server:
-                try:
-                    self.server.shutdown()
-                    self.server.server_close()
-                except Exception as e:
-                    logging.error(f"Error stopping node {self.port}: {e}")
-                    self.stats["errors"] += 1
-                self.active = False
-                console.print(f"[yellow]Stopped node on {self.host}:{self.port}[/yellow]")
-                logging.info(f"Node stopped on {self.host}:{self.port} at {self.get_local_time()}")
+            async_engine, self.async_engine = self.async_engine, None
+            server, self.server = self.server, None
+            hop_pool, self.hop_pool = self.hop_pool, None
+            worker_pool, self.worker_pool = self.worker_pool, None
+        if hop_pool and not async_engine:
+            hop_pool.stop()
+        if worker_pool:
+            worker_pool.stop()
+            self.active = False
+            console.print(f"[yellow]Stopped {worker_pool.count} workers of node {self.host}:{self.port}[/yellow]")
+            logging.info(f"Node workers stopped on {self.host}:{self.port} at {self.get_local_time()}")
+        # Handler threads and the event loop take the node lock for stats updates, so both are stopped outside it
+        if server:
+            try:
+                server.shutdown()
+                server.server_close()
+            except Exception as e:
+                logging.error(f"Error stopping node {self.port}: {e}")
+                self.stats["errors"] += 1
+            self.active = False
+            console.print(f"[yellow]Stopped node on {self.host}:{self.port}[/yellow]")
+            logging.info(f"Node stopped on {self.host}:{self.port} at {self.get_local_time()}")
+        if async_engine:
+            try:
+                async_engine.stop()
+            except Exception as e:
+                logging.error(f"Error stopping async node {self.port}: {e}")
+                self.stats["errors"] += 1
+            self.active = False
+            console.print(f"[yellow]Stopped async node on {self.host}:{self.port}[/yellow]")
+            logging.info(f"Async node stopped on {self.host}:{self.port} at {self.get_local_time()}")
 
     def restart(self):
         """Restart the proxy node."""
@@ -744,48 +1322,4666 @@ class ProxyNode:
             next_node = self.nodes[index + 1] if index < len(self.nodes) - 1 else None
         self.start(next_node)
 
-class ProxyChain:
+def socks_address_remaining(atyp: int, first: int) -> int:
     """
-    Manages the chain of proxy nodes, Tor hidden services, and website creation.
+    Bytes of DST.ADDR and DST.PORT still to read after ATYP and the first address byte.
+
+    Args:
+        atyp (int): SOCKS5 address type.
+        first (int): First byte of DST.ADDR (the length prefix for domain names).
+
+    Raises:
+        ValueError: If the address type is unsupported or the domain name is empty.
+    """
+    if atyp == SOCKS_ATYP_IPV4:
+        return 3 + 2
+    if atyp == SOCKS_ATYP_IPV6:
+        return 15 + 2
+    if atyp == SOCKS_ATYP_DOMAIN and first:
+        return first + 2
+    raise ValueError(f"Unsupported SOCKS5 address (type {atyp})")
+
+def parse_socks_address(dest: bytes) -> Tuple[str, int]:
+    """
+    Decode a SOCKS5 destination (ATYP, DST.ADDR, DST.PORT).
+
+    Args:
+        dest (bytes): Destination exactly as it appears in a CONNECT request.
+
+    Returns:
+        Tuple[str, int]: Host (IP literal or domain name) and port.
+
+    Raises:
+        ValueError: If the destination is malformed or of an unsupported type.
+    """
+    if len(dest) < 2:
+        raise ValueError("Truncated SOCKS5 address")
+    atyp = dest[0]
+    if len(dest) != 2 + socks_address_remaining(atyp, dest[1]):
+        raise ValueError(f"SOCKS5 address of {len(dest)} bytes is malformed (type {atyp})")
+    port = int.from_bytes(dest[-2:], 'big')
+    if atyp == SOCKS_ATYP_IPV4:
+        return socket.inet_ntop(socket.AF_INET, dest[1:5]), port
+    if atyp == SOCKS_ATYP_IPV6:
+        return socket.inet_ntop(socket.AF_INET6, dest[1:17]), port
+    return dest[2:-2].decode("ascii"), port
+
+def parse_socks_request(request: bytes, command: int = SOCKS_CMD_CONNECT) -> bytes:
+    """
+    Validate a SOCKS5 request forwarded by the previous node.
+
+    Args:
+        request (bytes): VER, CMD, RSV, then the destination.
+        command (int): Command the request must carry.
+
+    Returns:
+        bytes: The destination (ATYP, DST.ADDR, DST.PORT).
+
+    Raises:
+        ValueError: If the request is not a well-formed request for `command`.
+    """
+    if request[:3] != bytes([5, command, 0]):
+        name = "CONNECT" if command == SOCKS_CMD_CONNECT else "UDP ASSOCIATE"
+        raise ValueError(f"Forwarded request is not a SOCKS5 {name}")
+    parse_socks_address(request[3:])
+    return request[3:]
+
+class SocksHandshake:
+    """
+    Incremental parser for a client's SOCKS5 greeting and request (RFC 1928).
+
+    Bytes are fed as they arrive, however the client's segments were split
+    or coalesced, so a greeting and request sent together parse from one
+    read. Only the "no authentication" method is accepted. Bytes after the
+    request (data a client sent without waiting for the reply) stay in
+    `buffer` for the tunnel.
 
     Attributes:
-        nodes (List[ProxyNode]): List of proxy nodes.
-        websites (List[Dict]): List of websites with metadata.
-        config (Dict): Configuration settings.
-        tf (TimezoneFinder): Timezone finder instance.
-        used_ips (set): Set of used virtual IPs.
-        used_ports (set): Set of used ports.
-        tor_processes (Dict): Dictionary of Tor processes.
-        web_servers (Dict): Dictionary of Flask web servers.
+        state (str): "greeting", "request", "done" or "failed".
+        buffer (bytearray): Bytes received but not parsed.
+        methods (bytes): Authentication methods the client offered.
+        command (Optional[int]): Requested command, once the request is parsed.
+        destination (Optional[bytes]): Requested address (ATYP, DST.ADDR, DST.PORT), once parsed.
     """
     def __init__(self):
-        self.nodes: List[ProxyNode] = []
-        self.websites: List[Dict] = []
-        self.config = self.load_config()
-        self.tf = TimezoneFinder()
-        self.used_ips = set()
-        self.used_ports = set()
-        self.tor_processes = {}
-        self.web_servers = {}
-
-    def validate_ip_range(self, ip_range: str) -> bool:
+        self.state = "greeting"
+        self.buffer = bytearray()
+        self.methods = b""
+        self.command = None
+        self.destination = None
+
+    @property
+    def finished(self) -> bool:
+        """Whether the request was parsed or the handshake failed."""
+        return self.state in ("done", "failed")
+
+    def feed(self, data: bytes) -> bytes:
         """
-        Validate the IP range format.
+        Consume bytes from the client and parse as far as they allow.
 
         Args:
-            ip_range (str): IP range in CIDR notation.
+            data (bytes): Bytes just read from the client.
 
         Returns:
-            bool: True if valid, False otherwise.
+            bytes: Replies to send the client now: the method selection once the
+            greeting is complete, and an error reply if the handshake failed.
         """
-        try:
-            network = ipaddress.IPv4Network(ip_range, strict=False)
-            available_ips = len(list(network.hosts()))
-            if available_ips < self.config["node_count"]:
-                console.print(f"[red]IP range {ip_range} has insufficient IPs for {self.config['node_count']} nodes[/red]")
-                logging.error(f"Insufficient IPs in range {ip_range}")
-                return False
-            return True
+        self.buffer += data
+        replies = b""
+        if self.state == "greeting" and len(self.buffer) >= 2:
+            if self.buffer[0] != 5:
+                return self.fail(b"\x05\xff")
+            end = 2 + self.buffer[1]
+            if len(self.buffer) >= end:
+                self.methods = bytes(self.buffer[2:end])
+                del self.buffer[:end]
+                if SOCKS_METHOD_NO_AUTH not in self.methods:
+                    return self.fail(b"\x05\xff")
+                replies += b"\x05\x00"
+                self.state = "request"
+        if self.state == "request" and len(self.buffer) >= 5:
+            version, command, _, atyp, first = self.buffer[:5]
+            if version != 5:
+                return replies + self.fail(b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+            try:
+                end = 5 + socks_address_remaining(atyp, first)
+            except ValueError:
+                return replies + self.fail(b"\x05\x08\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+            if len(self.buffer) >= end:
+                destination = bytes(self.buffer[3:end])
+                try:
+                    parse_socks_address(destination)
+                except ValueError:
+                    return replies + self.fail(b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")  # e.g. a non-ASCII name
+                self.command = command
+                self.destination = destination
+                del self.buffer[:end]
+                self.state = "done"
+        return replies
+
+    def fail(self, reply: bytes) -> bytes:
+        self.state = "failed"
+        self.buffer.clear()
+        return reply
+
+def recv_exactly(sock: socket.socket, size: int) -> bytes:
+    """
+    Read exactly `size` bytes from a blocking socket.
+
+    Raises:
+        ConnectionError: If the peer closes the connection first.
+    """
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed mid-message")
+        data += chunk
+    return data
+
+def socks_address(host: str, port: int) -> bytes:
+    """
+    Encode a host and port as a SOCKS5 address (ATYP, ADDR, PORT).
+
+    Args:
+        host (str): IPv4 or IPv6 literal, or a domain name.
+        port (int): Port number.
+
+    Returns:
+        bytes: The encoded address.
+    """
+    for family, atyp in ((socket.AF_INET, SOCKS_ATYP_IPV4), (socket.AF_INET6, SOCKS_ATYP_IPV6)):
+        try:
+            return bytes([atyp]) + socket.inet_pton(family, host.split("%")[0]) + port.to_bytes(2, "big")
+        except OSError:
+            continue
+    name = host.encode("idna")
+    return bytes([SOCKS_ATYP_DOMAIN, len(name)]) + name + port.to_bytes(2, "big")
+
+def split_socks_address(data: bytes) -> Tuple[bytes, bytes]:
+    """
+    Split a SOCKS5 address off the front of `data`.
+
+    Returns:
+        Tuple[bytes, bytes]: The address (ATYP, ADDR, PORT) and the bytes after it.
+
+    Raises:
+        ValueError: If the address is truncated or of an unsupported type.
+    """
+    if len(data) < 2:
+        raise ValueError("Truncated SOCKS5 address")
+    end = 2 + socks_address_remaining(data[0], data[1])
+    if len(data) < end:
+        raise ValueError("Truncated SOCKS5 address")
+    return data[:end], data[end:]
+
+def pack_datagrams(datagrams: List[Tuple[bytes, bytes]]) -> bytes:
+    """
+    Encode datagrams as one FRAME_UDP payload: each is a 2-byte length, its SOCKS5 address and its data.
+
+    A datagram whose address and data together overflow the length field is dropped,
+    as a UDP path drops what it cannot carry.
+
+    Args:
+        datagrams (List[Tuple[bytes, bytes]]): (SOCKS5 address, data) pairs; the address is the
+            destination travelling toward the exit node and the source travelling back.
+    """
+    return b"".join(UDP_DATAGRAM.pack(len(address) + len(data)) + address + data for address, data in datagrams
+                    if len(address) + len(data) <= UDP_DATAGRAM_MAX)
+
+def unpack_datagrams(payload: bytes) -> List[Tuple[bytes, bytes]]:
+    """
+    Decode a FRAME_UDP payload into (SOCKS5 address, data) pairs.
+
+    Raises:
+        ValueError: If the payload is malformed.
+    """
+    datagrams = []
+    offset = 0
+    while offset < len(payload):
+        if offset + UDP_DATAGRAM.size > len(payload):
+            raise ValueError("Truncated datagram batch")
+        (length,) = UDP_DATAGRAM.unpack_from(payload, offset)
+        offset += UDP_DATAGRAM.size
+        if offset + length > len(payload):
+            raise ValueError("Truncated datagram batch")
+        datagrams.append(split_socks_address(payload[offset:offset + length]))
+        offset += length
+    return datagrams
+
+def check_frame_header(frame_type: int, length: int):
+    """
+    Validate an inter-node frame header.
+
+    Args:
+        frame_type (int): Frame type byte.
+        length (int): Declared payload length.
+
+    Raises:
+        ValueError: If the type is unknown or the length exceeds FRAME_MAX_PAYLOAD.
+    """
+    if frame_type not in FRAME_TYPES:
+        raise ValueError(f"Unknown frame type {frame_type:#x}")
+    if length > FRAME_MAX_PAYLOAD:
+        raise ValueError(f"Frame payload of {length} bytes exceeds {FRAME_MAX_PAYLOAD}")
+
+def encode_frame(frame_type: int, payload: bytes) -> bytes:
+    """
+    Encode one inter-node frame.
+
+    Args:
+        frame_type (int): One of FRAME_TYPES.
+        payload (bytes): Frame payload.
+
+    Returns:
+        bytes: Header followed by the payload.
+    """
+    check_frame_header(frame_type, len(payload))
+    return FRAME_HEADER.pack(frame_type, len(payload)) + payload
+
+async def read_frame_async(reader: asyncio.StreamReader, prefix: bytes = b"") -> Tuple[int, bytes]:
+    """
+    Read one inter-node frame from an asyncio stream.
+
+    Args:
+        reader (StreamReader): Stream to read from.
+        prefix (bytes): Header bytes already consumed from the stream.
+
+    Returns:
+        Tuple[int, bytes]: Frame type and raw payload.
+
+    Raises:
+        ValueError: If the header is invalid.
+        asyncio.IncompleteReadError: If the stream ends mid-frame.
+    """
+    header = prefix + await reader.readexactly(FRAME_HEADER.size - len(prefix))
+    frame_type, length = FRAME_HEADER.unpack(header)
+    check_frame_header(frame_type, length)
+    return frame_type, await reader.readexactly(length)
+
+class FrameDecoder:
+    """
+    Streaming decoder for inter-node frames.
+
+    Accepts arbitrary slices of the byte stream, as returned by recv, and
+    yields every complete frame: a frame split across reads is reassembled
+    and a read holding many frames yields all of them. Bytes land in one
+    reusable buffer, which the relay can recv_into directly.
+
+    Attributes:
+        buffer (bytearray): Receive buffer; bytes between start and end are not yet decoded.
+        start (int): Offset of the first undecoded byte.
+        end (int): Offset one past the last received byte.
+    """
+    def __init__(self, capacity: int = 32768):
+        self.buffer = bytearray(capacity)
+        self.start = 0
+        self.end = 0
+
+    @property
+    def buffered(self) -> int:
+        """Number of received bytes not yet decoded."""
+        return self.end - self.start
+
+    def writable(self, size: int = 8192) -> memoryview:
+        """
+        Make room for at least `size` more bytes and return the free space.
+
+        Undecoded bytes are moved to the front of the buffer only when the
+        tail is too short, and the buffer only grows for frames larger than
+        its capacity. Views from next_frame() must be released first.
+
+        Args:
+            size (int): Minimum free space required.
+
+        Returns:
+            memoryview: Free space to receive into; pass the byte count to commit().
+        """
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif len(self.buffer) - self.end < size and self.start:
+            pending = self.buffer[self.start:self.end]
+            self.buffer[:len(pending)] = pending
+            self.start, self.end = 0, len(pending)
+        if len(self.buffer) - self.end < size:
+            self.buffer.extend(bytes(size - (len(self.buffer) - self.end)))
+        return memoryview(self.buffer)[self.end:]
+
+    @property
+    def ready(self) -> bool:
+        """Whether a complete frame is buffered."""
+        if self.end - self.start < FRAME_HEADER.size:
+            return False
+        _, length = FRAME_HEADER.unpack_from(self.buffer, self.start)
+        return self.start + FRAME_HEADER.size + length <= self.end
+
+    def commit(self, size: int):
+        """Record `size` bytes received into the view returned by writable()."""
+        self.end += size
+
+    def next_frame(self) -> Optional[Tuple[int, memoryview]]:
+        """
+        Decode the next complete frame, without copying its payload.
+
+        Returns:
+            Optional[Tuple[int, memoryview]]: Frame type and a view of the payload, valid until
+            the next writable() or feed() call, or None if no complete frame is buffered.
+
+        Raises:
+            ValueError: If a frame header is invalid.
+        """
+        if self.end - self.start < FRAME_HEADER.size:
+            return None
+        frame_type, length = FRAME_HEADER.unpack_from(self.buffer, self.start)
+        check_frame_header(frame_type, length)
+        payload_start = self.start + FRAME_HEADER.size
+        if payload_start + length > self.end:
+            return None
+        self.start = payload_start + length
+        return frame_type, memoryview(self.buffer)[payload_start:self.start]
+
+    def feed(self, data: bytes) -> List[Tuple[int, bytes]]:
+        """
+        Add received bytes and decode every complete frame.
+
+        Args:
+            data (bytes): Bytes read from the link.
+
+        Returns:
+            List[Tuple[int, bytes]]: Decoded (frame type, payload) pairs, in order.
+
+        Raises:
+            ValueError: If a frame header is invalid.
+        """
+        self.writable(len(data))[:len(data)] = data
+        self.commit(len(data))
+        frames = []
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return frames
+            frames.append((frame[0], bytes(frame[1])))
+
+class SessionCipher(ABC):
+    """
+    Symmetric cipher protecting one hop link for the life of a circuit.
+
+    Both ends derive the cipher from the same 32-byte session key; the
+    initiator flag keeps the two directions of the link apart. The *_into
+    methods write into caller-owned buffers so the relay can reuse them.
+    Subclasses must implement seal, open and sealed_size.
+
+    Attributes:
+        name (str): Configuration name of the cipher.
+        cipher_id (int): Identifier sent with the wrapped session key.
+    """
+    name = ""
+    cipher_id = 0
+
+    def __init__(self, key: bytes, initiator: bool):
+        self.initiator = initiator
+
+    @abstractmethod
+    def seal(self, data: bytes) -> bytes:
+        """Encrypt and authenticate one frame payload."""
+
+    @abstractmethod
+    def open(self, payload: bytes) -> bytes:
+        """
+        Authenticate and decrypt one frame payload.
+
+        Raises:
+            InvalidToken: If the payload fails authentication.
+        """
+
+    @abstractmethod
+    def sealed_size(self, size: int) -> int:
+        """Exact sealed length of a `size`-byte payload."""
+
+    def opened_size(self, size: int) -> int:
+        """Upper bound on the plaintext length of a `size`-byte sealed payload."""
+        return size
+
+    def seal_into(self, data: bytes, out: memoryview) -> int:
+        """
+        Seal data into `out`, which holds at least sealed_size(len(data)) bytes.
+
+        Returns:
+            int: Bytes written.
+        """
+        sealed = self.seal(data)
+        out[:len(sealed)] = sealed
+        return len(sealed)
+
+    def open_into(self, payload: bytes, out: memoryview) -> int:
+        """
+        Open a payload into `out`, which holds at least opened_size(len(payload)) bytes.
+
+        Returns:
+            int: Plaintext bytes written.
+
+        Raises:
+            InvalidToken: If the payload fails authentication.
+        """
+        data = self.open(payload)
+        out[:len(data)] = data
+        return len(data)
+
+class FernetSessionCipher(SessionCipher):
+    """Fernet tokens (AES-128-CBC + HMAC-SHA256, base64-encoded)."""
+    name = "fernet"
+    cipher_id = 1
+
+    def __init__(self, key: bytes, initiator: bool):
+        super().__init__(key, initiator)
+        self.fernet = Fernet(base64.urlsafe_b64encode(key))
+
+    def seal(self, data: bytes) -> bytes:
+        return self.fernet.encrypt(bytes(data))
+
+    def open(self, payload: bytes) -> bytes:
+        return self.fernet.decrypt(bytes(payload))
+
+    def sealed_size(self, size: int) -> int:
+        # Version, timestamp, IV, PKCS7-padded ciphertext and HMAC, base64-encoded
+        return 4 * -(-(1 + 8 + 16 + (size // 16 + 1) * 16 + 32) // 3)
+
+class AEADSessionCipher(SessionCipher):
+    """
+    Raw binary AEAD with implicit nonces.
+
+    Each direction keeps a 64-bit frame counter; the 96-bit nonce is a
+    direction prefix followed by the counter, so nothing but the 16-byte
+    tag is added on the wire. Frames arrive in order over the link, so
+    the receiver's counter always matches the sender's, and a replayed,
+    dropped or reordered frame fails authentication.
+
+    Attributes:
+        aead (Type): cryptography AEAD class (ChaCha20Poly1305 or AESGCM).
+        send_counter (int): Frames sealed on this end.
+        receive_counter (int): Frames opened on this end.
+    """
+    aead = None
+    nonce = struct.Struct("!IQ")
+    tag_size = 16
+
+    def __init__(self, key: bytes, initiator: bool):
+        super().__init__(key, initiator)
+        self.cipher = self.aead(key)
+        self.send_direction, self.receive_direction = (1, 2) if initiator else (2, 1)
+        self.send_counter = 0
+        self.receive_counter = 0
+        self.send_nonce = bytearray(self.nonce.size)
+        self.receive_nonce = bytearray(self.nonce.size)
+        # encrypt_into/decrypt_into need a recent cryptography release; older ones allocate
+        self.in_place = hasattr(self.cipher, "encrypt_into")
+
+    def next_send_nonce(self) -> bytearray:
+        self.nonce.pack_into(self.send_nonce, 0, self.send_direction, self.send_counter)
+        self.send_counter += 1
+        return self.send_nonce
+
+    def seal(self, data: bytes) -> bytes:
+        return self.cipher.encrypt(self.next_send_nonce(), data, None)
+
+    def open(self, payload: bytes) -> bytes:
+        self.nonce.pack_into(self.receive_nonce, 0, self.receive_direction, self.receive_counter)
+        try:
+            data = self.cipher.decrypt(self.receive_nonce, payload, None)
+        except InvalidTag:
+            raise InvalidToken
+        self.receive_counter += 1
+        return data
+
+    def sealed_size(self, size: int) -> int:
+        return size + self.tag_size
+
+    def opened_size(self, size: int) -> int:
+        return max(size - self.tag_size, 0)
+
+    def seal_into(self, data: bytes, out: memoryview) -> int:
+        if not self.in_place:
+            return super().seal_into(data, out)
+        size = self.sealed_size(len(data))
+        self.cipher.encrypt_into(self.next_send_nonce(), data, None, out[:size])
+        return size
+
+    def open_into(self, payload: bytes, out: memoryview) -> int:
+        if not self.in_place or len(payload) < self.tag_size:
+            return super().open_into(payload, out)
+        size = self.opened_size(len(payload))
+        self.nonce.pack_into(self.receive_nonce, 0, self.receive_direction, self.receive_counter)
+        try:
+            self.cipher.decrypt_into(self.receive_nonce, payload, None, out[:size])
+        except InvalidTag:
+            raise InvalidToken
+        self.receive_counter += 1
+        return size
+
+class ChaCha20SessionCipher(AEADSessionCipher):
+    """ChaCha20-Poly1305; fast without AES hardware support."""
+    name = "chacha20-poly1305"
+    cipher_id = 2
+    aead = ChaCha20Poly1305
+
+class AESGCMSessionCipher(AEADSessionCipher):
+    """AES-256-GCM; fastest on CPUs with AES-NI."""
+    name = "aes-256-gcm"
+    cipher_id = 3
+    aead = AESGCM
+
+# Hop link ciphers selectable with "cipher" in the config file
+SESSION_CIPHERS = {cipher.name: cipher for cipher in (FernetSessionCipher, ChaCha20SessionCipher, AESGCMSessionCipher)}
+
+class HopCodec:
+    """
+    Frames and encrypts relay traffic on a link between two adjacent nodes.
+
+    The connecting node opens the link with a fresh session key, RSA-wrapped
+    for the peer and prefixed (cipher id, 2-byte length) to the first frame
+    it sends. Every later frame in either direction is encrypted with that
+    cached key, so the RSA cost is paid once per circuit hop rather than
+    once per chunk.
+
+    Attributes:
+        node (ProxyNode): Local node.
+        peer (Optional[ProxyNode]): Node at the other end of the link.
+        decoder (FrameDecoder): Reassembles frames read from the link.
+        frames (deque): Decoded frames not yet consumed.
+        session (Optional[SessionCipher]): Link session cipher, once established.
+        frame_buffer (bytearray): Reused for every DATA frame sealed onto the link.
+        plain_buffer (bytearray): Reused for every DATA frame opened from the link.
+    """
+    def __init__(self, node: 'ProxyNode', peer: Optional['ProxyNode']):
+        self.node = node
+        self.peer = peer
+        self.decoder = FrameDecoder()
+        self.frames = deque()
+        self.session = None
+        self.frame_buffer = bytearray()
+        self.plain_buffer = bytearray()
+
+    def feed(self, data: bytes):
+        """Decode bytes read from the link into the frame queue."""
+        self.frames.extend(self.decoder.feed(data))
+
+    def frame(self, frame_type: int, data: bytes) -> bytes:
+        """
+        Encrypt data for the peer and wrap it in a frame.
+
+        Raises:
+            ValueError: If no session exists and there is no peer to open one with.
+        """
+        if self.session:
+            return encode_frame(frame_type, self.session.seal(data))
+        if not self.peer:
+            raise ValueError(f"Node {self.node.port} has no session to send on")
+        self.session, wrapped_key = self.node.create_session(self.peer)
+        header = bytes([self.session.cipher_id]) + len(wrapped_key).to_bytes(2, 'big') + wrapped_key
+        return encode_frame(frame_type, header + self.session.seal(data))
+
+    def open(self, payload: bytes) -> bytes:
+        """
+        Decrypt a frame payload received from the peer.
+
+        Raises:
+            InvalidToken: If the payload fails authentication.
+        """
+        if not payload:
+            return b""
+        if not self.session:
+            key_length = int.from_bytes(payload[1:3], 'big')
+            self.session = self.node.accept_session(payload[0], payload[3:3 + key_length])
+            payload = payload[3 + key_length:]
+        return self.session.open(payload)
+
+    def next_frame(self) -> Optional[Tuple[int, bytes]]:
+        """Return the next queued or buffered frame without reading the link, or None."""
+        if self.frames:
+            return self.frames.popleft()
+        return self.decoder.next_frame()
+
+    def seal_view(self, data: bytes) -> memoryview:
+        """
+        Seal relay data as a DATA frame in the reusable frame buffer.
+
+        Returns:
+            memoryview: The encoded frame, valid until the next seal_view() call.
+        """
+        if not self.session:
+            return memoryview(self.seal(data))
+        size = FRAME_HEADER.size + self.session.sealed_size(len(data))
+        if len(self.frame_buffer) < size:
+            self.frame_buffer = bytearray(size)
+        view = memoryview(self.frame_buffer)
+        length = self.session.seal_into(data, view[FRAME_HEADER.size:size])
+        FRAME_HEADER.pack_into(view, 0, FRAME_DATA, length)
+        return view[:FRAME_HEADER.size + length]
+
+    def open_view(self, payload: bytes) -> memoryview:
+        """
+        Open a DATA frame payload into the reusable plaintext buffer.
+
+        Returns:
+            memoryview: The plaintext, valid until the next open_view() call.
+
+        Raises:
+            InvalidToken: If the payload fails authentication.
+        """
+        if not self.session:
+            return memoryview(self.open(bytes(payload)))
+        size = self.session.opened_size(len(payload))
+        if len(self.plain_buffer) < size:
+            self.plain_buffer = bytearray(size)
+        view = memoryview(self.plain_buffer)
+        return view[:self.session.open_into(payload, view[:size])]
+
+    def send_frame(self, sock: socket.socket, frame_type: int, data: bytes) -> int:
+        """
+        Send one encrypted frame on a blocking socket.
+
+        Returns:
+            int: Bytes written to the link.
+        """
+        frame = self.frame(frame_type, data)
+        sock.sendall(frame)
+        return len(frame)
+
+    def read_frame(self, sock: socket.socket) -> Tuple[int, bytes]:
+        """
+        Read and decrypt the next frame from a blocking socket.
+
+        Returns:
+            Tuple[int, bytes]: Frame type and decrypted payload.
+
+        Raises:
+            ConnectionError: If the link closes before a full frame arrives.
+        """
+        while not self.frames:
+            data = sock.recv(65536)
+            if not data:
+                raise ConnectionError("Inter-node link closed mid-frame")
+            self.feed(data)
+        frame_type, payload = self.frames.popleft()
+        return frame_type, self.open(payload)
+
+    def seal(self, data: bytes) -> bytes:
+        """Encode relay data as an encrypted DATA frame."""
+        return self.frame(FRAME_DATA, data)
+
+    def seal_eof(self) -> bytes:
+        """Encode end-of-stream for this direction of the link."""
+        return encode_frame(FRAME_EOF, b"")
+
+    def unseal(self, data: bytes) -> Tuple[bytes, bool]:
+        """
+        Decode relay bytes read from the link, including frames already queued.
+
+        Args:
+            data (bytes): Bytes read from the link (may be empty).
+
+        Returns:
+            Tuple[bytes, bool]: Decrypted payload and whether the peer sent EOF.
+
+        Raises:
+            ValueError: If a frame other than DATA or EOF arrives mid-relay.
+        """
+        self.feed(data)
+        chunks = []
+        eof = False
+        while self.frames:
+            frame_type, payload = self.frames.popleft()
+            if frame_type == FRAME_DATA:
+                chunks.append(self.open(payload))
+            elif frame_type == FRAME_EOF:
+                eof = True
+            else:
+                raise ValueError(f"Unexpected frame type {frame_type:#x} on relay link")
+        return b"".join(chunks), eof
+
+def resolve_host(host: str) -> Tuple[List[str], Optional[float]]:
+    """
+    Resolve a host name with the system resolver.
+
+    Returns:
+        Tuple[List[str], Optional[float]]: Distinct addresses in resolver order,
+        and the record TTL (None: getaddrinfo does not expose it).
+
+    Raises:
+        OSError: If the name does not resolve.
+    """
+    infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    return list(dict.fromkeys(info[4][0] for info in infos)), None
+
+class DNSCache:
+    """
+    Resolver cache used by exit nodes for SOCKS5 domain-name destinations.
+
+    Entries expire after the record TTL, capped at `ttl` (or after `ttl` when
+    the resolver reports none); failed lookups are cached for `negative_ttl`.
+    The cache holds at most `max_entries` names, evicting the least recently
+    used. Concurrent lookups of the same uncached name, from threads or
+    coroutines, share a single resolution.
+
+    Attributes:
+        max_entries (int): Maximum cached names.
+        ttl (float): Longest time a successful lookup is cached, in seconds.
+        negative_ttl (float): Time a failed lookup is cached, in seconds.
+        resolver (Callable): host -> (addresses, ttl or None); raises OSError on failure.
+        entries (OrderedDict): host -> (expires_at, addresses or the lookup error).
+        pending (Dict[str, Future]): Lookups in flight.
+        stats (Dict): Hits, negative hits, misses, coalesced lookups, evictions and hit rate.
+    """
+    def __init__(self, max_entries: int = CONFIG["DNS_CACHE_SIZE"], ttl: float = CONFIG["DNS_CACHE_TTL"],
+                 negative_ttl: float = CONFIG["DNS_NEGATIVE_TTL"], resolver: Callable = resolve_host):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.resolver = resolver
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "negative_hits": 0, "misses": 0, "coalesced": 0, "evicted": 0, "hit_rate": 0.0}
+
+    def begin(self, host: str) -> Tuple[concurrent.futures.Future, bool]:
+        """
+        Find a cached or in-flight lookup for `host`, or register a new one.
+
+        Returns:
+            Tuple[Future, bool]: Future for the addresses, and whether the caller must resolve it.
+        """
+        host = host.lower()
+        with self.lock:
+            entry = self.entries.get(host)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(host)
+                future = concurrent.futures.Future()
+                if isinstance(entry[1], Exception):
+                    self.stats["negative_hits"] += 1
+                    future.set_exception(entry[1])
+                else:
+                    self.stats["hits"] += 1
+                    future.set_result(entry[1])
+                owner = False
+            elif host in self.pending:
+                self.stats["coalesced"] += 1
+                future, owner = self.pending[host], False
+            else:
+                self.stats["misses"] += 1
+                future = self.pending[host] = concurrent.futures.Future()
+                owner = True
+            lookups = self.stats["hits"] + self.stats["negative_hits"] + self.stats["misses"] + self.stats["coalesced"]
+            self.stats["hit_rate"] = (lookups - self.stats["misses"]) / lookups
+        return future, owner
+
+    def resolve(self, host: str, future: concurrent.futures.Future):
+        """Run the resolver for a registered lookup and publish the outcome."""
+        host = host.lower()
+        try:
+            addresses, ttl = self.resolver(host)
+            if not addresses:
+                raise socket.gaierror(socket.EAI_NONAME, f"No addresses for {host}")
+            result, lifetime = addresses, self.ttl if ttl is None else min(ttl, self.ttl)
+        except Exception as e:
+            result, lifetime = e, self.negative_ttl
+        with self.lock:
+            self.pending.pop(host, None)
+            if lifetime > 0:
+                self.entries[host] = (time.monotonic() + lifetime, result)
+                self.entries.move_to_end(host)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.stats["evicted"] += 1
+        if future.done():
+            return  # Cancelled outright; waiters only ever wait on it shielded
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+    def lookup(self, host: str) -> List[str]:
+        """
+        Resolve a host name, blocking the calling thread.
+
+        Raises:
+            OSError: If the name does not resolve (possibly a cached failure).
+        """
+        future, owner = self.begin(host)
+        if owner:
+            self.resolve(host, future)
+        return future.result()
+
+    async def lookup_async(self, host: str) -> List[str]:
+        """
+        Resolve a host name without blocking the event loop.
+
+        Raises:
+            OSError: If the name does not resolve (possibly a cached failure).
+        """
+        future, owner = self.begin(host)
+        if owner:
+            asyncio.get_running_loop().run_in_executor(None, self.resolve, host, future)
+        # Other lookups share the future, so a cancelled waiter must not cancel it
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+class SocketProfile:
+    """
+    Named set of TCP options for a node's listener, hop links and exit connections.
+
+    Options are set before a socket listens or connects, so buffer sizes
+    count toward the advertised window scale; accepted sockets inherit
+    the listener's. Options the platform lacks are skipped.
+
+    Attributes:
+        name (str): Profile name (a SOCKET_PROFILES key).
+        nodelay (bool): Disable Nagle's algorithm, so small writes leave at once.
+        buffer_size (Optional[int]): SO_SNDBUF and SO_RCVBUF in bytes; None keeps kernel autotuning.
+        keepalive (Optional[Tuple[int, int, int]]): Idle seconds, probe interval and probe count; None disables.
+        fastopen (bool): TCP Fast Open on listeners and on links to the next node.
+    """
+    FASTOPEN_QUEUE = 256
+    # Python does not export TCP_FASTOPEN_CONNECT; 30 is its Linux value
+    FASTOPEN_CONNECT = getattr(socket, "TCP_FASTOPEN_CONNECT", 30 if sys.platform.startswith("linux") else None)
+
+    def __init__(self, name: str, nodelay: bool, buffer_size: Optional[int] = None,
+                 keepalive: Optional[Tuple[int, int, int]] = (60, 10, 3), fastopen: bool = True):
+        self.name = name
+        self.nodelay = nodelay
+        self.buffer_size = buffer_size
+        self.keepalive = keepalive
+        self.fastopen = fastopen
+
+    @staticmethod
+    def set(sock: socket.socket, level: int, option: Optional[int], value: int):
+        if option is None:
+            return
+        try:
+            sock.setsockopt(level, option, value)
+        except OSError:
+            pass  # Unsupported here (e.g. Fast Open disabled, or not a TCP socket)
+
+    def apply(self, sock: socket.socket, listener: bool = False, fastopen: bool = True):
+        """
+        Set the profile's options on a socket before it connects or listens.
+
+        Args:
+            sock (socket): TCP socket.
+            listener (bool): Whether the socket will listen, rather than connect.
+            fastopen (bool): Allow Fast Open on a connecting socket; callers racing
+                several connects pass False, as a Fast Open connect() returns at once.
+        """
+        self.set(sock, socket.IPPROTO_TCP, socket.TCP_NODELAY, int(self.nodelay))
+        if self.buffer_size:
+            self.set(sock, socket.SOL_SOCKET, socket.SO_SNDBUF, self.buffer_size)
+            self.set(sock, socket.SOL_SOCKET, socket.SO_RCVBUF, self.buffer_size)
+        if self.keepalive:
+            self.set(sock, socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            for option, value in zip(("TCP_KEEPIDLE", "TCP_KEEPINTVL", "TCP_KEEPCNT"), self.keepalive):
+                self.set(sock, socket.IPPROTO_TCP, getattr(socket, option, None), value)
+        if self.fastopen and listener:
+            self.set(sock, socket.IPPROTO_TCP, getattr(socket, "TCP_FASTOPEN", None), self.FASTOPEN_QUEUE)
+        elif self.fastopen and fastopen:
+            self.set(sock, socket.IPPROTO_TCP, self.FASTOPEN_CONNECT, 1)
+
+    def restore_nodelay(self, sock: socket.socket):
+        """Reapply the Nagle setting on a socket an asyncio transport has forced TCP_NODELAY on."""
+        if not self.nodelay:
+            self.set(sock, socket.IPPROTO_TCP, socket.TCP_NODELAY, 0)
+
+    def connect(self, host: str, port: int, timeout: float) -> socket.socket:
+        """
+        Open a blocking TCP connection with the profile's options, like socket.create_connection.
+
+        Raises:
+            OSError: If no address for the host accepts the connection.
+        """
+        error = None
+        for family, kind, proto, _, address in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM):
+            sock = socket.socket(family, kind, proto)
+            try:
+                self.apply(sock)
+                sock.settimeout(timeout)
+                sock.connect(address)
+                return sock
+            except OSError as e:
+                sock.close()
+                error = e
+        raise error or OSError(f"No addresses for {host}")
+
+    async def connect_async(self, host: str, port: int) -> socket.socket:
+        """
+        Open a non-blocking TCP connection with the profile's options, for asyncio.open_connection(sock=...).
+
+        Raises:
+            OSError: If no address for the host accepts the connection.
+        """
+        loop = asyncio.get_running_loop()
+        error = None
+        for family, kind, proto, _, address in await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM):
+            sock = socket.socket(family, kind, proto)
+            try:
+                self.apply(sock)
+                sock.setblocking(False)
+                await loop.sock_connect(sock, address)
+                return sock
+            except BaseException as e:
+                sock.close()
+                if not isinstance(e, OSError):
+                    raise
+                error = e
+        raise error or OSError(f"No addresses for {host}")
+
+SOCKET_PROFILES = {profile.name: profile for profile in (
+    SocketProfile("interactive", nodelay=True),                       # Small writes leave at once; kernel-sized buffers
+    SocketProfile("bulk", nodelay=False, buffer_size=4 * 1024 * 1024)  # Nagle coalescing and large fixed buffers for throughput
+)}
+
+class ExitConnector:
+    """
+    Opens an exit node's connections to destinations, Happy Eyeballs style (RFC 8305).
+
+    Candidate addresses are interleaved by family, starting with the
+    resolver's first choice. A new attempt starts every `attempt_delay`
+    seconds, or at once when an earlier attempt fails, so a slow or
+    blackholed address costs at most one delay instead of the whole
+    timeout. The first attempt to connect wins and the others are closed.
+
+    Attributes:
+        attempt_delay (float): Seconds before racing the next candidate.
+        timeout (float): Overall connect timeout in seconds.
+        latency (OrderedDict): "host:port" -> connects, mean and last connect time (ms)
+            and the winning address, for the most recent `max_destinations`.
+    """
+    def __init__(self, attempt_delay: float = CONFIG["EXIT_ATTEMPT_DELAY"], timeout: float = CONFIG["EXIT_CONNECT_TIMEOUT"],
+                 max_destinations: int = 256):
+        self.attempt_delay = attempt_delay
+        self.timeout = timeout
+        self.max_destinations = max_destinations
+        self.latency = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def order(addresses: List[str]) -> List[str]:
+        """Interleave IPv6 and IPv4 candidates, keeping the first address first."""
+        first = [address for address in addresses if (":" in address) == (":" in addresses[0])]
+        second = [address for address in addresses if (":" in address) != (":" in addresses[0])]
+        ordered = []
+        for i in range(max(len(first), len(second))):
+            ordered.extend(first[i:i + 1] + second[i:i + 1])
+        return ordered
+
+    def record(self, destination: str, address: str, seconds: float):
+        """Fold one connect time into the destination's latency entry."""
+        with self.lock:
+            entry = self.latency.pop(destination, None) or {"connects": 0, "mean_ms": 0.0}
+            entry["connects"] += 1
+            entry["mean_ms"] += (seconds * 1000 - entry["mean_ms"]) / entry["connects"]
+            entry["last_ms"] = seconds * 1000
+            entry["address"] = address
+            self.latency[destination] = entry
+            while len(self.latency) > self.max_destinations:
+                self.latency.popitem(last=False)
+
+    def snapshot(self) -> Dict:
+        """Copy of the latency entries for reporting, taken under the lock."""
+        with self.lock:
+            return {destination: dict(entry) for destination, entry in self.latency.items()}
+
+    def connect(self, host: str, addresses: List[str], port: int, profile: Optional[SocketProfile] = None) -> socket.socket:
+        """
+        Connect to the first candidate that answers, blocking the calling thread.
+
+        Args:
+            host (str): Destination as requested, for latency records.
+            addresses (List[str]): Resolved candidate addresses.
+            port (int): Destination port.
+            profile (Optional[SocketProfile]): TCP options for the attempts.
+
+        Returns:
+            socket.socket: Connected socket with a `timeout` second timeout.
+
+        Raises:
+            OSError: If every candidate fails or the timeout expires.
+        """
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        candidates = deque(self.order(addresses))
+        attempts = {}
+        next_attempt = 0.0
+        error = None
+        with selectors.DefaultSelector() as selector:
+            try:
+                while candidates or attempts:
+                    now = time.monotonic()
+                    if now >= deadline:
+                        raise socket.timeout(f"Connect to {host}:{port} timed out")
+                    if candidates and (now >= next_attempt or not attempts):
+                        address = candidates.popleft()
+                        sock = socket.socket(socket.AF_INET6 if ":" in address else socket.AF_INET, socket.SOCK_STREAM)
+                        if profile:
+                            profile.apply(sock, fastopen=False)
+                        sock.setblocking(False)
+                        code = sock.connect_ex((address, port))
+                        if code not in (0, errno.EINPROGRESS):
+                            sock.close()
+                            error = OSError(code, os.strerror(code))
+                            next_attempt = 0.0  # e.g. ENETUNREACH: the next candidate starts at once
+                            continue
+                        selector.register(sock, selectors.EVENT_WRITE, address)
+                        attempts[sock] = address
+                        next_attempt = now + self.attempt_delay
+                    wait = deadline - now
+                    if candidates:
+                        wait = min(wait, max(next_attempt - now, 0))
+                    for key, _ in selector.select(wait):
+                        sock = key.fileobj
+                        selector.unregister(sock)
+                        address = attempts.pop(sock)
+                        code = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                        if code:
+                            sock.close()
+                            error = OSError(code, os.strerror(code))
+                            next_attempt = 0.0  # A failure starts the next candidate at once
+                            continue
+                        sock.settimeout(self.timeout)
+                        self.record(f"{host}:{port}", address, time.perf_counter() - started)
+                        return sock
+                raise error or OSError(f"No addresses for {host}")
+            finally:
+                for sock in attempts:
+                    sock.close()
+
+    async def connect_async(self, host: str, addresses: List[str], port: int,
+                            profile: Optional[SocketProfile] = None) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """
+        Connect to the first candidate that answers, without blocking the event loop.
+
+        Args:
+            host (str): Destination as requested, for latency records.
+            addresses (List[str]): Resolved candidate addresses.
+            port (int): Destination port.
+            profile (Optional[SocketProfile]): TCP options for the attempts.
+
+        Returns:
+            Tuple[StreamReader, StreamWriter]: The winning connection.
+
+        Raises:
+            OSError: If every candidate fails.
+            asyncio.TimeoutError: If the timeout expires.
+        """
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        deadline = loop.time() + self.timeout
+        candidates = deque(self.order(addresses))
+        pending = set()
+        error = None
+
+        async def attempt(address: str):
+            if not profile:
+                return address, await asyncio.open_connection(address, port)
+            sock = socket.socket(socket.AF_INET6 if ":" in address else socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                profile.apply(sock, fastopen=False)
+                sock.setblocking(False)
+                await loop.sock_connect(sock, (address, port))
+                streams = await asyncio.open_connection(sock=sock)
+            except BaseException:
+                sock.close()
+                raise
+            profile.restore_nodelay(sock)
+            return address, streams
+
+        try:
+            while candidates or pending:
+                if candidates:
+                    pending.add(asyncio.ensure_future(attempt(candidates.popleft())))
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError(f"Connect to {host}:{port} timed out")
+                done, pending = await asyncio.wait(
+                    pending, timeout=min(self.attempt_delay, remaining) if candidates else remaining,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                winners = [task for task in done if not task.exception()]
+                for task in done:
+                    if task.exception():
+                        error = task.exception()
+                for task in winners[1:]:
+                    task.result()[1][1].close()
+                if winners:
+                    address, (reader, writer) = winners[0].result()
+                    self.record(f"{host}:{port}", address, time.perf_counter() - started)
+                    return reader, writer
+            raise error or OSError(f"No addresses for {host}")
+        finally:
+            for task in pending:
+                task.cancel()
+
+class SlidingWindowLimiter:
+    """
+    Allows a request unless `limit` requests arrived in the last `window` seconds.
+
+    The last `limit` arrival times are kept in a ring, so each decision
+    reads and overwrites one slot: constant time, and memory bounded by
+    `limit` however busy the key is. Slots are claimed in arrival order
+    from an itertools.count, whose next() is atomic in CPython, so
+    concurrent decisions take no lock. Refused requests count toward the
+    window, as they did in the request log this replaces.
+
+    Attributes:
+        limit (int): Requests allowed per window.
+        window (float): Window length in seconds.
+        arrivals (array): Ring of the last `limit` arrival times (monotonic seconds), filled on first use.
+        sequence (count): Numbers arrivals, which picks their ring slot.
+    """
+    def __init__(self, limit: int, window: float = 60.0):
+        self.limit = limit
+        self.window = window
+        self.arrivals = array("d")
+        self.sequence = itertools.count()
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """
+        Record an arrival and decide whether it is within the limit.
+
+        Args:
+            now (Optional[float]): Arrival time in monotonic seconds; defaults to the current time.
+
+        Returns:
+            bool: True if fewer than `limit` requests arrived in the preceding `window` seconds.
+        """
+        now = time.monotonic() if now is None else now
+        arrival = next(self.sequence)
+        if arrival < self.limit:
+            self.arrivals.append(now)  # The ring is not full yet
+            return True
+        slot = arrival % self.limit
+        try:
+            oldest = self.arrivals[slot]
+        except IndexError:
+            return True  # A concurrent earlier arrival has yet to record itself
+        self.arrivals[slot] = now
+        return now - oldest > self.window
+
+class RateLimitTable:
+    """
+    Sliding-window rate limits kept per key (a client address, a destination host), in a bounded table.
+
+    Each key gets its own SlidingWindowLimiter on first use, so one busy
+    key is refused without touching the others. Keys are held in LRU
+    order: the table never tracks more than `max_keys` of them, and keys
+    idle for longer than `ttl` are dropped as later requests pass, so
+    memory stays flat however many distinct keys turn up. An evicted key
+    starts afresh if it returns; with `ttl` at least the window, only
+    LRU pressure can forget a key that is still limited.
+
+    Attributes:
+        limit (int): Requests allowed per key per window; a key picks up a change on its next request.
+        window (float): Window length in seconds.
+        max_keys (int): Most keys tracked at once.
+        ttl (float): Seconds a key may stay idle before it is evicted.
+        entries (OrderedDict): Key -> {"limiter", "allowed", "refused", "last_seen"}, least recently used first.
+        lock (Lock): Guards `entries` and `stats`; held only for one decision.
+        stats (Dict): Table totals: allowed, refused, evicted.
+    """
+    def __init__(self, limit: int, window: float = 60.0, max_keys: int = CONFIG["RATE_LIMIT_KEYS"],
+                 ttl: Optional[float] = None):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.ttl = max(window, ttl or 0.0)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"allowed": 0, "refused": 0, "evicted": 0}
+
+    def allow(self, key: str, now: Optional[float] = None) -> bool:
+        """
+        Record a request for a key and decide whether it is within the key's limit.
+
+        Args:
+            key (str): Key the request is limited by.
+            now (Optional[float]): Arrival time in monotonic seconds; defaults to the current time.
+
+        Returns:
+            bool: True if the key is within its limit, False otherwise.
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = {"limiter": None, "allowed": 0, "refused": 0, "last_seen": now}
+            else:
+                self.entries.move_to_end(key)
+            if entry["limiter"] is None or entry["limiter"].limit != self.limit:
+                entry["limiter"] = SlidingWindowLimiter(self.limit, self.window)
+            allowed = entry["limiter"].allow(now)
+            entry["last_seen"] = now
+            outcome = "allowed" if allowed else "refused"
+            entry[outcome] += 1
+            self.stats[outcome] += 1
+            self.expire(now)
+        return allowed
+
+    def expire(self, now: float):
+        """Evict least recently used keys beyond `max_keys` or idle past `ttl`; call with the lock held."""
+        while self.entries:
+            key, entry = next(iter(self.entries.items()))
+            if len(self.entries) <= self.max_keys and now - entry["last_seen"] <= self.ttl:
+                break
+            del self.entries[key]
+            self.stats["evicted"] += 1
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def snapshot(self, count: Optional[int] = None) -> Dict:
+        """
+        Per-key counters for reporting, most recently active first.
+
+        Args:
+            count (Optional[int]): Most keys to include; all of them by default.
+
+        Returns:
+            Dict: Table settings and totals, and "keys" mapping each key to its allowed/refused counts and idle seconds.
+        """
+        now = time.monotonic()
+        with self.lock:
+            keys = {key: {"allowed": entry["allowed"], "refused": entry["refused"],
+                          "idle_s": round(now - entry["last_seen"], 3)}
+                    for key, entry in itertools.islice(reversed(self.entries.items()), count)}
+            return {"limit": self.limit, "window": self.window, "tracked": len(self.entries), **self.stats, "keys": keys}
+
+class TokenBucket:
+    """
+    Bandwidth limiter that hands out reservations instead of blocking.
+
+    reserve() debits the bucket at once, into debt if need be, and tells
+    the caller how long to wait before sending; callers wait on their own
+    and hold no lock meanwhile, so a throttled connection never stalls the
+    others. Concurrent reservations queue behind each other in debt, so
+    streams sharing the bucket progress in parallel at a combined `rate`.
+
+    The bucket is kept as the time its debt is paid off (the theoretical
+    arrival time of GCRA): it holds `capacity - (paid_at - now) * rate`
+    tokens. A reservation is a single read-modify-write of that value
+    under a lock of its own, never the node's stats lock.
+
+    Attributes:
+        rate (Optional[float]): Refill rate in bytes per second; None for no limit.
+        capacity (float): Burst size in bytes.
+        paid_at (float): Monotonic time at which every reservation so far is paid for.
+        lock (Lock): Guards `paid_at`, and `rate` and `capacity` when they change; held for a few arithmetic operations only.
+        stats (Dict): Reservations, those told to wait and total seconds of waiting handed out.
+    """
+    def __init__(self, rate: Optional[float], capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else (rate or 0)
+        self.paid_at = 0.0
+        self.lock = threading.Lock()
+        self.stats = {"reservations": 0, "delayed": 0, "wait_s": 0.0}
+
+    @property
+    def tokens(self) -> float:
+        """Tokens available now; negative while reservations are in debt."""
+        if self.rate is None:
+            return float("inf")
+        return self.capacity - max(self.paid_at - time.monotonic(), 0) * self.rate
+
+    def reserve(self, size: int) -> float:
+        """
+        Reserve `size` bytes of bandwidth.
+
+        Args:
+            size (int): Bytes about to be sent.
+
+        Returns:
+            float: Seconds the caller must wait before sending them.
+        """
+        if self.rate is None:
+            return 0.0
+        now = time.monotonic()
+        with self.lock:
+            rate = self.rate  # Read again: the traffic shaper may have changed it meanwhile
+            if rate is None:
+                return 0.0
+            self.paid_at = max(self.paid_at, now) + size / rate
+            wait = self.paid_at - now - self.capacity / rate
+            self.stats["reservations"] += 1
+            if wait > 0:
+                self.stats["delayed"] += 1
+                self.stats["wait_s"] += wait
+        return max(wait, 0.0)
+
+# Traffic shaper tuning: burst allowance per flow (seconds at its share), quiet time
+# before a flow's share is lent to others, and how often shares are recomputed
+SHAPING_BURST = 0.1
+SHAPING_IDLE = 0.25
+SHAPING_INTERVAL = 0.05
+
+def fair_shares(capacity: float, bounds: List[Tuple[float, float]]) -> List[float]:
+    """
+    Split capacity max-min fairly among claimants with a floor and a ceiling each.
+
+    Every claimant gets its floor, and what is left rises evenly like a
+    water level, each claimant stopping at its ceiling, until the capacity
+    is used up. If the floors alone exceed the capacity, none of them can
+    be honoured and the capacity is split evenly instead.
+
+    Args:
+        capacity (float): Bytes per second to split; math.inf for no limit.
+        bounds (List[Tuple[float, float]]): (floor, ceiling) per claimant; math.inf for no ceiling.
+
+    Returns:
+        List[float]: Each claimant's share, in order.
+    """
+    if sum(floor for floor, _ in bounds) > capacity:
+        return fair_shares(capacity, [(0.0, ceiling) for _, ceiling in bounds])
+    if sum(ceiling for _, ceiling in bounds) <= capacity:
+        return [ceiling for _, ceiling in bounds]
+    low, high = 0.0, capacity
+    for _ in range(60):
+        level = (low + high) / 2
+        if sum(min(max(level, floor), ceiling) for floor, ceiling in bounds) > capacity:
+            high = level
+        else:
+            low = level
+    return [min(max(low, floor), ceiling) for floor, ceiling in bounds]
+
+class ShapingClass:
+    """
+    Interior class of the hierarchical traffic shaper: the whole chain, or one node.
+
+    The shaper is a tree: the chain at the root, a class per node below
+    it and a ShapedFlow per connection at the leaves. Every class has a
+    floor (guaranteed rate) and a ceiling, and only the leaves pace
+    traffic, each with a TokenBucket of its own. What sets their rates is
+    the split: each class divides its share among its busy children with
+    fair_shares, the root starting from the chain ceiling. Flows gone
+    quiet for SHAPING_IDLE drop out of the split, so their share is
+    borrowed by the busy ones, and a flow waking up triggers a new split
+    at once. Splits also run every SHAPING_INTERVAL under the root's lock;
+    reservations themselves only touch the flow's own bucket.
+
+    Attributes:
+        rate (Optional[float]): Ceiling in bytes per second; None for no ceiling of its own.
+        min_rate (float): Bytes per second guaranteed to this class while it is busy.
+        parent (Optional[ShapingClass]): Class this one draws its share from; None at the root.
+        flow_min_rate (float): Floor of the flows opened on this class.
+        flow_max_rate (Optional[float]): Ceiling of the flows opened on this class.
+        children (WeakSet): Child classes and flows; a flow leaves when its connection drops it.
+        share (float): Bytes per second this class was given in the last split.
+        busy_flows (int): Flows sharing it in the last split.
+        lock (Lock): Serializes splits (the root's is used for the whole tree).
+        reallocate_at (float): Monotonic time of the next periodic split (root only).
+        control (ShapedFlow): Flow for the class's own traffic, such as CONNECT frames.
+    """
+    def __init__(self, rate: Optional[float], parent: Optional['ShapingClass'] = None, min_rate: float = 0.0,
+                 flow_min_rate: float = 0.0, flow_max_rate: Optional[float] = None):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.parent = parent
+        self.flow_min_rate = flow_min_rate
+        self.flow_max_rate = flow_max_rate
+        self.children = weakref.WeakSet()
+        self.share = rate if rate is not None else math.inf
+        self.busy_flows = 0
+        self.lock = threading.Lock()
+        self.reallocate_at = 0.0
+        if parent:
+            parent.children.add(self)
+        self.control = ShapedFlow(self, 0.0, None)
+
+    @property
+    def root(self) -> 'ShapingClass':
+        """Class at the top of the tree."""
+        shaping_class = self
+        while shaping_class.parent:
+            shaping_class = shaping_class.parent
+        return shaping_class
+
+    @property
+    def max_rate(self) -> Optional[float]:
+        """Ceiling as seen by the parent's split."""
+        return self.rate
+
+    @property
+    def stats(self) -> Dict:
+        """Ceiling, current share and busy flows, in kbps where a rate."""
+        return {
+            "rate_kbps": self.rate * 8 / 1000 if self.rate is not None else None,
+            "share_kbps": self.share * 8 / 1000 if self.share != math.inf else None,
+            "busy_flows": self.busy_flows
+        }
+
+    def flow(self, min_rate: Optional[float] = None, max_rate: Optional[float] = None) -> 'ShapedFlow':
+        """
+        Open a flow (one connection's leaf) on this class.
+
+        Args:
+            min_rate (Optional[float]): Guaranteed bytes per second; defaults to `flow_min_rate`.
+            max_rate (Optional[float]): Ceiling in bytes per second; defaults to `flow_max_rate`.
+
+        Returns:
+            ShapedFlow: The flow; it is dropped from the tree once unreferenced.
+        """
+        return ShapedFlow(
+            self, self.flow_min_rate if min_rate is None else min_rate, self.flow_max_rate if max_rate is None else max_rate
+        )
+
+    def reserve(self, size: int) -> float:
+        """
+        Reserve bandwidth for the class's own traffic.
+
+        Args:
+            size (int): Bytes about to be sent.
+
+        Returns:
+            float: Seconds the caller must wait before sending them.
+        """
+        return self.control.reserve(size)
+
+    def busy(self, now: float) -> bool:
+        """Whether any flow below this class has sent recently."""
+        return any(child.busy(now) for child in list(self.children))
+
+    def allocate(self, now: float, force: bool = False):
+        """
+        Split the tree's bandwidth afresh among the classes and flows busy at `now`.
+
+        Args:
+            now (float): Current monotonic time.
+            force (bool): Split even if the periodic split is not due (a flow is waking up).
+        """
+        root = self.root
+        with root.lock:
+            if not force and now < root.reallocate_at:
+                return  # Another thread has just split
+            root.reallocate_at = now + SHAPING_INTERVAL
+            root.split(root.rate if root.rate is not None else math.inf, now)
+
+    def split(self, share: float, now: float):
+        """Take `share` bytes per second and divide it among the busy children; call with the root's lock held."""
+        self.share = share
+        busy = [child for child in list(self.children) if child.busy(now)]
+        shares = fair_shares(share, [
+            (child.min_rate, child.max_rate if child.max_rate is not None else math.inf) for child in busy
+        ])
+        self.busy_flows = 0
+        for child, child_share in zip(busy, shares):
+            child.split(child_share, now)
+            self.busy_flows += child.busy_flows
+
+class ShapedFlow:
+    """
+    Leaf of the traffic shaper: one connection's upstream, paced by its own TokenBucket.
+
+    The bucket's rate is whatever the last split gave the flow, between
+    its floor and ceiling when the parent's share allows.
+
+    Attributes:
+        parent (ShapingClass): Class the flow belongs to.
+        min_rate (float): Guaranteed bytes per second while the flow is busy.
+        max_rate (Optional[float]): Ceiling in bytes per second; None for none.
+        bucket (TokenBucket): Paces the flow's reservations.
+        seen (float): Monotonic time of the flow's last reservation.
+        busy_flows (int): 1, for the parent's count.
+    """
+    def __init__(self, parent: ShapingClass, min_rate: float, max_rate: Optional[float]):
+        self.parent = parent
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.bucket = TokenBucket(None)
+        self.seen = -math.inf
+        self.busy_flows = 1
+        parent.children.add(self)
+
+    def busy(self, now: float) -> bool:
+        """Whether the flow has sent, or is still paying for what it sent, within the last SHAPING_IDLE."""
+        return max(self.seen, self.bucket.paid_at) + SHAPING_IDLE > now
+
+    def split(self, share: float, now: float):
+        """Take `share` bytes per second as the flow's rate."""
+        with self.bucket.lock:
+            self.bucket.rate = share if share != math.inf else None
+            self.bucket.capacity = share * SHAPING_BURST if share != math.inf else 0
+
+    def reserve(self, size: int) -> float:
+        """
+        Reserve `size` bytes of the flow's bandwidth.
+
+        Args:
+            size (int): Bytes about to be sent.
+
+        Returns:
+            float: Seconds the caller must wait before sending them.
+        """
+        now = time.monotonic()
+        waking = not self.busy(now)
+        self.seen = now
+        if waking or now >= self.parent.root.reallocate_at:
+            self.parent.allocate(now, force=waking)
+        return self.bucket.reserve(size)
+
+class AdmissionControl:
+    """
+    Caps the connection handlers a node runs at once and queues the overflow.
+
+    Up to `max_handlers` connections are served concurrently; the next
+    `backlog` wait, oldest first, for a handler to finish, and any beyond
+    that are refused at once. A connection burst therefore degrades into
+    fast SOCKS5 refusals instead of unbounded threads, memory and file
+    descriptors.
+
+    Attributes:
+        max_handlers (int): Handlers allowed to run at once.
+        backlog (int): Connections allowed to wait for a handler.
+        active (int): Handlers running.
+        waiting (deque): (queued_at, start) for each connection waiting for a handler.
+        stats (Dict): Admitted, queued and refused connections, running and peak handlers,
+            and mean and longest queue time (ms).
+    """
+    def __init__(self, max_handlers: int = CONFIG["MAX_HANDLERS"], backlog: int = CONFIG["ACCEPT_BACKLOG"]):
+        self.max_handlers = max_handlers
+        self.backlog = backlog
+        self.active = 0
+        self.waiting = deque()
+        self.dequeued = 0
+        self.lock = threading.Lock()
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "active": 0, "peak_active": 0,
+                      "queue_ms": 0.0, "max_queue_ms": 0.0}
+
+    def admit(self, start: Callable[[], Optional[bool]]) -> bool:
+        """
+        Start a connection's handler now, queue it, or refuse it.
+
+        Args:
+            start (Callable): Starts the handler, which must call release() when done; called
+                at once when a handler is free, otherwise by release() once one frees up. It
+                returns False if the connection has gone away meanwhile.
+
+        Returns:
+            bool: False if the node is saturated and the connection must be refused.
+        """
+        with self.lock:
+            if self.active >= self.max_handlers:
+                if len(self.waiting) >= self.backlog:
+                    self.stats["rejected"] += 1
+                    return False
+                self.waiting.append((time.monotonic(), start))
+                self.stats["queued"] += 1
+                return True
+            self.active += 1
+            self.stats["admitted"] += 1
+            self.stats["active"] = self.active
+            self.stats["peak_active"] = max(self.stats["peak_active"], self.active)
+        if start() is False:
+            self.release()
+        return True
+
+    def release(self):
+        """Free the caller's handler, handing it to the longest-waiting connection."""
+        while True:
+            with self.lock:
+                if not self.waiting:
+                    self.active -= 1
+                    self.stats["active"] = self.active
+                    return
+                queued_at, start = self.waiting.popleft()
+                waited = (time.monotonic() - queued_at) * 1000
+                self.dequeued += 1
+                self.stats["admitted"] += 1
+                self.stats["queue_ms"] += (waited - self.stats["queue_ms"]) / self.dequeued
+                self.stats["max_queue_ms"] = max(self.stats["max_queue_ms"], waited)
+            if start() is not False:
+                return
+
+    async def enter_async(self) -> bool:
+        """
+        Wait on the running event loop for a handler; the caller must release() it when done.
+
+        Returns:
+            bool: False if the node is saturated and the connection must be refused.
+        """
+        admitted = asyncio.get_running_loop().create_future()
+        def start():
+            if admitted.done():
+                return False  # The waiting handler was cancelled
+            admitted.set_result(None)
+        if not self.admit(start):
+            return False
+        try:
+            await admitted
+        except asyncio.CancelledError:
+            if admitted.done() and not admitted.cancelled():
+                self.release()
+            raise
+        return True
+
+class TLSRefusals:
+    """
+    Answers connections a saturated node refuses with SOCKS_REFUSED, over TLS, on one thread.
+
+    A refusal can only be read once the TLS handshake is done, and a peer
+    may never send its ClientHello, so handshakes run non-blocking on a
+    single selector thread and are cut off after `timeout` seconds.
+    Neither the accept thread nor a thread per refusal waits on a slow peer.
+
+    Attributes:
+        context (SSLContext): Server context of the node's listener.
+        timeout (float): Seconds a refused connection gets to complete its handshake.
+        incoming (deque): Refused sockets not yet picked up by the thread.
+        pending (Dict): TLS socket -> monotonic deadline for each handshake in progress.
+    """
+    def __init__(self, context: ssl.SSLContext, timeout: float = 1.0):
+        self.context = context
+        self.timeout = timeout
+        self.incoming = deque()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.closed = False
+        self.thread = None
+        self.waker, self.wake = socket.socketpair()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.waker, selectors.EVENT_READ)
+
+    def refuse(self, sock: socket.socket):
+        """Hand over a refused connection; the thread starts on first use."""
+        with self.lock:
+            if self.closed:
+                sock.close()
+                return
+            self.incoming.append(sock)
+            if not self.thread:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        try:
+            self.wake.send(b"\0")
+        except OSError:
+            pass  # Wake-ups already queued are enough
+
+    def close(self):
+        """Stop the thread, dropping refusals still in progress."""
+        with self.lock:
+            self.closed = True
+            started = self.thread is not None
+        if started:
+            self.wake.send(b"\0")
+        else:
+            self.cleanup()
+
+    def run(self):
+        try:
+            while True:
+                now = time.monotonic()
+                timeout = max(min(self.pending.values()) - now, 0) if self.pending else None
+                for key, _ in self.selector.select(timeout):
+                    if key.fileobj is self.waker:
+                        self.waker.recv(4096)
+                    elif key.fileobj in self.pending:
+                        self.advance(key.fileobj)
+                with self.lock:
+                    if self.closed:
+                        return
+                    incoming, self.incoming = self.incoming, deque()
+                for sock in incoming:
+                    try:
+                        sock.setblocking(False)
+                        tls = self.context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False)
+                    except (OSError, ValueError):
+                        sock.close()
+                        continue
+                    self.pending[tls] = time.monotonic() + self.timeout
+                    self.selector.register(tls, selectors.EVENT_READ)
+                    self.advance(tls)
+                now = time.monotonic()
+                for tls in [tls for tls, deadline in self.pending.items() if deadline <= now]:
+                    self.finish(tls)
+        finally:
+            self.cleanup()
+
+    def advance(self, tls: ssl.SSLSocket):
+        """Continue a handshake; once done, send the refusal and close."""
+        try:
+            tls.do_handshake()
+        except ssl.SSLWantReadError:
+            self.selector.modify(tls, selectors.EVENT_READ)
+            return
+        except ssl.SSLWantWriteError:
+            self.selector.modify(tls, selectors.EVENT_WRITE)
+            return
+        except (OSError, ValueError):
+            self.finish(tls)
+            return
+        try:
+            tls.send(SOCKS_REFUSED)
+            tls.shutdown(socket.SHUT_WR)
+        except (OSError, ValueError):
+            pass
+        self.finish(tls)
+
+    def finish(self, tls: ssl.SSLSocket):
+        del self.pending[tls]
+        self.selector.unregister(tls)
+        tls.close()
+
+    def cleanup(self):
+        for tls in list(self.pending):
+            self.finish(tls)
+        for sock in self.incoming:
+            sock.close()
+        self.selector.close()
+        self.waker.close()
+        self.wake.close()
+
+class AdmissionTCPServer(socketserver.ThreadingTCPServer):
+    """
+    ThreadingTCPServer whose handler threads are capped by the node's AdmissionControl.
+
+    The listener is a plain TCP socket, so accepting never waits on a
+    peer: each admitted connection's TLS handshake runs on its handler
+    thread, under the node's handshake deadline, and refused connections
+    are handed to TLSRefusals without starting a handler.
+
+    Attributes:
+        context (SSLContext): Server context connections are wrapped with.
+        refusals (TLSRefusals): Answers refused connections.
+    """
+    daemon_threads = True     # stop() must not wait for open tunnels
+    block_on_close = False
+
+    def process_request(self, request, client_address):
+        """Start a handler thread for the connection once admitted, or refuse it."""
+        node = self.node
+        def start():
+            threading.Thread(target=self.process_request_thread, args=(request, client_address), daemon=True).start()
+        if node.admission.admit(start):
+            return
+        with node.lock:
+            node.stats["rejected"] += 1
+        self.refusals.refuse(request)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.node.admission.release()
+
+    def finish_request(self, request, client_address):
+        """Complete the TLS handshake on the handler thread, within the handshake deadline, then serve."""
+        node = self.node
+        request.settimeout(node.timeouts["handshake"])
+        tls = self.context.wrap_socket(request, server_side=True, do_handshake_on_connect=False)
+        deadline = ConnectionDeadline(node, lambda: abort_socket(tls), "handshake")
+        try:
+            try:
+                tls.do_handshake()
+            except (OSError, ValueError):
+                return  # Silent, slow or non-TLS peer
+            finally:
+                deadline.cancel()
+            tls.settimeout(None)
+            super().finish_request(tls, client_address)
+        finally:
+            tls.close()  # The wrapped socket owns the connection now
+
+    def server_close(self):
+        super().server_close()
+        self.refusals.close()
+
+class Timer:
+    """
+    A callback scheduled on a TimerWheel.
+
+    Attributes:
+        callback (Callable): Called on the wheel's thread when the timer expires.
+        expires (int): Wheel tick the timer expires at.
+        slot (Optional[int]): Wheel slot holding the timer, None once fired or cancelled.
+    """
+    __slots__ = ("callback", "expires", "slot")
+
+    def __init__(self, callback: Callable[[], None]):
+        self.callback = callback
+        self.expires = 0
+        self.slot = None
+
+class TimerWheel:
+    """
+    Hashed timer wheel (Varghese & Lauck) for connection deadlines.
+
+    Timers hash into `slots` buckets by expiry tick, so scheduling,
+    rescheduling and cancelling are O(1) set operations whatever the
+    number of timers; each tick only visits one bucket. Deadlines are
+    rounded up to the next tick. Expired timers fire on the wheel's
+    thread, which starts on first use and (after a fork) again in the child.
+
+    Attributes:
+        tick (float): Seconds per wheel tick (the timer resolution).
+        slots (List[set]): Timers bucketed by expiry tick modulo the wheel size.
+        current (int): Ticks processed since `origin`.
+        origin (float): Monotonic time of tick 0.
+        stats (Dict): Timers scheduled, fired and cancelled, and timers pending.
+    """
+    def __init__(self, tick: float = CONFIG["TIMER_TICK"], slots: int = 512):
+        self.tick = tick
+        self.slots = [set() for _ in range(slots)]
+        self.origin = time.monotonic()
+        self.current = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stats = {"scheduled": 0, "fired": 0, "cancelled": 0, "pending": 0}
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def after_fork(self):
+        """Drop the parent's timers and lock; the wheel thread restarts on first use."""
+        self.slots = [set() for _ in self.slots]
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stats["pending"] = 0
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> Timer:
+        """Call `callback` after `delay` seconds; returns the timer for reschedule() and cancel()."""
+        timer = Timer(callback)
+        self.reschedule(timer, delay)
+        return timer
+
+    def reschedule(self, timer: Timer, delay: float):
+        """Move a pending, fired or cancelled timer to expire `delay` seconds from now."""
+        expires = max(self.current + 1, math.ceil((time.monotonic() - self.origin + delay) / self.tick))
+        with self.lock:
+            if timer.slot is None:
+                self.stats["scheduled"] += 1
+                self.stats["pending"] += 1
+            else:
+                self.slots[timer.slot].discard(timer)
+            timer.expires = expires
+            timer.slot = expires % len(self.slots)
+            self.slots[timer.slot].add(timer)
+            if not self.thread:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def cancel(self, timer: Timer):
+        """Stop a timer from firing; harmless if it already has."""
+        with self.lock:
+            if timer.slot is not None:
+                self.slots[timer.slot].discard(timer)
+                timer.slot = None
+                self.stats["cancelled"] += 1
+                self.stats["pending"] -= 1
+
+    def advance(self, now: float):
+        """Fire every timer due at or before monotonic time `now`."""
+        due = []
+        with self.lock:
+            target = int((now - self.origin) / self.tick)
+            while self.current < target:
+                self.current += 1
+                bucket = self.slots[self.current % len(self.slots)]
+                expired = [timer for timer in bucket if timer.expires <= self.current]
+                for timer in expired:
+                    bucket.discard(timer)
+                    timer.slot = None
+                due.extend(expired)
+            self.stats["fired"] += len(due)
+            self.stats["pending"] -= len(due)
+        for timer in due:
+            try:
+                timer.callback()
+            except Exception as e:
+                logging.error(f"Timer callback failed: {e}")
+
+    def run(self):
+        while True:
+            time.sleep(self.tick)
+            self.advance(time.monotonic())
+
+timer_wheel = TimerWheel()
+
+def abort_socket(sock: socket.socket):
+    """Shut down a socket from another thread, waking any thread blocked on it."""
+    try:
+        socket.socket.shutdown(sock, socket.SHUT_RDWR)  # Bypass SSLSocket.shutdown, which drops the SSL object
+    except OSError:
+        pass
+
+class ConnectionDeadline:
+    """
+    Handshake, connect and idle deadlines of one inbound connection.
+
+    A connection is in one phase at a time, each with its own timeout from
+    the node's `timeouts`. The idle phase is checked lazily: relays call
+    touch() on traffic, which only stores a timestamp, and when the timer
+    fires it is pushed back to the last activity plus the timeout instead
+    of reaping a connection that has been busy.
+
+    Attributes:
+        node (ProxyNode): Node serving the connection; counts reaped connections.
+        abort (Callable): Tears the connection down; called on the wheel's thread.
+        phase (str): "handshake", "connect" or "idle".
+        last_activity (float): Monotonic time of the last touch().
+        timer (Timer): The connection's timer on the wheel.
+    """
+    def __init__(self, node: 'ProxyNode', abort: Callable[[], None], phase: str = "idle", wheel: TimerWheel = timer_wheel):
+        self.node = node
+        self.abort = abort
+        self.wheel = wheel
+        self.phase = phase
+        self.last_activity = time.monotonic()
+        self.timer = wheel.schedule(node.timeouts[phase], self.expire)
+
+    def enter(self, phase: str):
+        """Start a new phase, with its full timeout."""
+        self.phase = phase
+        self.last_activity = time.monotonic()
+        self.wheel.reschedule(self.timer, self.node.timeouts[phase])
+
+    def touch(self):
+        """Record traffic on an idle-phase connection."""
+        self.last_activity = time.monotonic()
+
+    def cancel(self):
+        self.wheel.cancel(self.timer)
+
+    def expire(self):
+        if self.phase == "idle":
+            remaining = self.last_activity + self.node.timeouts["idle"] - time.monotonic()
+            if remaining > 0:
+                self.wheel.reschedule(self.timer, remaining)
+                return
+        with self.node.lock:
+            self.node.stats["reaped"] += 1
+        logging.warning(f"Node {self.node.port} reaped a connection past its {self.phase} deadline")
+        self.abort()
+
+class HopTLSContext(ssl.SSLContext):
+    """
+    Client SSLContext for links to the next node that resumes the latest TLS session.
+
+    Every socket or asyncio transport wrapped by the context offers `session`
+    unless the caller passes one, so reconnects skip the certificate exchange
+    and signature of a full handshake. TLS 1.3 tickets arrive after the
+    handshake, so links call `remember` once they have read from the peer.
+
+    Attributes:
+        session (Optional[SSLSession]): Most recent resumable session.
+    """
+    session = None
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True,
+                    suppress_ragged_eofs=True, server_hostname=None, session=None):
+        return super().wrap_socket(sock, server_side, do_handshake_on_connect, suppress_ragged_eofs,
+                                   server_hostname, session or self.session)
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        return super().wrap_bio(incoming, outgoing, server_side, server_hostname, session or self.session)
+
+    def remember(self, ssl_object):
+        """Keep the session of an established link if the server issued it a ticket."""
+        session = ssl_object.session if ssl_object is not None else None
+        if session is not None and session.has_ticket:
+            self.session = session
+
+class HopConnectionPool:
+    """
+    Warm TLS connections from a node to its successor.
+
+    A maintenance thread keeps `target` handshaken links ready so a new
+    stream checks one out instead of paying a TCP connect and a TLS
+    handshake. Links are single-use: each carries one circuit. The target
+    starts at `size`, grows by one (up to `max_size`) on every checkout that
+    finds the pool empty, and shrinks back as links sit unused for longer
+    than `idle_timeout` and are evicted. Idle links are health-checked on
+    checkout and on every maintenance pass.
+
+    Attributes:
+        node (ProxyNode): Node the links belong to.
+        next_node (ProxyNode): Node the links connect to.
+        size (int): Minimum number of warm links (0 disables pooling).
+        max_size (int): Upper bound on warm links.
+        idle_timeout (float): Seconds an unused link is kept before eviction.
+        target (int): Current number of warm links to maintain.
+        idle (deque): (link, idle_since) pairs, oldest first.
+        stats (Dict): Checkout hits and misses, evicted and dead links, and the
+            count and mean time (ms) of full and resumed TLS handshakes.
+        context (HopTLSContext): The node's client context, shared by every link.
+        worker (Optional[Thread]): Maintenance thread.
+    """
+    maintenance_interval = 1.0
+
+    def __init__(self, node: 'ProxyNode', next_node: 'ProxyNode', size: int = CONFIG["HOP_POOL_SIZE"],
+                 max_size: int = CONFIG["HOP_POOL_MAX_SIZE"], idle_timeout: float = CONFIG["HOP_POOL_IDLE_TIMEOUT"]):
+        self.node = node
+        self.next_node = next_node
+        self.size = size
+        self.max_size = max(size, max_size)
+        self.idle_timeout = idle_timeout
+        self.target = size
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.stats = {
+            "hits": 0, "misses": 0, "evicted": 0, "dead": 0,
+            "handshakes": 0, "handshake_ms": 0.0, "resumed": 0, "resumed_handshake_ms": 0.0
+        }
+        self.context = node.tls_contexts()[1]
+        self.running = threading.Event()
+        self.wakeup = threading.Event()
+        self.worker = None
+
+    def start(self):
+        """Start filling the pool in the background."""
+        if self.size <= 0:
+            return
+        self.running.set()
+        self.worker = threading.Thread(target=self.maintain, daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        """Stop maintenance and close every idle link."""
+        self.running.clear()
+        self.wakeup.set()
+        if self.worker:
+            self.worker.join(timeout=5)
+        with self.lock:
+            links, self.idle = [link for link, _ in self.idle], deque()
+        for link in links:
+            self.close_link(link)
+
+    def open_link(self) -> ssl.SSLSocket:
+        """
+        Open a new TLS connection to the next node.
+
+        Raises:
+            OSError: If the next node cannot be reached.
+        """
+        started = time.perf_counter()
+        sock = SOCKET_PROFILES[self.node.socket_profile].connect(self.next_node.host, self.next_node.port, timeout=5)
+        try:
+            link = self.context.wrap_socket(sock, server_hostname=self.next_node.host)
+        except Exception:
+            sock.close()
+            raise
+        self.record_handshake(time.perf_counter() - started, link.session_reused)
+        return link
+
+    def record_handshake(self, seconds: float, resumed: bool):
+        """Fold one connect-and-handshake time into the running means."""
+        count, mean = ("resumed", "resumed_handshake_ms") if resumed else ("handshakes", "handshake_ms")
+        with self.lock:
+            self.stats[count] += 1
+            self.stats[mean] += (seconds * 1000 - self.stats[mean]) / self.stats[count]
+
+    @staticmethod
+    def ssl_object(link: ssl.SSLSocket) -> ssl.SSLSocket:
+        return link
+
+    def remember(self, link):
+        """Offer a link's TLS session to the next connection."""
+        self.context.remember(self.ssl_object(link))
+
+    @staticmethod
+    def alive(link: ssl.SSLSocket) -> bool:
+        """
+        Whether an idle link is still open.
+
+        The peer never sends application data first, so a readable link is
+        only healthy if reading consumes TLS records alone (e.g. TLS 1.3
+        session tickets); data or end-of-stream means it is unusable.
+        """
+        try:
+            if link.fileno() < 0:
+                return False
+            if not link.pending() and not select.select([link], [], [], 0)[0]:
+                return True
+            link.setblocking(False)
+            link.recv(1)
+            return False
+        except ssl.SSLWantReadError:
+            return True
+        except (OSError, ValueError):
+            return False
+
+    @staticmethod
+    def close_link(link: ssl.SSLSocket):
+        try:
+            link.close()
+        except OSError:
+            pass
+
+    def take(self) -> Optional[ssl.SSLSocket]:
+        """
+        Pop the newest healthy idle link, counting a hit or a miss.
+
+        Returns:
+            Optional[SSLSocket]: A warm link, or None if the pool is empty.
+        """
+        dead = []
+        link = None
+        with self.lock:
+            while self.idle:
+                candidate, _ = self.idle.pop()
+                if self.alive(candidate):
+                    link = candidate
+                    break
+                dead.append(candidate)
+            self.stats["dead"] += len(dead)
+            if link:
+                self.stats["hits"] += 1
+            else:
+                self.stats["misses"] += 1
+                self.target = min(self.target + 1, self.max_size)
+        for candidate in dead:
+            self.close_link(candidate)
+        if link:
+            self.remember(link)  # The health check has processed any session tickets
+        return link
+
+    def prune(self) -> int:
+        """
+        Drop dead and expired idle links.
+
+        Returns:
+            int: Number of links to open to reach the target.
+        """
+        now = time.monotonic()
+        closed = []
+        with self.lock:
+            for entry in list(self.idle):
+                link, idle_since = entry
+                if not self.alive(link):
+                    self.stats["dead"] += 1
+                elif now - idle_since > self.idle_timeout:
+                    self.stats["evicted"] += 1
+                    self.target = max(self.target - 1, self.size)
+                else:
+                    continue
+                self.idle.remove(entry)
+                closed.append(link)
+            missing = self.target - len(self.idle)
+        for link in closed:
+            self.close_link(link)
+        return missing
+
+    def add(self, link) -> bool:
+        """Add a freshly opened link unless the pool is full or stopped."""
+        with self.lock:
+            if self.running.is_set() and len(self.idle) < self.target:
+                self.idle.append((link, time.monotonic()))
+                return True
+        return False
+
+    def checkout(self) -> ssl.SSLSocket:
+        """
+        Get a TLS link to the next node, warm if one is available.
+
+        Raises:
+            OSError: If no warm link is available and a new one cannot be opened.
+        """
+        link = self.take() if self.size > 0 else None
+        self.wakeup.set()
+        link = link or self.open_link()
+        link.settimeout(None)
+        return link
+
+    def maintain(self):
+        """Keep the pool at its target size, evicting dead and expired links."""
+        while self.running.is_set():
+            self.wakeup.clear()
+            try:
+                for _ in range(max(self.prune(), 0)):
+                    link = self.open_link()
+                    if not self.add(link):
+                        self.close_link(link)
+                        break
+            except Exception as e:
+                logging.warning(f"Node {self.node.port} could not warm links to node {self.next_node.port}: {e}")
+                self.wakeup.wait(5)
+                continue
+            self.wakeup.wait(self.maintenance_interval)
+
+class AsyncHopConnectionPool(HopConnectionPool):
+    """
+    HopConnectionPool for the asyncio engine: links are (reader, writer)
+    pairs, and maintenance is a task on the node's event loop woken by an
+    asyncio.Event.
+    """
+    def start(self):
+        """Start filling the pool; must be called on the event loop."""
+        if self.size <= 0:
+            return
+        self.running.set()
+        self.wakeup = asyncio.Event()
+        self.worker = asyncio.ensure_future(self.maintain())
+
+    async def stop_async(self):
+        """Stop maintenance and close every idle link."""
+        self.running.clear()
+        self.wakeup.set()
+        if self.worker:
+            self.worker.cancel()
+        for link, _ in self.idle:
+            self.close_link(link)
+        self.idle = deque()
+
+    async def open_link(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        started = time.perf_counter()
+        profile = SOCKET_PROFILES[self.node.socket_profile]
+        sock = await asyncio.wait_for(profile.connect_async(self.next_node.host, self.next_node.port), timeout=5)
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(
+                sock=sock, ssl=self.context, server_hostname=self.next_node.host
+            ), timeout=5)
+        except BaseException:
+            sock.close()
+            raise
+        profile.restore_nodelay(sock)
+        self.record_handshake(time.perf_counter() - started, self.ssl_object((reader, writer)).session_reused)
+        return reader, writer
+
+    @staticmethod
+    def ssl_object(link: Tuple[asyncio.StreamReader, asyncio.StreamWriter]) -> ssl.SSLObject:
+        return link[1].get_extra_info("ssl_object")
+
+    @staticmethod
+    def alive(link: Tuple[asyncio.StreamReader, asyncio.StreamWriter]) -> bool:
+        reader, writer = link
+        return not reader.at_eof() and not writer.is_closing()
+
+    @staticmethod
+    def close_link(link: Tuple[asyncio.StreamReader, asyncio.StreamWriter]):
+        link[1].close()
+
+    async def checkout(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        link = self.take() if self.size > 0 else None
+        self.wakeup.set()
+        return link or await self.open_link()
+
+    async def maintain(self):
+        while self.running.is_set():
+            self.wakeup.clear()
+            try:
+                for _ in range(max(self.prune(), 0)):
+                    link = await self.open_link()
+                    if not self.add(link):
+                        self.close_link(link)
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Node {self.node.port} could not warm links to node {self.next_node.port}: {e}")
+                await asyncio.sleep(5)
+                continue
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.maintenance_interval)
+            except asyncio.TimeoutError:
+                pass
+
+def half_close(sock: socket.socket) -> bool:
+    """
+    Signal end-of-stream to the peer while still reading from it.
+
+    SSL/TLS sockets cannot be half-closed: a bare TCP FIN under a TLS session
+    is a truncation error to OpenSSL, so callers must close them fully.
+
+    Args:
+        sock (socket): Plain or SSL/TLS socket to half-close.
+
+    Returns:
+        bool: True if the socket was half-closed, False if it must be closed instead.
+    """
+    if isinstance(sock, ssl.SSLSocket):
+        return False
+    try:
+        sock.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
+    return True
+
+class RelayBufferSizer:
+    """
+    Adaptive read size for one direction of a relayed connection.
+
+    A flow whose reads keep filling the buffer doubles it, up to `maximum`,
+    so bulk transfers pay one recv and one seal per large chunk instead of
+    per 8 KiB. Flows whose reads stay short, or that come back from being
+    idle, fall back toward `minimum`, so interactive and idle connections
+    hold little buffer memory.
+
+    Attributes:
+        minimum (int): Smallest read size in bytes.
+        maximum (int): Largest read size in bytes.
+        size (int): Bytes to read next.
+        full_reads (int): Consecutive reads that filled `size`.
+        short_reads (int): Consecutive reads under a quarter of `size`.
+        last_read (float): Monotonic time of the last read.
+    """
+    grow_after = 2      # Full reads in a row before doubling
+    shrink_after = 4    # Short reads in a row before halving
+    idle_after = 1.0    # Seconds without a read before starting over at the minimum
+
+    def __init__(self, minimum: int = CONFIG["RELAY_BUFFER_MIN"], maximum: int = CONFIG["RELAY_BUFFER_MAX"]):
+        self.minimum = min(minimum, maximum)
+        self.maximum = maximum
+        self.size = self.minimum
+        self.full_reads = 0
+        self.short_reads = 0
+        self.last_read = time.monotonic()
+
+    def record(self, count: int) -> int:
+        """
+        Fold in one read.
+
+        Args:
+            count (int): Bytes the read returned.
+
+        Returns:
+            int: Bytes to read next.
+        """
+        now = time.monotonic()
+        if now - self.last_read > self.idle_after:
+            self.size, self.full_reads, self.short_reads = self.minimum, 0, 0
+        self.last_read = now
+        if count >= self.size:
+            self.short_reads = 0
+            self.full_reads += 1
+            if self.full_reads >= self.grow_after and self.size < self.maximum:
+                self.size, self.full_reads = min(self.size * 2, self.maximum), 0
+        elif count < self.size // 4:
+            self.full_reads = 0
+            self.short_reads += 1
+            if self.short_reads >= self.shrink_after and self.size > self.minimum:
+                self.size, self.short_reads = max(self.size // 2, self.minimum), 0
+        else:
+            self.full_reads = self.short_reads = 0
+        return self.size
+
+def recv_available(sock: socket.socket, buffer: memoryview) -> int:
+    """
+    Read from a non-blocking socket until `buffer` is full or no more data is ready.
+
+    SSL/TLS sockets return at most one record (16 KiB) per recv, so a single
+    call could never fill a large buffer; a short read from a plain socket
+    means it has been drained.
+
+    Args:
+        sock (socket): Non-blocking plain or SSL/TLS socket.
+        buffer (memoryview): Space to read into.
+
+    Returns:
+        int: Bytes read; 0 at end-of-stream.
+
+    Raises:
+        BlockingIOError: (or SSLWantReadError/SSLWantWriteError) If no data was ready at all.
+    """
+    received = 0
+    while received < len(buffer):
+        try:
+            count = sock.recv_into(buffer[received:])
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError, BlockingIOError):
+            if received:
+                break
+            raise
+        if not count:
+            break
+        received += count
+        if received < len(buffer) and not isinstance(sock, ssl.SSLSocket):
+            break
+    return received
+
+def great_circle_km(first: Dict, second: Dict) -> float:
+    """
+    Great-circle distance between two locales, by the haversine formula.
+
+    Args:
+        first (Dict): Locale with "lat" and "lon" in degrees.
+        second (Dict): Locale with "lat" and "lon" in degrees.
+
+    Returns:
+        float: Distance in km.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (first["lat"], first["lon"], second["lat"], second["lon"]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+class LinkEmulator:
+    """
+    The wide-area path between two adjacent nodes, emulated from their locales.
+
+    One-way delay is the propagation time through fibre over the
+    great-circle distance between the locales, stretched by ROUTE_STRETCH
+    since cables do not follow the great circle, plus normally distributed
+    jitter. Relays carry TCP streams, which cannot lose data, so a lost
+    chunk arrives late instead, by the retransmission timeout its sender
+    would wait.
+
+    Attributes:
+        delay (float): Mean one-way delay in seconds.
+        jitter (float): Standard deviation of the delay in seconds.
+        loss (float): Share of chunks lost.
+        rng (Random): Draws jitter and loss.
+        stats (Dict): Distance (km) and mean delay (ms), and chunks carried and lost.
+        lock (Lock): Guards the draws and counts; every relay across the link shares the emulator.
+    """
+    def __init__(self, first: Dict, second: Dict, jitter: float = CONFIG["LINK_JITTER_MS"] / 1000,
+                 loss: float = CONFIG["LINK_LOSS"], rng: Optional[random.Random] = None):
+        distance = great_circle_km(first, second)
+        self.delay = distance * ROUTE_STRETCH / FIBRE_KM_PER_S
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = rng or random.Random()
+        self.stats = {"distance_km": round(distance, 1), "delay_ms": round(self.delay * 1000, 3), "chunks": 0, "lost": 0}
+        self.lock = threading.Lock()
+
+    def arrival(self, now: float, after: float = 0.0) -> float:
+        """
+        When a chunk sent now reaches the far end.
+
+        Args:
+            now (float): Monotonic send time.
+            after (float): Arrival of the stream's previous chunk; streams are never reordered.
+
+        Returns:
+            float: Monotonic arrival time.
+        """
+        with self.lock:
+            due = now + max(self.rng.gauss(self.delay, self.jitter), 0.0)
+            self.stats["chunks"] += 1
+            if self.loss and self.rng.random() < self.loss:
+                self.stats["lost"] += 1
+                due += max(LINK_RTO_MIN, 2 * self.delay + 4 * self.jitter)
+        return max(due, after)
+
+class DelayLine:
+    """
+    One stream's chunks in flight on an emulated link, released in order as they fall due.
+
+    Arrival times never decrease along a stream, so the line is a FIFO
+    whose head is always the next chunk due; relays wait for it on the
+    timers they already run (the threaded relay's selector timeout, the
+    event loop's timer heap) rather than sleeping per chunk.
+
+    Attributes:
+        emulator (LinkEmulator): Link the stream crosses.
+        chunks (deque): (due, chunk) in sending order.
+        held (int): Bytes in flight.
+        last_due (float): Arrival time of the latest chunk.
+    """
+    def __init__(self, emulator: LinkEmulator):
+        self.emulator = emulator
+        self.chunks = deque()
+        self.held = 0
+        self.last_due = 0.0
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @property
+    def full(self) -> bool:
+        """Whether the stream has LINK_EMULATION_HOLD bytes in flight, and should stop reading."""
+        return self.held >= LINK_EMULATION_HOLD
+
+    @property
+    def due(self) -> Optional[float]:
+        """When the next chunk falls due, or None if none is in flight."""
+        return self.chunks[0][0] if self.chunks else None
+
+    def push(self, chunk: bytes, now: float):
+        """Send a chunk at monotonic time `now`."""
+        self.last_due = self.emulator.arrival(now, self.last_due)
+        self.chunks.append((self.last_due, chunk))
+        self.held += len(chunk)
+
+    def pop(self) -> bytes:
+        """Take the head chunk (once due)."""
+        chunk = self.chunks.popleft()[1]
+        self.held -= len(chunk)
+        return chunk
+
+class RelayPump:
+    """
+    One direction of a DuplexRelay.
+
+    Attributes:
+        source (socket): Socket data is read from.
+        destination (socket): Socket data is written to.
+        source_codec (Optional[HopCodec]): Decodes frames when the source is an inter-node link.
+        destination_codec (Optional[HopCodec]): Encodes frames when the destination is an inter-node link.
+        account (Optional[Callable]): Called with each outgoing chunk size; returns seconds to pause reading (bandwidth throttling).
+        line (Optional[DelayLine]): Chunks in flight when the destination is across an emulated link.
+        sizer (Optional[RelayBufferSizer]): Read size for this direction, set by the DuplexRelay.
+        buffer (bytearray): Receive buffer for a raw source, reused until the read size changes.
+        pending (memoryview): Data not yet written to the destination.
+        eof (bool): Whether the source has reached end-of-stream.
+        resume_at (float): Monotonic time before which the source is not read.
+    """
+    def __init__(self, source: socket.socket, destination: socket.socket,
+                 source_codec: Optional[HopCodec] = None, destination_codec: Optional[HopCodec] = None,
+                 account: Optional[Callable[[int], float]] = None, emulator: Optional[LinkEmulator] = None):
+        self.source = source
+        self.destination = destination
+        self.source_codec = source_codec
+        self.destination_codec = destination_codec
+        self.account = account
+        self.line = DelayLine(emulator) if emulator else None
+        self.sizer = None
+        self.buffer = bytearray()
+        self.pending = memoryview(b"")
+        self.eof = False
+        self.resume_at = 0.0
+
+    @property
+    def done(self) -> bool:
+        """Whether the source is exhausted and everything read has been written."""
+        return self.eof and not self.pending and not self.line
+
+    @property
+    def readable(self) -> bool:
+        """Whether a chunk can be processed without waiting for the source socket."""
+        if self.source_codec and (self.source_codec.frames or self.source_codec.decoder.ready):
+            return True
+        return isinstance(self.source, ssl.SSLSocket) and self.source.pending() > 0
+
+class DuplexRelay:
+    """
+    Full-duplex relay between two sockets on a single selector loop.
+
+    Both directions are pumped independently: a direction only reads while its
+    outbound buffer is empty, so a slow receiver backpressures its own sender
+    without stalling the opposite direction. End-of-stream on one side is
+    propagated as a half-close (an EOF frame on inter-node links), and the
+    relay returns once both directions have drained, or as soon as one has
+    if its destination cannot be half-closed (SSL/TLS client), or when either
+    peer disconnects. Other socket errors propagate to the caller.
+
+    The hot loop does not allocate per chunk: raw sources are read with
+    recv_into into the pump's buffer, framed sources into the codec's
+    decoder buffer, and frames are opened and sealed into the codec's
+    reusable buffers, so every write is a memoryview slice. One frame is in
+    flight per direction, which is what makes reusing the buffers safe.
+    Each direction sizes its reads with a RelayBufferSizer, and a raw
+    source's buffer is only reallocated when that size changes. A
+    direction crossing an emulated link copies its frames into its
+    DelayLine and keeps reading until LINK_EMULATION_HOLD bytes are in
+    flight; the selector timeout wakes the loop as each falls due.
+
+    Attributes:
+        upstream (RelayPump): Client-to-target direction.
+        downstream (RelayPump): Target-to-client direction.
+        buffer_size (int): Maximum bytes read per fill.
+        min_buffer_size (int): Bytes read per fill at the start and on quiet flows.
+        deadline (Optional[ConnectionDeadline]): Idle deadline, touched on every read.
+        finished (bool): Set once a drained direction forces the relay to end.
+    """
+    def __init__(self, upstream: RelayPump, downstream: RelayPump, buffer_size: int = CONFIG["RELAY_BUFFER_MAX"],
+                 min_buffer_size: int = CONFIG["RELAY_BUFFER_MIN"], deadline: Optional['ConnectionDeadline'] = None):
+        self.upstream = upstream
+        self.downstream = downstream
+        self.buffer_size = buffer_size
+        self.min_buffer_size = min_buffer_size
+        self.deadline = deadline
+        self.finished = False
+        for pump in (upstream, downstream):
+            pump.sizer = RelayBufferSizer(min_buffer_size, buffer_size)
+            if not pump.source_codec:
+                pump.buffer = bytearray(pump.sizer.size)
+
+    def run(self):
+        """
+        Relay until both directions reach end-of-stream.
+
+        Raises:
+            OSError: If either socket fails.
+            ValueError: If an inter-node link carries an unexpected frame.
+        """
+        pumps = (self.upstream, self.downstream)
+        for sock in (self.upstream.source, self.upstream.destination):
+            sock.setblocking(False)
+        selector = selectors.DefaultSelector()
+        registered = {}
+        try:
+            while not self.finished and not all(pump.done for pump in pumps):
+                now = time.monotonic()
+                interest = {}
+                timeout = None
+                for pump in pumps:
+                    if not pump.pending and pump.line:
+                        due = pump.line.due
+                        if due <= now:
+                            pump.pending = memoryview(pump.line.pop())
+                        else:
+                            timeout = due - now if timeout is None else min(timeout, due - now)
+                    if pump.pending:
+                        interest[pump.destination] = interest.get(pump.destination, 0) | selectors.EVENT_WRITE
+                    elif not pump.eof and not (pump.line and pump.line.full):
+                        if pump.resume_at > now:
+                            wait = pump.resume_at - now
+                            timeout = wait if timeout is None else min(timeout, wait)
+                            continue
+                        if pump.readable:
+                            timeout = 0
+                        interest[pump.source] = interest.get(pump.source, 0) | selectors.EVENT_READ
+                for sock in list(registered):
+                    if sock not in interest:
+                        selector.unregister(sock)
+                        del registered[sock]
+                for sock, events in interest.items():
+                    if sock not in registered:
+                        selector.register(sock, events)
+                    elif registered[sock] != events:
+                        selector.modify(sock, events)
+                    registered[sock] = events
+                ready = {key.fileobj: mask for key, mask in selector.select(timeout)}
+                now = time.monotonic()
+                for pump in pumps:
+                    if pump.pending:
+                        if ready.get(pump.destination, 0) & selectors.EVENT_WRITE:
+                            self.flush(pump)
+                    elif not pump.eof and pump.resume_at <= now and not (pump.line and pump.line.full):
+                        if ready.get(pump.source, 0) & selectors.EVENT_READ or pump.readable:
+                            self.fill(pump)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            selector.close()
+
+    def fill(self, pump: RelayPump):
+        """Read one chunk (or frame) from the pump's source and try to write it straight away."""
+        codec = pump.source_codec
+        if self.deadline:
+            self.deadline.touch()
+        try:
+            if not codec:
+                buffer = pump.buffer
+                size = recv_available(pump.source, memoryview(buffer))
+                if pump.sizer.record(size) != len(buffer):
+                    pump.buffer = bytearray(pump.sizer.size)  # The old buffer lives on in pending until sent
+                self.forward(pump, memoryview(buffer)[:size] if size else None)
+                return
+            frame = codec.next_frame()
+            if frame is None:
+                size = recv_available(pump.source, codec.decoder.writable(pump.sizer.size))
+                pump.sizer.record(size)
+                if not size:
+                    self.forward(pump, None)  # Link closed without an EOF frame
+                    return
+                codec.decoder.commit(size)
+                frame = codec.next_frame()
+                if frame is None:
+                    return
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError, BlockingIOError):
+            return
+        frame_type, payload = frame
+        if frame_type == FRAME_EOF:
+            self.forward(pump, None)
+        elif frame_type == FRAME_DATA:
+            self.forward(pump, codec.open_view(payload))
+        else:
+            raise ValueError(f"Unexpected frame type {frame_type:#x} on relay link")
+
+    def forward(self, pump: RelayPump, data: Optional[memoryview]):
+        """
+        Queue one plaintext chunk for the destination, or end-of-stream if data is None.
+
+        Args:
+            pump (RelayPump): Direction the chunk was read on.
+            data (Optional[memoryview]): Plaintext chunk, or None at end-of-stream.
+        """
+        if data is None:
+            pump.eof = True
+            if not pump.destination_codec:
+                self.close_direction(pump)
+                return
+            data = memoryview(pump.destination_codec.seal_eof())
+        elif not data:
+            return
+        elif pump.destination_codec:
+            data = pump.destination_codec.seal_view(data)
+        if pump.account:
+            delay = pump.account(len(data))
+            if delay:
+                pump.resume_at = time.monotonic() + delay
+        if pump.line is not None:
+            pump.line.push(bytes(data), time.monotonic())  # The frame buffer is reused for the next chunk
+            return
+        pump.pending = data
+        self.flush(pump)
+
+    def flush(self, pump: RelayPump):
+        """Write as much pending data as the destination accepts."""
+        try:
+            sent = pump.destination.send(pump.pending)
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError, BlockingIOError):
+            return
+        pump.pending = pump.pending[sent:]
+        if pump.done:
+            self.close_direction(pump)
+
+    def close_direction(self, pump: RelayPump):
+        """Propagate end-of-stream once a drained direction has been fully written."""
+        # Inter-node links already carry an EOF frame; raw sockets are half-closed if they can be
+        if not pump.destination_codec and not half_close(pump.destination):
+            self.finished = True
+
+class ClientDatagrams:
+    """
+    The entry node's UDP socket for a SOCKS5 UDP ASSOCIATE client.
+
+    Datagrams carry the RFC 1928 UDP request header (RSV, FRAG, address).
+    Only the client that sent the first datagram is served, and only from
+    the address it announced in its request when it announced one;
+    fragments and malformed datagrams are dropped. Reads drain up to
+    `batch` ready datagrams at a time with non-blocking recvfrom, the
+    portable equivalent of recvmmsg.
+
+    Attributes:
+        node (ProxyNode): Entry node.
+        sock (socket): Non-blocking UDP socket bound on the node's host.
+        expected (Optional[str]): Client host announced in the request, if any.
+        client (Optional[Tuple]): Client UDP address, once its first datagram arrives.
+        batch (int): Most datagrams read per receive().
+    """
+    def __init__(self, node: 'ProxyNode', requested: bytes):
+        host, port = parse_socks_address(requested)
+        self.node = node
+        self.expected = host if host not in ("0.0.0.0", "::") else None
+        self.expected_port = port or None
+        self.sock = socket.socket(socket.AF_INET6 if ":" in node.host else socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((node.host, 0))
+        self.sock.setblocking(False)
+        self.client = None
+        self.batch = node.udp_batch
+
+    @property
+    def sockets(self) -> List[socket.socket]:
+        return [self.sock]
+
+    @property
+    def address(self) -> bytes:
+        """BND.ADDR and BND.PORT for the SOCKS5 reply."""
+        return socks_address(*self.sock.getsockname()[:2])
+
+    def receive(self) -> List[Tuple[bytes, bytes]]:
+        """Drain ready datagrams as (destination, data) pairs."""
+        datagrams = []
+        for _ in range(self.batch):
+            try:
+                packet, sender = self.sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                continue  # e.g. ICMP port unreachable reported for an earlier send
+            if self.client is None:
+                if (self.expected and sender[0] != self.expected) or (self.expected_port and sender[1] != self.expected_port):
+                    continue
+                self.client = sender
+            elif sender != self.client:
+                continue
+            if len(packet) < 4 or packet[:3] != b"\x00\x00\x00":
+                continue  # Fragmented (FRAG != 0) or malformed
+            try:
+                datagrams.append(split_socks_address(packet[3:]))
+            except ValueError:
+                continue
+        return datagrams
+
+    def send(self, datagrams: List[Tuple[bytes, bytes]]):
+        """Deliver (source, data) pairs to the client, dropping them if its socket buffer is full."""
+        if self.client is None:
+            return
+        for address, data in datagrams:
+            try:
+                self.sock.sendto(b"\x00\x00\x00" + address + data, self.client)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                continue
+
+    def close(self):
+        self.sock.close()
+
+class DestinationDatagrams:
+    """
+    The exit node's UDP sockets for one UDP ASSOCIATE circuit.
+
+    One unconnected socket per address family sends to every destination.
+    Domain names resolve through the node's DNS cache without blocking the
+    caller; datagrams for a name still resolving are sent once it does.
+    Replies are only relayed from addresses the circuit has sent to.
+
+    Attributes:
+        node (ProxyNode): Exit node.
+        families (Dict[int, socket]): Non-blocking UDP socket per address family.
+        resolved (Dict[bytes, Tuple]): SOCKS5 destination -> socket address.
+        peers (set): Socket addresses the circuit has sent to.
+        batch (int): Most datagrams read per socket per receive().
+    """
+    def __init__(self, node: 'ProxyNode'):
+        self.node = node
+        self.families = {}
+        for family, wildcard in ((socket.AF_INET, "0.0.0.0"), (socket.AF_INET6, "::")):
+            try:
+                sock = socket.socket(family, socket.SOCK_DGRAM)
+                sock.bind((wildcard, 0))
+            except OSError:
+                continue
+            sock.setblocking(False)
+            self.families[family] = sock
+        self.resolved = {}
+        self.peers = set()
+        self.batch = node.udp_batch
+
+    @property
+    def sockets(self) -> List[socket.socket]:
+        return list(self.families.values())
+
+    def receive(self) -> List[Tuple[bytes, bytes]]:
+        """Drain ready replies as (source, data) pairs."""
+        datagrams = []
+        for sock in self.families.values():
+            for _ in range(self.batch):
+                try:
+                    data, sender = sock.recvfrom(65535)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    continue
+                if sender[:2] in self.peers:
+                    datagrams.append((socks_address(*sender[:2]), data))
+        return datagrams
+
+    def send(self, datagrams: List[Tuple[bytes, bytes]]):
+        """Send (destination, data) pairs, resolving domain names as needed."""
+        for address, data in datagrams:
+            target = self.resolved.get(address)
+            if target:
+                self.send_to(target, data)
+                continue
+            try:
+                host, port = parse_socks_address(address)
+            except ValueError:
+                continue
+            if address[0] != SOCKS_ATYP_DOMAIN:
+                self.resolved[address] = (host, port)
+                self.send_to((host, port), data)
+                continue
+            future, owner = self.node.dns_cache.begin(host)
+            if owner:
+                threading.Thread(target=self.node.dns_cache.resolve, args=(host, future), daemon=True).start()
+            future.add_done_callback(lambda future, address=address, port=port, data=data: self.resolve_done(future, address, port, data))
+
+    def resolve_done(self, future: concurrent.futures.Future, address: bytes, port: int, data: bytes):
+        if future.exception():
+            return
+        addresses = [a for a in future.result() if (socket.AF_INET6 if ":" in a else socket.AF_INET) in self.families]
+        if addresses:
+            self.resolved[address] = (addresses[0], port)
+            self.send_to((addresses[0], port), data)
+
+    def send_to(self, target: Tuple[str, int], data: bytes):
+        sock = self.families.get(socket.AF_INET6 if ":" in target[0] else socket.AF_INET)
+        if not sock:
+            return
+        self.peers.add(target)
+        try:
+            sock.sendto(data, target)
+        except OSError:
+            pass  # Full buffer or unreachable: dropped, as UDP would
+
+    def close(self):
+        for sock in self.families.values():
+            sock.close()
+
+class LinkDatagrams:
+    """
+    Batches of datagrams on a non-blocking framed link to an adjacent node.
+
+    Each send() seals the whole batch into one FRAME_UDP, so a hop pays one
+    AEAD call and one write per batch rather than per datagram. Frames the
+    link cannot take yet wait in outbound for relay_datagrams to flush, and a
+    batch arriving with MUX_HIGH_WATER bytes already waiting is dropped, like
+    AsyncLinkDatagrams, so a backed-up link never stalls the relay loop.
+
+    Attributes:
+        sock (socket): SSL/TLS link to the adjacent node.
+        codec (HopCodec): Frame codec for the link.
+        outbound (bytearray): Sealed frames not yet written.
+        dropped (int): Datagrams dropped because the link was backed up.
+    """
+    def __init__(self, sock: socket.socket, codec: HopCodec):
+        self.sock = sock
+        self.codec = codec
+        self.outbound = bytearray()
+        self.dropped = 0
+        sock.setblocking(False)
+
+    @property
+    def sockets(self) -> List[socket.socket]:
+        return [self.sock]
+
+    @property
+    def buffered(self) -> bool:
+        """Whether frames are already decoded, so the socket may never become readable for them."""
+        return bool(self.codec.frames)
+
+    @property
+    def writing(self) -> bool:
+        """Whether sealed frames are waiting for the link to become writable."""
+        return bool(self.outbound)
+
+    def receive(self) -> Optional[List[Tuple[bytes, bytes]]]:
+        """
+        Read the next frames; None once the link is closed or ended.
+
+        Raises:
+            ValueError: If the link carries an unexpected or malformed frame.
+        """
+        if not self.codec.frames:
+            try:
+                data = self.sock.recv(65536)
+            except (BlockingIOError, ssl.SSLWantReadError, ssl.SSLWantWriteError):
+                return []  # Only part of a TLS record has arrived
+            if not data:
+                return None
+            self.codec.feed(data)
+            while isinstance(self.sock, ssl.SSLSocket) and self.sock.pending():
+                self.codec.feed(self.sock.recv(self.sock.pending()))
+        datagrams = []
+        while self.codec.frames:
+            frame_type, payload = self.codec.frames.popleft()
+            if frame_type == FRAME_EOF:
+                return None
+            if frame_type != FRAME_UDP:
+                raise ValueError(f"Unexpected frame type {frame_type:#x} on datagram link")
+            datagrams.extend(unpack_datagrams(self.codec.open(payload)))
+        return datagrams
+
+    def send(self, datagrams: List[Tuple[bytes, bytes]]):
+        if len(self.outbound) >= MUX_HIGH_WATER:
+            self.dropped += len(datagrams)
+            return
+        payload = pack_datagrams(datagrams)
+        if payload:
+            self.outbound += self.codec.frame(FRAME_UDP, payload)
+            self.flush()
+
+    def flush(self):
+        """
+        Write as much of outbound as the link takes without blocking.
+
+        Raises:
+            OSError: If the link fails.
+        """
+        try:
+            while self.outbound:
+                del self.outbound[:self.sock.send(self.outbound)]
+        except (BlockingIOError, ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            pass
+
+    def close(self):
+        self.sock.close()
+
+def relay_datagrams(node: 'ProxyNode', near, far, control: Optional[socket.socket] = None,
+                    deadline: Optional['ConnectionDeadline'] = None):
+    """
+    Relay datagram batches between two sides of a UDP ASSOCIATE circuit until one ends.
+
+    Args:
+        node (ProxyNode): Node relaying; counts datagrams and bytes.
+        near (ClientDatagrams or LinkDatagrams): Client side (entry socket or link from the previous node).
+        far (DestinationDatagrams or LinkDatagrams): Exit side (destination sockets or link to the next node).
+        control (Optional[socket]): The client's TCP connection; the circuit ends when it closes.
+        deadline (Optional[ConnectionDeadline]): Idle deadline, touched on traffic.
+
+    Raises:
+        OSError: If a link fails.
+        ValueError: If a link carries an unexpected frame.
+    """
+    selector = selectors.DefaultSelector()
+    try:
+        for side, other, stat in ((near, far, "bytes_sent"), (far, near, "bytes_received")):
+            for sock in side.sockets:
+                selector.register(sock, selectors.EVENT_READ, (side, other, stat))
+        if control:
+            selector.register(control, selectors.EVENT_READ, None)
+        while True:
+            for key in list(selector.get_map().values()):
+                if key.data:
+                    events = selectors.EVENT_READ | (selectors.EVENT_WRITE if getattr(key.data[0], "writing", False) else 0)
+                    if key.events != events:
+                        selector.modify(key.fileobj, events, key.data)
+            buffered = {key.fileobj: (key, selectors.EVENT_READ) for key in selector.get_map().values()
+                        if key.data and getattr(key.data[0], "buffered", False)}
+            ready = {key.fileobj: (key, mask) for key, mask in selector.select(0 if buffered else None)}
+            for key, mask in {**buffered, **ready}.values():
+                if key.data is None:
+                    if not control.recv(1024):
+                        return  # Client closed the association
+                    continue
+                side, other, stat = key.data
+                if mask & selectors.EVENT_WRITE:
+                    side.flush()
+                if not mask & selectors.EVENT_READ and key.fileobj not in buffered:
+                    continue
+                datagrams = side.receive()
+                if datagrams is None:
+                    return
+                if datagrams:
+                    with node.lock:
+                        node.stats["datagrams"] += len(datagrams)
+                        node.stats[stat] += sum(len(data) for _, data in datagrams)
+                    other.send(datagrams)
+                    if deadline:
+                        deadline.touch()
+    finally:
+        selector.close()
+
+class StreamEndpoint:
+    """
+    One side of an asyncio tunnel backed by a (reader, writer) pair.
+
+    With a codec the stream is an inter-node link carrying DATA/EOF frames;
+    without one it is a raw SOCKS5 client or destination connection.
+
+    Attributes:
+        reader (StreamReader): Stream reader.
+        writer (StreamWriter): Stream writer.
+        codec (Optional[HopCodec]): Frame codec for inter-node links.
+        sizer (RelayBufferSizer): Read size for a raw stream.
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, codec: Optional[HopCodec] = None,
+                 max_read: int = CONFIG["RELAY_BUFFER_MAX"]):
+        self.reader = reader
+        self.writer = writer
+        self.codec = codec
+        self.sizer = RelayBufferSizer(maximum=max_read)
+
+    async def read(self) -> bytes:
+        """
+        Read the next chunk; b"" at end-of-stream.
+
+        Raises:
+            ValueError: If an inter-node link carries an unexpected frame.
+        """
+        if not self.codec:
+            data = await self.reader.read(self.sizer.size)
+            self.sizer.record(len(data))
+            return data
+        frame_type, payload = await read_frame_async(self.reader)
+        if frame_type == FRAME_EOF:
+            return b""
+        if frame_type != FRAME_DATA:
+            raise ValueError(f"Unexpected frame type {frame_type:#x} on relay link")
+        return self.codec.open(payload)
+
+    async def write(self, data: bytes) -> int:
+        """Write one chunk and wait for it to drain; returns bytes put on the wire."""
+        if self.codec:
+            data = self.codec.seal(data)
+        self.writer.write(data)
+        await self.writer.drain()
+        return len(data)
+
+    async def write_eof(self) -> bool:
+        """Propagate end-of-stream; False if the connection cannot be half-closed."""
+        if self.codec:
+            self.writer.write(self.codec.seal_eof())
+            await self.writer.drain()
+            return True
+        if self.writer.can_write_eof():
+            self.writer.write_eof()
+            return True
+        return False
+
+    def close(self):
+        self.writer.close()
+
+class AsyncLinkDatagrams:
+    """
+    Batches of datagrams on an asyncio framed link to an adjacent node (see LinkDatagrams).
+
+    Attributes:
+        reader (StreamReader): Link stream reader.
+        writer (StreamWriter): Link stream writer.
+        codec (HopCodec): Frame codec for the link.
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, codec: HopCodec):
+        self.reader = reader
+        self.writer = writer
+        self.codec = codec
+
+    async def receive(self) -> Optional[List[Tuple[bytes, bytes]]]:
+        """
+        Read the next batch; None once the link is closed or ended.
+
+        Raises:
+            ValueError: If the link carries an unexpected or malformed frame.
+        """
+        try:
+            frame_type, payload = await read_frame_async(self.reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+        if frame_type == FRAME_EOF:
+            return None
+        if frame_type != FRAME_UDP:
+            raise ValueError(f"Unexpected frame type {frame_type:#x} on datagram link")
+        return unpack_datagrams(self.codec.open(payload))
+
+    def send(self, datagrams: List[Tuple[bytes, bytes]]):
+        """Queue a batch on the link, dropping it while the link is backed up, as a UDP path would."""
+        if self.writer.transport.get_write_buffer_size() < MUX_HIGH_WATER:
+            self.writer.write(self.codec.frame(FRAME_UDP, pack_datagrams(datagrams)))
+
+    def close(self):
+        self.writer.close()
+
+class LatencySamples:
+    """
+    The most recent latency samples of one kind, for percentile reporting.
+
+    Attributes:
+        size (int): Samples kept; older ones are overwritten.
+        samples (array): Ring of samples in seconds.
+        count (int): Samples recorded in all.
+    """
+    def __init__(self, size: int = 4096):
+        self.size = size
+        self.samples = array("d")
+        self.count = 0
+
+    def add(self, seconds: float):
+        """Record one sample."""
+        if len(self.samples) < self.size:
+            self.samples.append(seconds)
+        else:
+            self.samples[self.count % self.size] = seconds
+        self.count += 1
+
+    def percentiles(self) -> Dict:
+        """Samples recorded, and median, p90, p99 and largest of those kept, in ms."""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"samples": 0, "p50_ms": None, "p90_ms": None, "p99_ms": None, "max_ms": None}
+        def at(fraction: float) -> float:
+            return round(ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] * 1000, 3)
+        return {"samples": self.count, "p50_ms": at(0.5), "p90_ms": at(0.9), "p99_ms": at(0.99),
+                "max_ms": round(ordered[-1] * 1000, 3)}
+
+class DeficitRoundRobin:
+    """
+    Chooses which flow's item a shared output sends next: deficit round robin over per-flow queues.
+
+    Busy flows take turns, and on its turn a flow sends items until it has
+    spent its deficit, which grows by `quantum` bytes times its class
+    weight each turn; flows therefore share the output in proportion to
+    their weights whatever the size of their items. A flow that turns busy
+    after being idle joins a fast lane served ahead of the round (the new
+    flows list of fq_codel) for its first quantum, so a keystroke waits
+    for at most one item per newly busy flow instead of a whole round of
+    bulk traffic. A flow still busy after its first quantum moves into the
+    round, so the fast lane cannot starve it.
+
+    Attributes:
+        quantum (int): Bytes added to a flow's deficit per turn, before weighting.
+        weights (Dict[str, int]): Deficit multiplier per class.
+        flows (Dict): Flow -> [queue of (item, size, queued_at), deficit, class], for flows in either lane.
+        new (deque): Flows in the fast lane.
+        old (deque): Flows in the round.
+        queued (int): Items waiting.
+        latency (Optional[Dict[str, LatencySamples]]): Where each sent item's wait is recorded, by class.
+    """
+    def __init__(self, quantum: int = MUX_CHUNK, weights: Dict[str, int] = SCHEDULING_CLASSES,
+                 latency: Optional[Dict[str, 'LatencySamples']] = None):
+        self.quantum = quantum
+        self.weights = weights
+        self.flows = {}
+        self.new = deque()
+        self.old = deque()
+        self.queued = 0
+        self.latency = latency
+
+    def __len__(self) -> int:
+        return self.queued
+
+    def push(self, flow, item, size: int, traffic_class: str = "default"):
+        """
+        Queue an item behind the flow's earlier items.
+
+        Args:
+            flow: Key of the flow (any hashable).
+            item: Item to hand back from pop().
+            size (int): Bytes the item costs.
+            traffic_class (str): Class of the flow, for its weight and latency samples.
+        """
+        entry = self.flows.get(flow)
+        if entry is None:
+            entry = self.flows[flow] = [deque(), self.quantum * self.weights.get(traffic_class, 1), traffic_class]
+            self.new.append(flow)
+        entry[0].append((item, size, time.monotonic()))
+        self.queued += 1
+
+    def pop(self) -> Optional[Tuple[object, object]]:
+        """
+        Take the next item to send.
+
+        Returns:
+            Optional[Tuple[object, object]]: (flow, item), or None if nothing is queued.
+        """
+        while self.new or self.old:
+            lane = self.new or self.old
+            flow = lane[0]
+            entry = self.flows[flow]
+            queue, deficit, traffic_class = entry
+            if deficit <= 0:
+                entry[1] += self.quantum * self.weights.get(traffic_class, 1)
+                lane.popleft()
+                self.old.append(flow)
+                continue
+            if not queue:
+                lane.popleft()
+                if lane is self.new and self.old:
+                    self.old.append(flow)  # One more turn in the round, so pausing briefly cannot keep a flow in the fast lane
+                else:
+                    del self.flows[flow]
+                continue
+            item, size, queued_at = queue.popleft()
+            entry[1] -= size
+            self.queued -= 1
+            if self.latency is not None:
+                self.latency[traffic_class].add(time.monotonic() - queued_at)
+            return flow, item
+        return None
+
+class MuxStream:
+    """
+    One client stream carried over a MuxLink.
+
+    Exposes the same read/write/write_eof/close interface as StreamEndpoint.
+    Writes are bounded by the peer's flow-control window for this stream,
+    which the peer reopens with WINDOW frames as it consumes data, so one
+    slow stream cannot monopolise the link or the peer's memory.
+
+    Attributes:
+        link (MuxLink): Link carrying the stream.
+        stream_id (int): Identifier unique on the link.
+        send_window (int): Bytes the peer is prepared to buffer for this stream.
+        traffic_class (str): Class the link scheduler serves the stream in.
+        inbound (deque): Received chunks not yet read.
+        reply (Optional[Future]): SOCKS5 reply to the OPEN frame, on the opening side.
+        remote_eof (bool): Whether the peer has finished sending.
+        local_eof (bool): Whether this side has finished sending.
+        reset (bool): Whether the stream was aborted.
+    """
+    def __init__(self, link: 'MuxLink', stream_id: int, traffic_class: str = "default"):
+        self.link = link
+        self.stream_id = stream_id
+        self.send_window = link.peer_window
+        self.traffic_class = traffic_class
+        self.inbound = deque()
+        self.inbound_bytes = 0
+        self.consumed = 0
+        self.reply = None
+        self.remote_eof = False
+        self.local_eof = False
+        self.reset = False
+        self.readable = asyncio.Event()
+        self.writable = asyncio.Event()
+
+    def wake(self):
+        self.readable.set()
+        self.writable.set()
+
+    async def read(self) -> bytes:
+        """
+        Read the next chunk; b"" at end-of-stream.
+
+        Raises:
+            ConnectionResetError: If the stream or its link was reset.
+        """
+        while not self.inbound:
+            if self.reset:
+                raise ConnectionResetError(f"Stream {self.stream_id} reset")
+            if self.remote_eof:
+                return b""
+            self.readable.clear()
+            await self.readable.wait()
+        data = self.inbound.popleft()
+        self.inbound_bytes -= len(data)
+        self.consumed += len(data)
+        if self.consumed >= self.link.window // 2:
+            self.link.send_control(FRAME_MUX_WINDOW, self.stream_id, MUX_WINDOW_UPDATE.pack(self.consumed))
+            self.consumed = 0
+        return data
+
+    async def write(self, data: bytes) -> int:
+        """
+        Queue data for the peer, waiting for window credit as needed.
+
+        Returns:
+            int: Bytes queued.
+
+        Raises:
+            ConnectionResetError: If the stream or its link was reset.
+        """
+        view = memoryview(data)
+        while view:
+            if self.reset or self.link.closed:
+                raise ConnectionResetError(f"Stream {self.stream_id} reset")
+            if self.send_window <= 0:
+                self.writable.clear()
+                await self.writable.wait()
+                continue
+            await self.link.wait_writable()
+            size = min(len(view), self.send_window, MUX_CHUNK)
+            self.send_window -= size
+            self.link.queue(self, FRAME_MUX_DATA, bytes(view[:size]))
+            view = view[size:]
+        return len(data)
+
+    async def write_eof(self) -> bool:
+        """Tell the peer this side has finished sending."""
+        if not self.local_eof and not self.reset:
+            self.local_eof = True
+            self.link.queue(self, FRAME_MUX_EOF, b"")
+        return True
+
+    def send_reply(self, reply: bytes):
+        """Answer the peer's OPEN with a SOCKS5 reply."""
+        self.link.queue(self, FRAME_MUX_REPLY, reply)
+
+    def close(self):
+        """Release the stream, resetting it unless both directions finished cleanly."""
+        if not self.reset and not (self.local_eof and self.remote_eof) and not self.link.closed:
+            self.link.queue(self, FRAME_MUX_RESET, b"")
+        self.reset = True
+        self.link.forget(self)
+        self.wake()
+
+class MuxLink:
+    """
+    Many client streams multiplexed over one framed TLS link between adjacent nodes.
+
+    The connecting node opens streams; the accepting node serves each OPEN
+    with `on_open`. Every frame is encrypted with the link's session cipher
+    and carries the stream id inside the ciphertext. A single writer task
+    sends the streams' frames in the order a DeficitRoundRobin scheduler
+    picks them, weighted by stream class, with flow-control (WINDOW)
+    frames sent ahead of stream data.
+
+    Attributes:
+        node (ProxyNode): Local node.
+        codec (HopCodec): Link session codec.
+        window (int): Receive window this side advertises per stream.
+        peer_window (int): Receive window the peer advertised per stream.
+        streams (Dict[int, MuxStream]): Open streams by id.
+        scheduler (DeficitRoundRobin): Stream frames waiting for the writer, recording their wait in the node's stats.
+        closed (bool): Whether the link has shut down.
+        stats (Dict): Streams opened and frames sent/received.
+    """
+    def __init__(self, node: 'ProxyNode', reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 codec: HopCodec, window: int, peer_window: int, on_open: Optional[Callable] = None):
+        self.node = node
+        self.reader = reader
+        self.writer = writer
+        self.codec = codec
+        self.window = window
+        self.peer_window = peer_window
+        self.on_open = on_open
+        self.streams = {}
+        self.next_stream_id = 1
+        self.control = deque()
+        self.scheduler = DeficitRoundRobin(latency=node.scheduling)
+        self.queued_bytes = 0
+        self.wakeup = asyncio.Event()
+        self.drained = asyncio.Event()
+        self.drained.set()
+        self.closed = False
+        self.tasks = []
+        self.handlers = set()
+        self.stats = {"streams": 0, "frames_sent": 0, "frames_received": 0}
+
+    @classmethod
+    async def connect(cls, node: 'ProxyNode', next_node: 'ProxyNode', reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter, window: int) -> 'MuxLink':
+        """
+        Open a link over a fresh TLS connection to the next node.
+
+        Raises:
+            ConnectionError: If the next node does not answer the HELLO.
+        """
+        codec = HopCodec(node, next_node)
+        writer.write(codec.frame(FRAME_MUX_HELLO, MUX_WINDOW_UPDATE.pack(window)))
+        await writer.drain()
+        frame_type, payload = await read_frame_async(reader)
+        if frame_type != FRAME_MUX_HELLO:
+            raise ConnectionError(f"Node {next_node.port} refused multiplexed link")
+        link = cls(node, reader, writer, codec, window, MUX_WINDOW_UPDATE.unpack(codec.open(payload))[0])
+        link.start()
+        return link
+
+    @classmethod
+    async def accept(cls, node: 'ProxyNode', reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                     first: bytes, window: int, on_open: Callable) -> 'MuxLink':
+        """Answer the previous node's HELLO and start serving its streams."""
+        codec = HopCodec(node, node.prev_node)
+        _, payload = await read_frame_async(reader, first)
+        peer_window = MUX_WINDOW_UPDATE.unpack(codec.open(payload))[0]
+        writer.write(codec.frame(FRAME_MUX_HELLO, MUX_WINDOW_UPDATE.pack(window)))
+        await writer.drain()
+        link = cls(node, reader, writer, codec, window, peer_window, on_open)
+        link.start()
+        return link
+
+    def start(self):
+        self.tasks = [asyncio.ensure_future(self.read_loop()), asyncio.ensure_future(self.write_loop())]
+
+    async def wait_closed(self):
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def open_stream(self, request: bytes) -> MuxStream:
+        """
+        Open a stream for a SOCKS5 CONNECT request and wait for the peer's reply.
+
+        Raises:
+            ConnectionError: If the link is closed or the peer refuses the CONNECT.
+        """
+        if self.closed:
+            raise ConnectionError("Multiplexed link closed")
+        stream = MuxStream(self, self.next_stream_id, self.node.traffic_class(request))
+        self.next_stream_id += 1
+        self.streams[stream.stream_id] = stream
+        self.stats["streams"] += 1
+        stream.reply = asyncio.get_running_loop().create_future()
+        self.queue(stream, FRAME_MUX_OPEN, request)
+        try:
+            reply = await stream.reply
+            if not reply.startswith(b"\x05\x00"):
+                raise ConnectionError(f"Stream {stream.stream_id} CONNECT refused")
+        except BaseException:
+            stream.close()
+            raise
+        return stream
+
+    def forget(self, stream: MuxStream):
+        self.streams.pop(stream.stream_id, None)
+
+    def queue(self, stream: MuxStream, frame_type: int, data: bytes):
+        """Queue a frame behind the stream's earlier frames."""
+        self.scheduler.push(stream, (frame_type, data), len(data), stream.traffic_class)
+        self.queued_bytes += len(data)
+        self.wakeup.set()
+
+    def send_control(self, frame_type: int, stream_id: int, data: bytes):
+        """Queue a flow-control frame ahead of stream data."""
+        self.control.append((frame_type, stream_id, data))
+        self.wakeup.set()
+
+    async def wait_writable(self):
+        """Wait while the link has more than MUX_HIGH_WATER bytes queued."""
+        while self.queued_bytes > MUX_HIGH_WATER and not self.closed:
+            self.drained.clear()
+            await self.drained.wait()
+
+    async def write_loop(self):
+        """Encrypt and write queued frames, interleaving streams as the scheduler picks."""
+        try:
+            while True:
+                while not self.control and not self.scheduler:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                frames = []
+                while self.control:
+                    frame_type, stream_id, data = self.control.popleft()
+                    frames.append(self.codec.frame(frame_type, MUX_STREAM.pack(stream_id) + data))
+                batch = 0
+                while self.scheduler and batch < MUX_BATCH:
+                    stream, (frame_type, data) = self.scheduler.pop()
+                    self.queued_bytes -= len(data)
+                    batch += len(data)
+                    frames.append(self.codec.frame(frame_type, MUX_STREAM.pack(stream.stream_id) + data))
+                self.stats["frames_sent"] += len(frames)
+                self.writer.writelines(frames)
+                await self.writer.drain()
+                if self.queued_bytes <= MUX_HIGH_WATER:
+                    self.drained.set()
+        except asyncio.CancelledError:
+            raise
+        except (ConnectionError, ssl.SSLError):
+            pass
+        except Exception as e:
+            logging.error(f"Multiplexed link writer error in node {self.node.port}: {e}")
+            self.node.stats["errors"] += 1
+        finally:
+            self.close()
+
+    async def read_loop(self):
+        """Decrypt incoming frames and dispatch them to their streams."""
+        try:
+            while True:
+                frame_type, payload = await read_frame_async(self.reader)
+                self.stats["frames_received"] += 1
+                plain = self.codec.open(payload)
+                stream_id, data = MUX_STREAM.unpack_from(plain)[0], plain[MUX_STREAM.size:]
+                if frame_type == FRAME_MUX_OPEN:
+                    if not self.on_open or stream_id in self.streams:
+                        raise ValueError(f"Unexpected OPEN for stream {stream_id}")
+                    stream = self.streams[stream_id] = MuxStream(self, stream_id, self.node.traffic_class(data))
+                    self.stats["streams"] += 1
+                    handler = asyncio.ensure_future(self.on_open(stream, data))
+                    self.handlers.add(handler)
+                    handler.add_done_callback(self.handlers.discard)
+                    continue
+                stream = self.streams.get(stream_id)
+                if stream is None:
+                    continue  # Stream already closed on this side
+                if frame_type == FRAME_MUX_DATA:
+                    stream.inbound.append(data)
+                    stream.inbound_bytes += len(data)
+                    if stream.inbound_bytes > self.window:
+                        logging.warning(f"Stream {stream_id} overran its window on node {self.node.port}")
+                        stream.close()
+                    stream.readable.set()
+                elif frame_type == FRAME_MUX_WINDOW:
+                    stream.send_window += MUX_WINDOW_UPDATE.unpack(data)[0]
+                    stream.writable.set()
+                elif frame_type == FRAME_MUX_EOF:
+                    stream.remote_eof = True
+                    stream.readable.set()
+                elif frame_type == FRAME_MUX_REPLY and stream.reply and not stream.reply.done():
+                    stream.reply.set_result(data)
+                elif frame_type == FRAME_MUX_RESET:
+                    if stream.reply and not stream.reply.done():
+                        stream.reply.set_exception(ConnectionResetError(f"Stream {stream_id} reset"))
+                    stream.reset = True
+                    self.forget(stream)
+                    stream.wake()
+                else:
+                    raise ValueError(f"Unexpected frame type {frame_type:#x} on multiplexed link")
+        except asyncio.CancelledError:
+            raise
+        except (asyncio.IncompleteReadError, ConnectionError, ssl.SSLError):
+            pass
+        except Exception as e:
+            logging.error(f"Multiplexed link reader error in node {self.node.port}: {e}")
+            self.node.stats["errors"] += 1
+        finally:
+            self.close()
+
+    def close(self):
+        """Shut the link down and reset every stream on it."""
+        if self.closed:
+            return
+        self.closed = True
+        for stream in list(self.streams.values()):
+            if stream.reply and not stream.reply.done():
+                stream.reply.set_exception(ConnectionResetError("Multiplexed link closed"))
+            stream.reset = True
+            stream.wake()
+        self.streams.clear()
+        self.drained.set()
+        current = asyncio.current_task()
+        for task in self.tasks:
+            if task is not current:
+                task.cancel()
+        self.writer.close()
+
+class LocalEndpoint:
+    """
+    One end of an in-process pipe between adjacent nodes on the same event loop.
+
+    Has the read/write/write_eof/close interface of StreamEndpoint, so a hop
+    between two nodes of a shared ChainRuntime is handed over directly
+    instead of through a loopback TLS link and its per-hop encryption. A
+    writer waits while its peer holds more than `limit` unread bytes.
+
+    Attributes:
+        peer (LocalEndpoint): The other end of the pipe.
+        inbound (deque): Chunks written by the peer and not yet read.
+        buffered (int): Bytes in `inbound`.
+        eof (bool): Whether the peer has finished writing.
+        closed (bool): Whether either end has closed the pipe.
+    """
+    limit = 262144
+
+    def __init__(self):
+        self.peer = None
+        self.inbound = deque()
+        self.buffered = 0
+        self.eof = False
+        self.closed = False
+        self.readable = asyncio.Event()
+        self.writable = asyncio.Event()
+
+    @classmethod
+    def pair(cls) -> Tuple['LocalEndpoint', 'LocalEndpoint']:
+        """Create both ends of a pipe."""
+        near, far = cls(), cls()
+        near.peer, far.peer = far, near
+        return near, far
+
+    async def read(self) -> bytes:
+        """
+        Read the next chunk; b"" at end-of-stream.
+
+        Raises:
+            ConnectionResetError: If the pipe was closed before end-of-stream.
+        """
+        while not self.inbound:
+            if self.eof:
+                return b""
+            if self.closed:
+                raise ConnectionResetError("Local hop closed")
+            self.readable.clear()
+            await self.readable.wait()
+        data = self.inbound.popleft()
+        self.buffered -= len(data)
+        self.peer.writable.set()
+        return data
+
+    async def write(self, data: bytes) -> int:
+        """
+        Hand a chunk to the peer, waiting while it is over its limit.
+
+        Raises:
+            ConnectionResetError: If the pipe is closed.
+        """
+        while self.peer.buffered > self.limit and not self.closed:
+            self.writable.clear()
+            await self.writable.wait()
+        if self.closed:
+            raise ConnectionResetError("Local hop closed")
+        self.peer.inbound.append(bytes(data))
+        self.peer.buffered += len(data)
+        self.peer.readable.set()
+        return len(data)
+
+    async def write_eof(self) -> bool:
+        self.peer.eof = True
+        self.peer.readable.set()
+        return True
+
+    def close(self):
+        for end in (self, self.peer):
+            end.closed = True
+            end.readable.set()
+            end.writable.set()
+
+class ChainRuntime:
+    """
+    One event loop thread hosting the asyncio engines of every node in a chain.
+
+    Replaces each node's listener thread(s) and health-check thread with
+    the shared loop and a single health-check task, and lets each node hand
+    circuits to its successor in-process (see LocalEndpoint).
+
+    Attributes:
+        nodes (List[ProxyNode]): Nodes hosted by the runtime.
+        health_check_interval (int): Seconds between health-check rounds.
+        loop (Optional[AbstractEventLoop]): The shared event loop, while running.
+        thread (Optional[Thread]): Thread running the loop.
+        health_task (Optional[Future]): Periodic health check of every node.
+    """
+    def __init__(self, nodes: List['ProxyNode'], health_check_interval: int = CONFIG["HEALTH_CHECK_INTERVAL"]):
+        self.nodes = nodes
+        self.health_check_interval = health_check_interval
+        self.loop = None
+        self.thread = None
+        self.health_task = None
+
+    def start(self):
+        """Start the shared event loop and the health-check task."""
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.health_task = asyncio.run_coroutine_threadsafe(self.health_check(), self.loop)
+
+    def stop(self):
+        """Stop the health checks and the loop; nodes must be stopped first."""
+        if not self.loop:
+            return
+        self.health_task.cancel()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        if not self.loop.is_running():
+            self.loop.close()
+        self.loop = None
+
+    async def health_check(self):
+        """Periodically greet every node and restart those that do not answer."""
+        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            for node in list(self.nodes):
+                if not node.running.is_set():
+                    continue
+                try:
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection(node.host, node.port, ssl=context), timeout=2
+                    )
+                    try:
+                        writer.write(b"\x05\x01\x00")
+                        # A saturated node is still up
+                        healthy = await asyncio.wait_for(reader.readexactly(2), timeout=2) in (b"\x05\x00", SOCKS_REFUSED[:2])
+                    finally:
+                        writer.close()
+                except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                    healthy = False
+                    logging.warning(f"Node {node.port} health check failed: {e}")
+                node.active = healthy
+                if not healthy:
+                    console.print(f"[yellow]Node {node.port} failed health check, restarting...[/yellow]")
+                    # Restarting waits on coroutines scheduled on this loop, so it runs off-loop
+                    await loop.run_in_executor(None, node.restart)
+
+class NodeWorkers:
+    """
+    Worker processes that serve one node's port together with SO_REUSEPORT.
+
+    Workers are forked from the node, so they inherit its Fernet and RSA
+    keys and TLS contexts; the kernel spreads inbound connections across
+    them. Each worker enforces an equal share of the node's rate and
+    bandwidth limits and handler cap, and publishes its stats to its own
+    row of a shared memory array, which the parent folds back into the
+    node's stats. Workers cannot borrow bandwidth across processes, so
+    each also caps itself at an equal share of the node's even slice of
+    the chain ceiling.
+
+    Attributes:
+        node (ProxyNode): Node the workers serve.
+        next_node (Optional[ProxyNode]): Next node in the chain.
+        count (int): Number of worker processes.
+        processes (List[Process]): Running workers.
+        shared (Array): count x len(FIELDS) stats, one row per worker.
+        stopping (Event): Set by the parent to stop every worker.
+    """
+    FIELDS = ("requests", "bytes_sent", "bytes_received", "errors", "latency", "connection_time", "bandwidth_kbps", "dns_hit_rate",
+              "rejected", "queue_ms", "reaped", "datagrams")
+    COUNTERS = ("requests", "bytes_sent", "bytes_received", "errors", "rejected", "reaped", "datagrams")
+    publish_interval = 0.25
+
+    def __init__(self, node: 'ProxyNode', next_node: Optional['ProxyNode'], count: int):
+        self.node = node
+        self.next_node = next_node
+        self.count = count
+        self.context = multiprocessing.get_context("fork")
+        self.shared = self.context.Array("d", count * len(self.FIELDS), lock=False)  # Each row has a single writer
+        self.stopping = self.context.Event()
+        self.processes = []
+        self.collector = None
+
+    def start(self):
+        """Fork the workers and start collecting their stats."""
+        for index in range(self.count):
+            process = self.context.Process(target=self.run, args=(index,), daemon=True)
+            process.start()
+            self.processes.append(process)
+        self.collector = threading.Thread(target=self.collect_forever, daemon=True)
+        self.collector.start()
+
+    def stop(self):
+        """Stop every worker, then fold in their final stats."""
+        self.stopping.set()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=1)
+        if self.collector:
+            self.collector.join(timeout=1)
+        self.collect()
+
+    def alive(self) -> int:
+        """Number of workers still running."""
+        return sum(process.is_alive() for process in self.processes)
+
+    def run(self, index: int):
+        """Worker process body: serve the node's port until the parent stops the workers."""
+        node = self.node
+        # Locks and queues may have been held by parent threads at fork time
+        node.lock = threading.Lock()
+        node.running = threading.Event()
+        node.running.set()
+        node.dns_cache = DNSCache()
+        node.exit_connector = ExitConnector()
+        node.stats = dict.fromkeys(node.stats, 0)
+        node.rate_limit = max(1, node.rate_limit // self.count)
+        for table in ("client_limits", "destination_limits"):
+            limits = getattr(node, table)
+            setattr(node, table, RateLimitTable(max(1, limits.limit // self.count), limits.window, limits.max_keys))
+        node.bandwidth = self.worker_bandwidth()
+        node.admission = AdmissionControl(max(1, node.admission.max_handlers // self.count), node.admission.backlog // self.count)
+        node.worker_pool = None
+        node.runtime = None  # The shared loop's thread does not survive the fork
+        node.worker_index = index
+        node.start(self.next_node)
+        try:
+            while not self.stopping.wait(self.publish_interval):
+                self.publish(index)
+        finally:
+            node.stop()
+            self.publish(index)
+
+    def worker_bandwidth(self) -> ShapingClass:
+        """
+        A worker's own traffic shaper class, standing in for the node's.
+
+        The chain's tree stays with the parent process, so the worker's
+        ceiling is its share of the lower of the node's ceiling and the
+        node's even slice of the chain ceiling.
+
+        Returns:
+            ShapingClass: Parentless class with the node's flow bounds.
+        """
+        bandwidth = self.node.bandwidth
+        ceilings = [bandwidth.rate]
+        chain = bandwidth.parent
+        if chain and chain.rate is not None:
+            nodes = sum(isinstance(child, ShapingClass) for child in chain.children)
+            ceilings.append(chain.rate / max(nodes, 1))
+        ceilings = [rate for rate in ceilings if rate is not None]
+        return ShapingClass(
+            min(ceilings) / self.count if ceilings else None,
+            flow_min_rate=bandwidth.flow_min_rate, flow_max_rate=bandwidth.flow_max_rate
+        )
+
+    def publish(self, index: int):
+        """Copy this worker's stats into its row of the shared array."""
+        row = index * len(self.FIELDS)
+        with self.node.lock:
+            for offset, field in enumerate(self.FIELDS):
+                self.shared[row + offset] = float(self.node.stats.get(field, 0))
+
+    def collect(self):
+        """Fold every worker's row into the parent node's stats: counters summed, gauges averaged."""
+        totals = dict.fromkeys(self.FIELDS, 0.0)
+        for index in range(self.count):
+            for offset, field in enumerate(self.FIELDS):
+                totals[field] += self.shared[index * len(self.FIELDS) + offset]
+        with self.node.lock:
+            for field, total in totals.items():
+                self.node.stats[field] = int(total) if field in self.COUNTERS else total / self.count
+
+    def collect_forever(self):
+        while not self.stopping.wait(self.publish_interval):
+            self.collect()
+
+class AsyncNodeEngine:
+    """
+    asyncio data plane for a ProxyNode.
+
+    Serves the same SOCKS5 handshake and inter-node frame protocol as the
+    threaded SOCKS5Handler, but every connection is a coroutine on one event
+    loop instead of a dedicated OS thread.
+
+    Attributes:
+        node (ProxyNode): Node whose listener this engine runs.
+        next_node (Optional[ProxyNode]): Next node in the chain.
+        loop (AbstractEventLoop): Event loop serving the node.
+        thread (Thread): Thread running the event loop.
+        server (asyncio.Server): Listening SOCKS5 server.
+        pool (Optional[AsyncHopConnectionPool]): Warm links to the next node.
+        owns_loop (bool): Whether the engine runs its own loop, rather than a ChainRuntime's.
+        tasks (set): Connection and stream handlers in flight.
+        link (Optional[MuxLink]): Multiplexed link to the next node, when it runs the asyncio engine.
+        mux_stats (Dict): Multiplexed links and streams opened to the next node.
+    """
+    def __init__(self, node: ProxyNode, next_node: Optional[ProxyNode] = None,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.node = node
+        self.next_node = next_node
+        self.loop = loop
+        self.owns_loop = loop is None
+        self.thread = None
+        self.server = None
+        self.pool = None
+        self.tasks = set()
+        self.link = None
+        self.mux_lock = None
+        self.mux_stats = {"links": 0, "streams": 0}
+
+    def start(self):
+        """
+        Start the event loop thread (unless running on a shared loop) and bind the SSL/TLS listener.
+
+        Raises:
+            Exception: If the listener cannot be bound.
+        """
+        if self.owns_loop:
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+            self.thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(self.start_server(), self.loop).result(timeout=10)
+        except Exception:
+            if self.owns_loop:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.thread.join(timeout=5)
+            raise
+
+    async def start_server(self):
+        """Bind the SOCKS5 listener on the node's host and port."""
+        self.server = await asyncio.start_server(
+            self.handle, self.node.host, self.node.port, ssl=self.node.tls_contexts()[0], reuse_address=True,
+            reuse_port=self.node.worker_index is not None, backlog=self.node.admission.backlog,
+            ssl_handshake_timeout=self.node.timeouts["handshake"]
+        )
+        for sock in self.server.sockets:
+            SOCKET_PROFILES[self.node.socket_profile].apply(sock, listener=True)
+        if self.next_node:
+            # Multiplexed and in-process hops need no warm per-stream links
+            size = 0 if self.uses_mux or self.node.runtime else self.node.hop_pool_size
+            self.pool = self.node.hop_pool = AsyncHopConnectionPool(self.node, self.next_node, size=size)
+            self.pool.start()
+            self.mux_lock = asyncio.Lock()
+
+    def stop(self):
+        """Close the listener, cancel open connections and stop the event loop if the engine owns it."""
+        if not self.loop:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.stop_server(), self.loop).result(timeout=5)
+        finally:
+            if self.owns_loop:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self.thread.join(timeout=5)
+                if not self.loop.is_running():
+                    self.loop.close()
+            self.loop = None
+
+    async def stop_server(self):
+        """Close the listener, the warm link pool and every connection handler."""
+        if self.server:
+            self.server.close()
+        if self.pool:
+            await self.pool.stop_async()
+        if self.link:
+            self.link.close()
+        if self.owns_loop:
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        else:
+            tasks = list(self.tasks)  # Other nodes share the loop
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.server:
+            await self.server.wait_closed()
+
+    async def send_reply(self, writer: asyncio.StreamWriter, reply: bytes):
+        """Write a SOCKS5 reply to the client."""
+        writer.write(reply)
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Handle one inbound connection: a SOCKS5 client or the previous node's framed link.
+
+        Args:
+            reader (StreamReader): Inbound stream reader.
+            writer (StreamWriter): Inbound stream writer.
+        """
+        node = self.node
+        self.tasks.add(asyncio.current_task())
+        admitted = False
+        deadline = None
+        SOCKET_PROFILES[node.socket_profile].restore_nodelay(writer.get_extra_info("socket"))
+        try:
+            admitted = await node.admission.enter_async()
+            if not admitted:
+                with node.lock:
+                    node.stats["rejected"] += 1
+                await self.send_reply(writer, SOCKS_REFUSED)
+                return
+            task = asyncio.current_task()
+            # Nothing sent yet counts as idle: warm links from the previous node wait here
+            deadline = ConnectionDeadline(node, lambda: task.get_loop().call_soon_threadsafe(task.cancel))
+            first = await reader.readexactly(1)
+            if first[0] == FRAME_MUX_HELLO:
+                # One long-lived link carrying many streams; each stream is counted as it opens
+                deadline.cancel()
+                link = await MuxLink.accept(node, reader, writer, first, node.mux_window, self.handle_stream)
+                await link.wait_closed()
+                return
+            start_time = time.time()
+            with node.lock:
+                node.stats["requests"] += 1
+                node.stats["connection_time"] = time.time()
+                node.stats["queue_ms"] = node.admission.stats["queue_ms"]
+            if not node.check_rate_limit():
+                await self.send_reply(writer, b"\x05\x08\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                logging.warning(f"Node {node.port} rate limit exceeded")
+                return
+            deadline.enter("handshake")
+            if first[0] in FRAME_TYPES:
+                await self.handle_hop(reader, writer, first, deadline)
+            else:
+                await self.handle_client(reader, writer, first, deadline)
+            with node.lock:
+                node.stats["latency"] = time.time() - start_time
+                node.stats["connection_time"] = time.time() - node.stats["connection_time"]
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Node {node.port} error: {e}")
+            node.stats["errors"] += 1
+        finally:
+            if deadline:
+                deadline.cancel()
+            if admitted:
+                node.admission.release()
+            self.tasks.discard(asyncio.current_task())
+            writer.close()
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, first: bytes,
+                            deadline: ConnectionDeadline):
+        """
+        Serve a SOCKS5 client: greeting, CONNECT request, then the tunnel.
+
+        Args:
+            reader (StreamReader): Client stream reader.
+            writer (StreamWriter): Client stream writer.
+            first (bytes): First byte already read from the client.
+            deadline (ConnectionDeadline): The connection's deadlines, in the handshake phase.
+        """
+        handshake = SocksHandshake()
+        data = first
+        while True:
+            reply = handshake.feed(data)
+            if reply:
+                await self.send_reply(writer, reply)
+            if handshake.finished:
+                break
+            data = await reader.read(SOCKS_HANDSHAKE_READ)
+            if not data:
+                return
+        if handshake.state == "failed":
+            return
+        cmd, dest = handshake.command, handshake.destination
+        if cmd not in (SOCKS_CMD_CONNECT, SOCKS_CMD_UDP_ASSOCIATE):
+            await self.send_reply(writer, b"\x05\x07\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+            return
+        host = parse_socks_address(dest)[0] if cmd == SOCKS_CMD_CONNECT else None
+        if not self.node.check_keyed_limits(writer.get_extra_info("peername")[0], host):
+            await self.send_reply(writer, b"\x05\x02\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+            return
+        if cmd == SOCKS_CMD_UDP_ASSOCIATE:
+            await self.serve_udp(reader, writer, dest, deadline)
+            return
+        deadline.enter("connect")
+        try:
+            target = await self.connect_upstream(dest)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await self.send_reply(writer, b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+            return
+        await self.send_reply(writer, b"\x05\x00\x00" + dest)
+        deadline.enter("idle")
+        if handshake.buffer:
+            # Data the client sent before waiting for the reply
+            try:
+                self.node.account_upstream(await target.write(bytes(handshake.buffer)))
+            except BaseException:
+                target.close()
+                raise
+        await self.tunnel(StreamEndpoint(reader, writer, max_read=self.node.relay_buffer_max), target, deadline)
+
+    async def handle_hop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, first: bytes,
+                         deadline: ConnectionDeadline):
+        """
+        Serve the previous node: decrypt its CONNECT frame, extend the circuit and tunnel.
+
+        Args:
+            reader (StreamReader): Previous node's stream reader.
+            writer (StreamWriter): Previous node's stream writer.
+            first (bytes): First byte already read from the previous node.
+            deadline (ConnectionDeadline): The connection's deadlines, in the handshake phase.
+
+        Raises:
+            ValueError: If the previous node does not open with a valid CONNECT frame.
+        """
+        node = self.node
+        client_codec = HopCodec(node, node.prev_node)
+        frame_type, payload = await read_frame_async(reader, first)
+        request = client_codec.open(payload)
+        if frame_type != FRAME_CONNECT:
+            raise ValueError(f"Malformed CONNECT frame (type {frame_type:#x}) from previous node")
+        if request[1:2] == bytes([SOCKS_CMD_UDP_ASSOCIATE]):
+            parse_socks_request(request, SOCKS_CMD_UDP_ASSOCIATE)
+            await self.serve_udp_hop(reader, writer, client_codec, deadline)
+            return
+        dest = parse_socks_request(request)
+        deadline.enter("connect")
+        try:
+            target = await self.connect_upstream(dest)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await self.send_reply(writer, client_codec.frame(FRAME_REPLY, b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00"))
+            return
+        await self.send_reply(writer, client_codec.frame(FRAME_REPLY, b"\x05\x00\x00" + dest))
+        deadline.enter("idle")
+        await self.tunnel(StreamEndpoint(reader, writer, client_codec), target, deadline, hop=True)
+
+    async def serve_udp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, requested: bytes,
+                        deadline: ConnectionDeadline):
+        """
+        Serve a SOCKS5 UDP ASSOCIATE: bind the client's UDP socket, extend the circuit and relay
+        datagrams until the client closes its TCP connection.
+
+        Args:
+            reader (StreamReader): Client stream reader.
+            writer (StreamWriter): Client stream writer.
+            requested (bytes): SOCKS5 address the client will send from (zeros if unknown).
+            deadline (ConnectionDeadline): The connection's deadlines.
+        """
+        deadline.enter("connect")
+        client = ClientDatagrams(self.node, requested)
+        try:
+            try:
+                upstream = await self.associate_upstream()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await self.send_reply(writer, b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                return
+            try:
+                await self.send_reply(writer, b"\x05\x00\x00" + client.address)
+                deadline.enter("idle")
+                await self.relay_datagrams(client, upstream, control=reader, deadline=deadline)
+            finally:
+                upstream.close()
+        finally:
+            client.close()
+
+    async def serve_udp_hop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                            client_codec: HopCodec, deadline: ConnectionDeadline):
+        """
+        Serve a UDP ASSOCIATE forwarded by the previous node: extend the circuit and relay
+        datagram batches until the previous node closes the link.
+
+        Args:
+            reader (StreamReader): Previous node's stream reader.
+            writer (StreamWriter): Previous node's stream writer.
+            client_codec (HopCodec): Frame codec for the link from the previous node.
+            deadline (ConnectionDeadline): The connection's deadlines.
+        """
+        deadline.enter("connect")
+        try:
+            upstream = await self.associate_upstream()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await self.send_reply(writer, client_codec.frame(FRAME_REPLY, b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00"))
+            return
+        try:
+            await self.send_reply(writer, client_codec.frame(FRAME_REPLY, b"\x05\x00\x00\x01" + b"\x00" * 6))
+            deadline.enter("idle")
+            await self.relay_datagrams(AsyncLinkDatagrams(reader, writer, client_codec), upstream, deadline=deadline)
+        finally:
+            upstream.close()
+
+    async def associate_upstream(self):
+        """
+        Open the next leg of a UDP ASSOCIATE circuit over a dedicated framed link.
+
+        Multiplexed and in-process hops carry byte streams only, so datagram
+        circuits always take a link of their own.
+
+        Returns:
+            AsyncLinkDatagrams or DestinationDatagrams: Link to the next node, or the exit
+            node's destination sockets.
+
+        Raises:
+            Exception: If the next node cannot be reached or refuses.
+        """
+        node, next_node = self.node, self.next_node
+        if not next_node:
+            return DestinationDatagrams(node)
+        target_writer = None
+        try:
+            target_reader, target_writer = await self.pool.checkout()
+            codec = HopCodec(node, next_node)
+            await self.send_reply(target_writer, codec.frame(FRAME_CONNECT, SOCKS_UDP_ASSOCIATE_REQUEST))
+            frame_type, payload = await read_frame_async(target_reader)
+            if frame_type != FRAME_REPLY or not codec.open(payload).startswith(b"\x05\x00"):
+                raise ConnectionError(f"Node {next_node.port} refused UDP ASSOCIATE")
+            self.pool.remember((target_reader, target_writer))
+            return AsyncLinkDatagrams(target_reader, target_writer, codec)
+        except asyncio.CancelledError:
+            if target_writer:
+                target_writer.close()
+            raise
+        except Exception as e:
+            if target_writer:
+                target_writer.close()
+            logging.error(f"Node {node.port} forwarding error: {e}")
+            node.stats["errors"] += 1
+            raise
+
+    async def relay_datagrams(self, near, far, control: Optional[asyncio.StreamReader] = None,
+                              deadline: Optional[ConnectionDeadline] = None):
+        """
+        Relay datagram batches between two sides of a UDP ASSOCIATE circuit until one ends.
+
+        UDP sockets are drained from loop reader callbacks; each link is read by a task of its own.
+
+        Args:
+            near (ClientDatagrams or AsyncLinkDatagrams): Client side (entry socket or link from the previous node).
+            far (DestinationDatagrams or AsyncLinkDatagrams): Exit side (destination sockets or link to the next node).
+            control (Optional[StreamReader]): The client's TCP connection; the circuit ends when it closes.
+            deadline (Optional[ConnectionDeadline]): Idle deadline, touched on traffic.
+
+        Raises:
+            OSError: If a link fails.
+            ValueError: If a link carries an unexpected frame.
+        """
+        node = self.node
+        loop = asyncio.get_running_loop()
+
+        def forward(datagrams, other, stat):
+            if datagrams:
+                with node.lock:
+                    node.stats["datagrams"] += len(datagrams)
+                    node.stats[stat] += sum(len(data) for _, data in datagrams)
+                other.send(datagrams)
+                if deadline:
+                    deadline.touch()
+
+        async def pump(side, other, stat):
+            while (datagrams := await side.receive()) is not None:
+                forward(datagrams, other, stat)
+
+        async def watch(reader):
+            while await reader.read(1024):
+                pass
+
+        watched, tasks = [], []
+        try:
+            for side, other, stat in ((near, far, "bytes_sent"), (far, near, "bytes_received")):
+                if isinstance(side, AsyncLinkDatagrams):
+                    tasks.append(asyncio.ensure_future(pump(side, other, stat)))
+                    continue
+                for sock in side.sockets:
+                    loop.add_reader(sock, lambda side=side, other=other, stat=stat: forward(side.receive(), other, stat))
+                    watched.append(sock)
+            if control:
+                tasks.append(asyncio.ensure_future(watch(control)))
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for sock in watched:
+                loop.remove_reader(sock)
+            for task in tasks:
+                task.cancel()
+
+    async def handle_stream(self, stream: MuxStream, request: bytes):
+        """
+        Serve one stream opened by the previous node over a multiplexed link.
+
+        Args:
+            stream (MuxStream): The new stream.
+            request (bytes): SOCKS5 CONNECT request carried by the OPEN frame.
+        """
+        await self.serve_forwarded(stream, request, stream.send_reply)
+
+    async def accept_local(self, request: bytes) -> LocalEndpoint:
+        """
+        Take a circuit handed over in-process by the previous node on the same loop.
+
+        Args:
+            request (bytes): SOCKS5 CONNECT request.
+
+        Returns:
+            LocalEndpoint: The previous node's end of the circuit, once this node has extended it.
+
+        Raises:
+            ConnectionError: If this node refuses or cannot extend the circuit.
+        """
+        near, far = LocalEndpoint.pair()
+        reply = asyncio.get_running_loop().create_future()
+        handler = asyncio.ensure_future(self.serve_forwarded(far, request, reply.set_result))
+        await asyncio.wait({reply, handler}, return_when=asyncio.FIRST_COMPLETED)
+        if not reply.done() or not reply.result().startswith(b"\x05\x00"):
+            near.close()
+            raise ConnectionError(f"Node {self.node.port} refused CONNECT")
+        return near
+
+    async def serve_forwarded(self, client, request: bytes, reply: Callable[[bytes], None]):
+        """
+        Serve a CONNECT the previous node forwarded over a multiplexed stream or in-process.
+
+        Args:
+            client (MuxStream or LocalEndpoint): The previous node's side of the circuit.
+            request (bytes): SOCKS5 CONNECT request.
+            reply (Callable): Delivers the SOCKS5 reply to the previous node.
+        """
+        node = self.node
+        self.tasks.add(asyncio.current_task())
+        start_time = time.time()
+        with node.lock:
+            node.stats["requests"] += 1
+            node.stats["connection_time"] = time.time()
+        try:
+            if not node.check_rate_limit():
+                reply(b"\x05\x08\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                logging.warning(f"Node {node.port} rate limit exceeded")
+                return
+            dest = parse_socks_request(request)
+            try:
+                target = await self.connect_upstream(dest)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                reply(b"\x05\x01\x00\x01" + b"\x00" * 4 + b"\x00\x00")
+                return
+            reply(b"\x05\x00\x00" + dest)
+            await self.tunnel(client, target, hop=True)
+            with node.lock:
+                node.stats["latency"] = time.time() - start_time
+                node.stats["connection_time"] = time.time() - node.stats["connection_time"]
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Node {node.port} stream error: {e}")
+            node.stats["errors"] += 1
+        finally:
+            self.tasks.discard(asyncio.current_task())
+            client.close()
+
+    @property
+    def local_next(self) -> Optional['AsyncNodeEngine']:
+        """The next node's engine when both run on the same ChainRuntime loop."""
+        engine = self.next_node.async_engine if self.next_node else None
+        if engine and self.node.runtime and engine.loop is self.loop:
+            return engine
+        return None
+
+    @property
+    def uses_mux(self) -> bool:
+        """Whether streams to the next node are multiplexed over one link."""
+        return bool(self.next_node and self.node.mux and self.next_node.engine == "asyncio")
+
+    async def mux_link(self) -> MuxLink:
+        """
+        Return the multiplexed link to the next node, opening it if needed.
+
+        Raises:
+            Exception: If the next node cannot be reached.
+        """
+        async with self.mux_lock:
+            if not self.link or self.link.closed:
+                reader, writer = await self.pool.open_link()
+                try:
+                    self.link = await asyncio.wait_for(
+                        MuxLink.connect(self.node, self.next_node, reader, writer, self.node.mux_window), timeout=5
+                    )
+                except BaseException:
+                    writer.close()
+                    raise
+                self.pool.remember((reader, writer))
+                self.mux_stats["links"] += 1
+            return self.link
+
+    async def connect_upstream(self, dest: bytes):
+        """
+        Open the next leg of the circuit.
+
+        Args:
+            dest (bytes): SOCKS5 destination (ATYP, DST.ADDR, DST.PORT); domain
+                names are forwarded unresolved and resolved by the exit node.
+
+        Returns:
+            StreamEndpoint, MuxStream or LocalEndpoint: Framed link, multiplexed stream or
+            in-process hop to the next node, or the plain exit connection to the destination.
+
+        Raises:
+            Exception: If the next node or the destination cannot be reached.
+        """
+        node, next_node = self.node, self.next_node
+        if not next_node:
+            try:
+                host, port = parse_socks_address(dest)
+                addresses = [host]
+                if dest[0] == SOCKS_ATYP_DOMAIN:
+                    try:
+                        addresses = await node.dns_cache.lookup_async(host)
+                    finally:
+                        node.stats["dns_hit_rate"] = node.dns_cache.stats["hit_rate"]
+                target_reader, target_writer = await node.exit_connector.connect_async(
+                    host, addresses, port, SOCKET_PROFILES[node.socket_profile]
+                )
+                return StreamEndpoint(target_reader, target_writer, max_read=node.relay_buffer_max)
+            except Exception as e:
+                logging.error(f"Exit node {node.port} connection error: {e}")
+                node.stats["errors"] += 1
+                raise
+        request = b"\x05\x01\x00" + dest
+        local = self.local_next
+        if local:
+            try:
+                await asyncio.sleep(node.reserve_bandwidth(len(request)))
+                return await local.accept_local(request)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Node {node.port} forwarding error: {e}")
+                node.stats["errors"] += 1
+                raise
+        if self.uses_mux:
+            try:
+                link = await self.mux_link()
+                await asyncio.sleep(node.reserve_bandwidth(len(request)))
+                self.mux_stats["streams"] += 1
+                return await asyncio.wait_for(link.open_stream(request), timeout=10)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Node {node.port} forwarding error: {e}")
+                node.stats["errors"] += 1
+                raise
+        target_writer = None
+        try:
+            target_reader, target_writer = await self.pool.checkout()
+            codec = HopCodec(node, next_node)
+            frame = codec.frame(FRAME_CONNECT, request)
+            await self.send_reply(target_writer, frame)
+            await asyncio.sleep(node.reserve_bandwidth(len(frame)))
+            frame_type, payload = await read_frame_async(target_reader)
+            if frame_type != FRAME_REPLY or not codec.open(payload).startswith(b"\x05\x00"):
+                raise ConnectionError(f"Node {next_node.port} refused CONNECT")
+            self.pool.remember((target_reader, target_writer))
+            return StreamEndpoint(target_reader, target_writer, codec)
+        except asyncio.CancelledError:
+            if target_writer:
+                target_writer.close()
+            raise
+        except Exception as e:
+            if target_writer:
+                target_writer.close()
+            logging.error(f"Node {node.port} forwarding error: {e}")
+            node.stats["errors"] += 1
+            raise
+
+    async def tunnel(self, client, target, deadline: Optional[ConnectionDeadline] = None, hop: bool = False):
+        """
+        Tunnel data between client and target in both directions at once.
+
+        Args:
+            client (StreamEndpoint or MuxStream): SOCKS5 client or previous node.
+            target (StreamEndpoint or MuxStream): Destination or next node.
+            deadline (Optional[ConnectionDeadline]): Idle deadline of the inbound connection.
+            hop (bool): Whether the client is the previous node.
+        """
+        node = self.node
+        flow = node.bandwidth.flow()
+        pumps = [
+            asyncio.ensure_future(self.pump(client, target, lambda size: node.account_upstream(size, flow), deadline,
+                                            node.link_emulator(self.next_node))),
+            asyncio.ensure_future(self.pump(target, client, node.account_downstream, deadline,
+                                            node.link_emulator(node.prev_node) if hop else None))
+        ]
+        try:
+            pending = set(pumps)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # A direction that could not half-close its destination ends the whole tunnel
+                if not all(task.result() for task in done):
+                    break
+        except ssl.SSLError as e:
+            logging.error(f"SSL error in tunnel for node {node.port}: {e}")
+            node.stats["errors"] += 1
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logging.error(f"Tunnel error in node {node.port}: {e}")
+            node.stats["errors"] += 1
+        finally:
+            for task in pumps:
+                task.cancel()
+            target.close()
+            client.close()
+
+    async def pump(self, source, destination, account: Callable[[int], float],
+                   deadline: Optional[ConnectionDeadline] = None, emulator: Optional[LinkEmulator] = None) -> bool:
+        """
+        Pump one direction of a tunnel until its source reaches end-of-stream.
+
+        Args:
+            source (StreamEndpoint or MuxStream): Endpoint to read from.
+            destination (StreamEndpoint or MuxStream): Endpoint to write to.
+            account (Callable): Records the outgoing chunk size; returns seconds to pause.
+            deadline (Optional[ConnectionDeadline]): Idle deadline, touched on every chunk.
+            emulator (Optional[LinkEmulator]): Emulated link to the destination, if any.
+
+        Returns:
+            bool: True if end-of-stream was propagated, False if the tunnel must close.
+
+        Raises:
+            ValueError: If the source link carries an unexpected frame.
+        """
+        if emulator:
+            return await self.pump_delayed(source, destination, account, deadline, emulator)
+        while True:
+            data = await source.read()
+            if not data:
+                break
+            if deadline:
+                deadline.touch()
+            delay = account(await destination.write(data))
+            if delay:
+                await asyncio.sleep(delay)
+        return await destination.write_eof()
+
+    async def pump_delayed(self, source, destination, account: Callable[[int], float],
+                           deadline: Optional[ConnectionDeadline], emulator: LinkEmulator) -> bool:
+        """
+        Pump one direction across an emulated link.
+
+        Chunks read are put on a DelayLine and a sender task writes each
+        when it falls due, waiting on the event loop's timer heap, so a
+        stream holds one timer however many chunks are in flight. Reading
+        stops while LINK_EMULATION_HOLD bytes are in flight; end-of-stream
+        travels the line like any chunk.
+
+        Args:
+            source (StreamEndpoint or MuxStream): Endpoint to read from.
+            destination (StreamEndpoint or MuxStream): Endpoint to write to.
+            account (Callable): Records the outgoing chunk size; returns seconds to pause.
+            deadline (Optional[ConnectionDeadline]): Idle deadline, touched on every chunk.
+            emulator (LinkEmulator): Emulated link to the destination.
+
+        Returns:
+            bool: True if end-of-stream was propagated, False if the tunnel must close.
+        """
+        line = DelayLine(emulator)
+        arrived = asyncio.Event()
+        space = asyncio.Event()
+
+        async def send() -> bool:
+            while True:
+                while not line:
+                    arrived.clear()
+                    await arrived.wait()
+                wait = line.due - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                chunk = line.pop()
+                space.set()
+                if not chunk:
+                    return await destination.write_eof()
+                delay = account(await destination.write(chunk))
+                if delay:
+                    await asyncio.sleep(delay)
+
+        sender = asyncio.ensure_future(send())
+        sender.add_done_callback(lambda _: space.set())
+        try:
+            while True:
+                while line.full and not sender.done():
+                    space.clear()
+                    await space.wait()
+                if sender.done():
+                    return sender.result()  # Only ends early when a write failed
+                data = await source.read()
+                if data and deadline:
+                    deadline.touch()
+                line.push(data, time.monotonic())
+                arrived.set()
+                if not data:
+                    return await sender
+        finally:
+            sender.cancel()
+
+class ProxyChain:
+    """
+    Manages the chain of proxy nodes, Tor hidden services, and website creation.
+
+    Attributes:
+        nodes (List[ProxyNode]): List of proxy nodes.
+        websites (List[Dict]): List of websites with metadata.
+        config (Dict): Configuration settings.
+        tf (TimezoneFinder): Timezone finder instance.
+        used_ips (set): Set of used virtual IPs.
+        used_ports (set): Set of used ports.
+        tor_processes (Dict): Dictionary of Tor processes.
+        web_servers (Dict): Dictionary of Flask web servers.
+        runtime (Optional[ChainRuntime]): Shared event loop hosting the nodes, when configured.
+        bandwidth (ShapingClass): Root of the traffic shaper, holding the chain ceiling; each node's class sits under it.
+    """
+    def __init__(self):
+        self.nodes: List[ProxyNode] = []
+        self.websites: List[Dict] = []
+        self.config = self.load_config()
+        self.bandwidth = ShapingClass(self.config.get("chain_bandwidth_kbps", CONFIG["CHAIN_BANDWIDTH_KBPS"]) * 1000 / 8)
+        self.tf = TimezoneFinder()
+        self.used_ips = set()
+        self.used_ports = set()
+        self.tor_processes = {}
+        self.web_servers = {}
+        self.runtime = None
+
+    def validate_ip_range(self, ip_range: str) -> bool:
+        """
+        Validate the IP range format.
+
+        Args:
+            ip_range (str): IP range in CIDR notation.
+
+        Returns:
+            bool: True if valid, False otherwise.
+        """
+        try:
+            network = ipaddress.IPv4Network(ip_range, strict=False)
+            available_ips = len(list(network.hosts()))
+            if available_ips < self.config["node_count"]:
+                console.print(f"[red]IP range {ip_range} has insufficient IPs for {self.config['node_count']} nodes[/red]")
+                logging.error(f"Insufficient IPs in range {ip_range}")
+                return False
+            return True
         except ValueError as e:
             console.print(f"[red]Invalid IP range: {e}[/red]")
             logging.error(f"Invalid IP range: {e}")
@@ -831,13 +6027,38 @@ class ProxyChain:
             "max_port": CONFIG["MAX_PORT"],
             "min_speed_kbps": CONFIG["MIN_SPEED_KBPS"],
             "max_bandwidth_kbps": CONFIG["MAX_BANDWIDTH_KBPS"],
+            "max_connection_kbps": CONFIG["MAX_CONNECTION_KBPS"],
+            "chain_bandwidth_kbps": CONFIG["CHAIN_BANDWIDTH_KBPS"],
             "rate_limit": CONFIG["RATE_LIMIT"],
-            "health_check_interval": CONFIG["HEALTH_CHECK_INTERVAL"]
+            "client_rate_limit": CONFIG["CLIENT_RATE_LIMIT"],
+            "destination_rate_limit": CONFIG["DESTINATION_RATE_LIMIT"],
+            "rate_limit_keys": CONFIG["RATE_LIMIT_KEYS"],
+            "health_check_interval": CONFIG["HEALTH_CHECK_INTERVAL"],
+            "engine": CONFIG["NODE_ENGINE"],
+            "cipher": CONFIG["CIPHER"],
+            "mux_window": CONFIG["MUX_WINDOW"],
+            "relay_buffer_max": CONFIG["RELAY_BUFFER_MAX"],
+            "udp_batch": CONFIG["UDP_BATCH"],
+            "workers": CONFIG["NODE_WORKERS"],
+            "max_handlers": CONFIG["MAX_HANDLERS"],
+            "accept_backlog": CONFIG["ACCEPT_BACKLOG"],
+            "handshake_timeout": CONFIG["HANDSHAKE_TIMEOUT"],
+            "connect_timeout": CONFIG["CONNECT_TIMEOUT"],
+            "idle_timeout": CONFIG["IDLE_TIMEOUT"],
+            "runtime": CONFIG["CHAIN_RUNTIME"],
+            "socket_profile": CONFIG["SOCKET_PROFILE"],
+            "interactive_ports": CONFIG["INTERACTIVE_PORTS"],
+            "link_emulation": CONFIG["LINK_EMULATION"],
+            "link_jitter_ms": CONFIG["LINK_JITTER_MS"],
+            "link_loss": CONFIG["LINK_LOSS"]
         }
         if CONFIG_FILE.exists():
             try:
                 with open(CONFIG_FILE, "r") as f:
-                    config = json.load(f)
+                    config = {**default_config, **json.load(f)}
+                if not (5 <= config["node_count"] <= 99):
+                    config["node_count"] = default_config["node_count"]
+                self.config = config  # The range validators size against node_count
                 if not self.validate_ip_range(config.get("ip_range", default_config["ip_range"])):
                     config["ip_range"] = default_config["ip_range"]
                 if not self.validate_port_range(
@@ -846,16 +6067,55 @@ class ProxyChain:
                 ):
                     config["min_port"] = default_config["min_port"]
                     config["max_port"] = default_config["max_port"]
-                if not (5 <= config.get("node_count", default_config["node_count"]) <= 99):
-                    config["node_count"] = default_config["node_count"]
                 if not (10 <= config.get("min_speed_kbps", default_config["min_speed_kbps"]) <= 1000):
                     config["min_speed_kbps"] = default_config["min_speed_kbps"]
                 if not (100 <= config.get("max_bandwidth_kbps", default_config["max_bandwidth_kbps"]) <= 10000):
                     config["max_bandwidth_kbps"] = default_config["max_bandwidth_kbps"]
+                if not (config["min_speed_kbps"] <= config.get("max_connection_kbps", default_config["max_connection_kbps"]) <= 10000):
+                    config["max_connection_kbps"] = default_config["max_connection_kbps"]
+                if not (100 <= config.get("chain_bandwidth_kbps", default_config["chain_bandwidth_kbps"]) <= 1000000):
+                    config["chain_bandwidth_kbps"] = default_config["chain_bandwidth_kbps"]
                 if not (1 <= config.get("rate_limit", default_config["rate_limit"]) <= 1000):
                     config["rate_limit"] = default_config["rate_limit"]
+                for key in ("client_rate_limit", "destination_rate_limit"):
+                    if not (1 <= config.get(key, default_config[key]) <= 1000):
+                        config[key] = default_config[key]
+                if not (16 <= config.get("rate_limit_keys", default_config["rate_limit_keys"]) <= 65536):
+                    config["rate_limit_keys"] = default_config["rate_limit_keys"]
                 if not (10 <= config.get("health_check_interval", default_config["health_check_interval"]) <= 300):
                     config["health_check_interval"] = default_config["health_check_interval"]
+                if config.get("engine", default_config["engine"]) not in NODE_ENGINES:
+                    config["engine"] = default_config["engine"]
+                if config.get("cipher", default_config["cipher"]) not in SESSION_CIPHERS:
+                    config["cipher"] = default_config["cipher"]
+                if not (16384 <= config.get("mux_window", default_config["mux_window"]) <= FRAME_MAX_PAYLOAD):
+                    config["mux_window"] = default_config["mux_window"]
+                if not (CONFIG["RELAY_BUFFER_MIN"] <= config.get("relay_buffer_max", default_config["relay_buffer_max"]) <= 4 * 1024 * 1024):
+                    config["relay_buffer_max"] = default_config["relay_buffer_max"]
+                if not (1 <= config.get("udp_batch", default_config["udp_batch"]) <= 1024):
+                    config["udp_batch"] = default_config["udp_batch"]
+                if not (1 <= config.get("workers", default_config["workers"]) <= 64):
+                    config["workers"] = default_config["workers"]
+                if not (1 <= config.get("max_handlers", default_config["max_handlers"]) <= 4096):
+                    config["max_handlers"] = default_config["max_handlers"]
+                if not (0 <= config.get("accept_backlog", default_config["accept_backlog"]) <= 4096):
+                    config["accept_backlog"] = default_config["accept_backlog"]
+                for key in ("handshake_timeout", "connect_timeout", "idle_timeout"):
+                    if not (1 <= config.get(key, default_config[key]) <= 86400):
+                        config[key] = default_config[key]
+                if config.get("runtime", default_config["runtime"]) not in CHAIN_RUNTIMES:
+                    config["runtime"] = default_config["runtime"]
+                if config.get("socket_profile", default_config["socket_profile"]) not in SOCKET_PROFILES:
+                    config["socket_profile"] = default_config["socket_profile"]
+                ports = config.get("interactive_ports", default_config["interactive_ports"])
+                if not isinstance(ports, list) or not all(isinstance(port, int) and 1 <= port <= 65535 for port in ports):
+                    config["interactive_ports"] = default_config["interactive_ports"]
+                if not isinstance(config.get("link_emulation", default_config["link_emulation"]), bool):
+                    config["link_emulation"] = default_config["link_emulation"]
+                if not (0 <= config.get("link_jitter_ms", default_config["link_jitter_ms"]) <= 1000):
+                    config["link_jitter_ms"] = default_config["link_jitter_ms"]
+                if not (0 <= config.get("link_loss", default_config["link_loss"]) <= 0.5):
+                    config["link_loss"] = default_config["link_loss"]
                 return config
             except Exception as e:
                 console.print(f"[red]Error loading config: {e}, using defaults[/red]")
@@ -944,6 +6204,51 @@ class ProxyChain:
         mac = f"{oui}:{vendor_bytes[0:2]}:{vendor_bytes[2:4]}:{vendor_bytes[4:6]}"
         return mac.lower()
 
+    def create_node(self, engine: Optional[str] = None) -> ProxyNode:
+        """
+        Create a proxy node with a random locale, port, virtual IP and MAC.
+
+        Args:
+            engine (Optional[str]): Data plane override; defaults to the chain's configured engine.
+
+        Returns:
+            ProxyNode: The new (not yet started) node.
+        """
+        locale = random.choice(LOCALES)
+        port = self.get_available_port()
+        virtual_ip = self.generate_virtual_ip(locale)
+        virtual_mac = self.generate_virtual_mac()
+        node = ProxyNode(
+            "127.0.0.1", port, locale, virtual_ip, virtual_mac, self.config["health_check_interval"],
+            engine=engine or self.config.get("engine", CONFIG["NODE_ENGINE"]),
+            cipher=self.config.get("cipher", CONFIG["CIPHER"])
+        )
+        node.mux_window = self.config.get("mux_window", CONFIG["MUX_WINDOW"])
+        node.relay_buffer_max = self.config.get("relay_buffer_max", CONFIG["RELAY_BUFFER_MAX"])
+        node.udp_batch = self.config.get("udp_batch", CONFIG["UDP_BATCH"])
+        node.socket_profile = self.config.get("socket_profile", CONFIG["SOCKET_PROFILE"])
+        node.bandwidth = ShapingClass(
+            self.config.get("max_bandwidth_kbps", CONFIG["MAX_BANDWIDTH_KBPS"]) * 1000 / 8, parent=self.bandwidth,
+            flow_min_rate=self.config.get("min_speed_kbps", CONFIG["MIN_SPEED_KBPS"]) * 1000 / 8,
+            flow_max_rate=self.config.get("max_connection_kbps", CONFIG["MAX_CONNECTION_KBPS"]) * 1000 / 8
+        )
+        node.interactive_ports = set(self.config.get("interactive_ports", CONFIG["INTERACTIVE_PORTS"]))
+        node.link_emulation = self.config.get("link_emulation", CONFIG["LINK_EMULATION"])
+        node.link_jitter = self.config.get("link_jitter_ms", CONFIG["LINK_JITTER_MS"]) / 1000
+        node.link_loss = self.config.get("link_loss", CONFIG["LINK_LOSS"])
+        rate_limit_keys = self.config.get("rate_limit_keys", CONFIG["RATE_LIMIT_KEYS"])
+        node.client_limits = RateLimitTable(self.config.get("client_rate_limit", CONFIG["CLIENT_RATE_LIMIT"]), max_keys=rate_limit_keys)
+        node.destination_limits = RateLimitTable(
+            self.config.get("destination_rate_limit", CONFIG["DESTINATION_RATE_LIMIT"]), max_keys=rate_limit_keys
+        )
+        node.workers = self.config.get("workers", CONFIG["NODE_WORKERS"])
+        node.admission = AdmissionControl(
+            self.config.get("max_handlers", CONFIG["MAX_HANDLERS"]), self.config.get("accept_backlog", CONFIG["ACCEPT_BACKLOG"])
+        )
+        node.timeouts = {phase: self.config.get(f"{phase}_timeout", node.timeouts[phase]) for phase in node.timeouts}
+        node.nodes = self.nodes
+        return node
+
     def initialize_nodes(self):
         """
         Initialize proxy nodes with locales.
@@ -957,16 +6262,8 @@ class ProxyChain:
             if not self.validate_ip_range(self.config["ip_range"]):
                 raise ValueError("Invalid IP range or insufficient IPs")
             for _ in range(self.config["node_count"]):
-                locale = random.choice(LOCALES)
-                port = self.get_available_port()
-                virtual_ip = self.generate_virtual_ip(locale)
-                virtual_mac = self.generate_virtual_mac()
-                node = ProxyNode("127.0.0.1", port, locale, virtual_ip, virtual_mac, self.config["health_check_interval"])
-                node.nodes = self.nodes
-                self.nodes.append(node)
-            for i in range(len(self.nodes) - 1):
-                self.nodes[i].start(next_node=self.nodes[i + 1])
-            self.nodes[-1].start()
+                self.nodes.append(self.create_node())
+            self.start_nodes()
             console.print(f"[green]Initialized {len(self.nodes)} proxy nodes.[/green]")
             logging.info(f"Initialized {len(self.nodes)} proxy nodes")
         except Exception as e:
@@ -974,6 +6271,23 @@ class ProxyChain:
             logging.error(f"Node initialization failed: {e}")
             sys.exit(1)
 
+    def start_nodes(self):
+        """
+        Start every node on the configured runtime, exit node first.
+
+        With the "shared" runtime all nodes run the asyncio engine on one
+        event loop and hand circuits to their successors in-process.
+        """
+        if self.config.get("runtime", CONFIG["CHAIN_RUNTIME"]) == "shared":
+            self.runtime = ChainRuntime(self.nodes, self.config["health_check_interval"])
+            self.runtime.start()
+            for node in self.nodes:
+                node.runtime = self.runtime
+        # Exit first, so every node's successor is listening before it warms links to it
+        self.nodes[-1].start()
+        for i in reversed(range(len(self.nodes) - 1)):
+            self.nodes[i].start(next_node=self.nodes[i + 1])
+
     def create_hidden_service(self, website_name: str, port: int) -> str:
         """
         Create a Tor hidden service for a website.
@@ -1262,6 +6576,9 @@ HiddenServicePort 80 127.0.0.1:{port}
         """
         for node in self.nodes:
             node.stop()
+        if self.runtime:
+            self.runtime.stop()
+            self.runtime = None
         for website_name, process in self.tor_processes.items():
             try:
                 process.terminate()
@@ -1393,9 +6710,9 @@ def update_page():
                     f.write(js_content)
             db.session.commit()
             return jsonify({"message": "Page updated successfully"})
-        except Exception as e:
-            logging.error(f"Error updating page {page_name} for {website_name}: {e}")
-            return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        logging.error(f"Error updating page {page_name} for {website_name}: {e}")
+        return jsonify({"error": str(e)}), 500
 
 @flask_app.route('/add_page', methods=['POST'])
 def add_page():
@@ -1439,9 +6756,9 @@ def add_page():
             db.session.add(page)
             db.session.commit()
             return jsonify({"message": "Page added successfully"})
-        except Exception as e:
-            logging.error(f"Error adding page {page_name} for {website_name}: {e}")
-            return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        logging.error(f"Error adding page {page_name} for {website_name}: {e}")
+        return jsonify({"error": str(e)}), 500
 
 @flask_app.route('/submit_review/<website_name>', methods=['POST'])
 def submit_review(website_name):
@@ -1476,9 +6793,9 @@ def submit_review(website_name):
             db.session.add(review)
             db.session.commit()
             return jsonify({"message": "Review submitted successfully"})
-        except Exception as e:
-            logging.error(f"Error submitting review for {website_name}: {e}")
-            return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        logging.error(f"Error submitting review for {website_name}: {e}")
+        return jsonify({"error": str(e)}), 500
 
 @flask_app.route('/get_reviews/<website_name>')
 def get_reviews(website_name):
@@ -1574,11 +6891,16 @@ def get_status():
     """
     Get the status of all proxy nodes and websites.
 
+    The optional `keys` query parameter caps how many clients and
+    destinations each node's rate limit tables report (default 50, most
+    recently active first).
+
     Returns:
         JSON: Status of nodes and websites.
     """
     try:
-        chain = ProxyChain()
+        chain = flask_app.config.get('PROXY_CHAIN') or ProxyChain()
+        keys = max(0, request.args.get("keys", 50, type=int))
         node_statuses = [{
             "host": node.host,
             "port": node.port,
@@ -1586,7 +6908,20 @@ def get_status():
             "virtual_ip": node.virtual_ip,
             "virtual_mac": node.virtual_mac,
             "active": node.active,
-            "stats": node.stats
+            "stats": node.stats,
+            "hop_pool": node.hop_pool.stats if node.hop_pool else None,
+            "mux": node.async_engine.mux_stats if node.async_engine else None,
+            "dns_cache": node.dns_cache.stats,
+            "connect_latency": node.exit_connector.snapshot(),
+            "workers": node.worker_pool.alive() if node.worker_pool else None,
+            "admission": node.admission.stats,
+            "shaping": node.bandwidth.stats,
+            "scheduling": {traffic_class: samples.percentiles() for traffic_class, samples in node.scheduling.items()},
+            "link_emulation": {str(port): dict(emulator.stats) for port, emulator in list(node.emulators.items())},
+            "rate_limits": {
+                "client": node.client_limits.snapshot(keys),
+                "destination": node.destination_limits.snapshot(keys)
+            }
         } for node in chain.nodes]
         website_statuses = [{
             "name": website['name'],
@@ -2429,95 +7764,1390 @@ def create_documentation():
         doc_content = """
 # 99Proxys v5.0.0 Documentation
 
-## Overview
-99Proxys is a proprietary local virtual VPN network developed by the BG Gremlin Group. It emulates a Tor-like onion routing network with SOCKS5 proxy nodes, supporting up to 99 nodes with simulated locales, rolling virtual IPs, and MAC addresses. The system includes features for creating hidden services, hosting websites with chatrooms and reviews, and a WYSIWYG editor for website management.
+## Overview
+99Proxys is a proprietary local virtual VPN network developed by the BG Gremlin Group. It emulates a Tor-like onion routing network with SOCKS5 proxy nodes, supporting up to 99 nodes with simulated locales, rolling virtual IPs, and MAC addresses. The system includes features for creating hidden services, hosting websites with chatrooms and reviews, and a WYSIWYG editor for website management.
+
+## Features
+- **SOCKS5 Proxy Nodes**: Configurable nodes (5–99) with SSL/TLS encryption, rate limiting, and bandwidth throttling.
+- **Locale Simulation**: Emulates 99 different geographic locales with corresponding timezones and IP ranges.
+- **Hidden Services**: Tor-compatible hidden services for anonymous website hosting.
+- **Website Management**: Create multi-page websites with HTML, CSS, and JavaScript, including chatrooms and review systems.
+- **WYSIWYG Editor**: Browser-based editor for real-time website content management.
+- **GUI Interface**: Tkinter-based interface for managing nodes, websites, and monitoring performance.
+- **Security**: Fernet and RSA encryption for data, self-signed SSL certificates, and CSRF protection.
+- **Monitoring**: Real-time node status, performance statistics, and logging.
+
+## Installation
+1. Ensure Python 3.8+ is installed.
+2. Install Tor (`tor` package) on your system.
+3. Run the script with root privileges for virtual IP assignment:
+   ```bash
+   sudo python3 99proxys.py
+   ```
+4. The script automatically installs required Python packages (scapy, rich, psutil, etc.).
+
+## Configuration
+Configuration is stored in `config/99proxys_config.json`. Default settings:
+- **Node Count**: 5 (configurable 5–99)
+- **IP Range**: 192.168.0.0/16
+- **Port Range**: 1024–65535
+- **Bandwidth Limit**: hierarchical shaping: `"chain_bandwidth_kbps"` (5000) for all nodes together, `"max_bandwidth_kbps"` (1000) per node and, per connection, a guaranteed `"min_speed_kbps"` (56) up to `"max_connection_kbps"` (1000); busy connections split what quiet ones leave unused, and each paces itself with its own reservations, so a throttled stream never holds up the others (shares reported under `shaping` in `/status`). A node with several `"workers"` cannot borrow across processes: each worker is capped at its share of the node's ceiling or of an even slice of the chain ceiling, whichever is lower
+- **Rate Limit**: 100 requests/min per node over a sliding 60-second window; refused requests count too (`BENCHMARK=ratelimit`)
+- **Client and Destination Limits**: each client address gets `"client_rate_limit"` (50) requests/min and each destination host `"destination_rate_limit"` (100), refused with SOCKS reply 0x02; up to `"rate_limit_keys"` (4096) of each are tracked, least recently seen evicted first, and per-key counts are reported under `rate_limits` in `/status`
+- **Health Check Interval**: 30 seconds
+- **Node Engine**: `threaded` (one thread per connection) or `asyncio` (one event loop per node)
+- **Cipher**: hop link cipher, `fernet`, `chacha20-poly1305` or `aes-256-gcm` (`"cipher"` in the config file)
+- **Hop Pool**: each node keeps 2–8 warm TLS links to its successor; unused links are evicted after 60 seconds
+- **TLS Resumption**: each node builds its SSL contexts once and resumes its last session to the next node; `/status` reports full and resumed handshake counts and mean times per hop
+- **DNS**: clients may send IPv4, IPv6 or domain-name destinations; names are resolved only at the exit node through a cache of 1024 names (results kept up to 300 seconds, failures 30 seconds)
+- **Exit Connect**: exit nodes race a destination's IPv6 and IPv4 addresses, starting the next one after 250 ms (RFC 8305), and report per-destination connect latency in `/status`
+- **Workers**: `"workers"` in the config (1–64) serves each node's port from that many forked processes with `SO_REUSEPORT`; limits are split evenly and stats are summed from shared memory
+- **Relay Buffers**: each relayed connection reads 4 KiB at a time and doubles that on sustained full reads up to `"relay_buffer_max"` (256 KiB), halving again on short reads or after going idle (`BENCHMARK=buffers`)
+- **Admission**: each node serves at most `"max_handlers"` connections at once and queues up to `"accept_backlog"` more; beyond that, connections are refused at once with SOCKS5 reply 0x05. `/status` reports refusals and queue time
+- **Timeouts**: inbound connections that stall in the SOCKS5 handshake (`"handshake_timeout"`), in reaching the destination (`"connect_timeout"`) or that pass no traffic (`"idle_timeout"`) are closed by a hashed timer wheel and counted as `reaped` (`BENCHMARK=timers`)
+- **Runtime**: `"runtime": "shared"` in the config hosts every node on one event loop with a single health-check task; adjacent hops are handed over in-process without TLS or per-hop encryption (`BENCHMARK=runtime`)
+- **Socket Profiles**: `"socket_profile"` in the config sets the TCP options of every listener, hop link and exit connection: `interactive` (default) disables Nagle's algorithm so small writes are not held back at each hop, `bulk` keeps it and fixes 4 MiB socket buffers; both enable keepalive and TCP Fast Open (`BENCHMARK=sockets`)
+- **Handshake**: the SOCKS5 greeting and request are parsed incrementally however they are split or coalesced, so clients may send both, and their first data, in one write (`BENCHMARK=handshakes`)
+- **UDP**: SOCKS5 UDP ASSOCIATE is relayed through the chain; each hop drains up to `"udp_batch"` (64) ready datagrams at a time and carries them to the next node as one encrypted frame on a dedicated TLS link, and the exit only relays replies from addresses the client has sent to (`BENCHMARK=udp`)
+- **Multiplexing**: asyncio nodes carry every client stream to an asyncio successor over one link, with a 256 KiB per-stream flow-control window (`mux_window` in the config)
+- **Link Scheduling**: streams sharing a multiplexed link take turns by deficit round robin, so bulk transfers cannot starve interactive ones; a stream that has just become busy is served ahead of the round, and streams to `"interactive_ports"` (SSH, telnet, DNS, RDP, XMPP, VNC, IRC by default) get twice the share. Each class's frame wait percentiles are reported under `scheduling` in `/status` (`BENCHMARK=scheduling`)
+- **Link Emulation**: `"link_emulation": true` delays traffic between adjacent nodes by the fibre propagation time over the great-circle distance between their locales, plus `"link_jitter_ms"` of jitter; a `"link_loss"` share of chunks arrives a retransmission timeout late. Delayed chunks wait on the relay's own timers, not a thread each, and each link's distance, delay and losses are reported under `link_emulation` in `/status`
+
+## Usage
+1. **Start the Application**:
+   - Run the script to launch the GUI.
+   - The Flask server starts on `http://127.0.0.1:5000` for the WYSIWYG editor and API.
+
+2. **Manage Proxy Nodes**:
+   - Use the "Nodes" tab to start, stop, or restart the proxy chain.
+   - View node status, including host, port, locale, virtual IP/MAC, and performance metrics.
+
+3. **Create Websites**:
+   - In the "Websites" tab, enter a website name and click "Create Website".
+   - A default page is created, and a Tor hidden service is set up.
+   - Access the WYSIWYG editor at `http://127.0.0.1:5000/editor/<website_name>`.
+
+4. **Import Assets**:
+   - Select HTML, CSS, and JavaScript files to import as new pages for a website.
+
+5. **Monitor Logs and Stats**:
+   - The "Logs" tab displays real-time log output.
+   - The "Statistics" tab shows bar charts of node requests and errors.
+
+## Security Considerations
+- **Root Privileges**: Required for assigning virtual IPs. Use `sudo` or configure `setcap` for the Python executable.
+- **SSL/TLS**: Self-signed certificates are generated for secure communication.
+- **Encryption**: Each hop link agrees a Fernet session key when it opens (one RSA-OAEP key wrap); all frames on that link are encrypted with it.
+- **CSRF Protection**: Enabled for web forms to prevent cross-site request forgery.
+
+## Directory Structure
+- `config/`: Configuration files.
+- `logs/`: Log files.
+- `data/`: Database and temporary data.
+- `assets/`: Static assets for websites.
+- `certs/`: SSL certificates and encryption keys.
+- `tor_data/`: Tor data directories.
+- `hidden_services/`: Tor hidden service configurations.
+- `uploads/`: Uploaded assets.
+- `sites/`: Website files.
+- `docs/`: Documentation.
+
+## Troubleshooting
+- **Tor Not Found**: Ensure the `tor` executable is installed and accessible.
+- **Port Conflicts**: Check the configured port range and ensure no other services are using them.
+- **Permission Errors**: Run with `sudo` or configure `setcap` for network capabilities.
+- **Log Files**: Check `logs/` for detailed error messages.
+
+## License
+Proprietary software by BG Gremlin Group. Unauthorized use or distribution is prohibited. Contact https://github.com/BGGremlin-Group for licensing inquiries.
+
+## Contact
+For support or inquiries, contact the BG Gremlin Group at https://github.com/BGGremlin-Group.
+"""
+        with open(DOCS_DIR / "README.md", "w") as f:
+            f.write(doc_content)
+        console.print("[green]Documentation generated at docs/README.md[/green]")
+        logging.info("Documentation generated")
+    except Exception as e:
+        console.print(f"[red]Error generating documentation: {e}[/red]")
+        logging.error(f"Error generating documentation: {e}")
+
+def open_socks_client(host: str, port: int, timeout: float = 5) -> ssl.SSLSocket:
+    """
+    Open an SSL/TLS connection to a node and complete the SOCKS5 greeting.
+
+    Args:
+        host (str): Node host address.
+        port (int): Node port.
+        timeout (float): Socket timeout in seconds.
+
+    Returns:
+        ssl.SSLSocket: Connected client socket, ready for a SOCKS5 request.
+
+    Raises:
+        ConnectionError: If the node rejects the greeting.
+    """
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    sock = context.wrap_socket(socket.create_connection((host, port), timeout=timeout), server_hostname=host)
+    sock.sendall(b"\x05\x01\x00")
+    if recv_exactly(sock, 2) != b"\x05\x00":
+        sock.close()
+        raise ConnectionError(f"Node {port} rejected SOCKS5 greeting")
+    return sock
+
+def open_udp_associate(host: str, port: int, timeout: float = 5) -> Tuple[ssl.SSLSocket, Tuple[str, int]]:
+    """
+    Open a SOCKS5 UDP ASSOCIATE through a node.
+
+    Args:
+        host (str): Node host address.
+        port (int): Node port.
+        timeout (float): Socket timeout in seconds.
+
+    Returns:
+        Tuple[SSLSocket, Tuple[str, int]]: The control connection, which keeps the association
+        open, and the node's UDP relay address.
+
+    Raises:
+        ConnectionError: If the node refuses the association.
+    """
+    sock = open_socks_client(host, port, timeout)
+    try:
+        sock.sendall(b"\x05\x03\x00\x01" + b"\x00" * 6)
+        reply = recv_exactly(sock, 5)
+        if reply[:2] != b"\x05\x00":
+            raise ConnectionError(f"Node {port} refused UDP ASSOCIATE (reply {reply[1]:#x})")
+        address = reply[3:] + recv_exactly(sock, socks_address_remaining(reply[3], reply[4]))
+        return sock, parse_socks_address(address)
+    except BaseException:
+        sock.close()
+        raise
+
+def benchmark_node_engines(connections: int = 500) -> List[Dict]:
+    """
+    Compare concurrent-connection capacity and memory of the node engines.
+
+    Opens up to `connections` SOCKS5 clients against a single node per engine
+    and holds them open mid-handshake, which is where an idle client parks.
+
+    Args:
+        connections (int): Number of concurrent client connections to open.
+
+    Returns:
+        List[Dict]: Per-engine results (connections held, threads, RSS growth, setup time).
+    """
+    chain = ProxyChain()
+    process = psutil.Process()
+    results = []
+    for engine in NODE_ENGINES:
+        node = chain.create_node(engine)
+        node.rate_limit = connections * 2
+        node.client_limits.limit = node.destination_limits.limit = connections * 2
+        node.admission = AdmissionControl(max_handlers=connections)
+        baseline_rss = process.memory_info().rss
+        baseline_threads = threading.active_count()
+        node.start()
+        clients = []
+        start_time = time.time()
+        try:
+            for _ in range(connections):
+                try:
+                    clients.append(open_socks_client(node.host, node.port))
+                except Exception as e:
+                    logging.warning(f"Engine {engine} refused connection {len(clients) + 1}: {e}")
+                    break
+            results.append({
+                "engine": engine,
+                "connections": len(clients),
+                "threads": threading.active_count() - baseline_threads,
+                "rss_mb": (process.memory_info().rss - baseline_rss) / (1024 * 1024),
+                "setup_s": time.time() - start_time
+            })
+        finally:
+            for client in clients:
+                client.close()
+            node.stop()
+    table = Table(title=f"Node engines ({connections} concurrent connections)")
+    for column in ["Engine", "Connections", "Threads", "RSS growth (MiB)", "Setup (s)"]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(result["engine"], str(result["connections"]), str(result["threads"]),
+                      f"{result['rss_mb']:.1f}", f"{result['setup_s']:.2f}")
+    console.print(table)
+    logging.info(f"Node engine benchmark: {results}")
+    chain.stop()
+    return results
+
+def benchmark_frame_decoder(frames: int = 20000) -> List[Dict]:
+    """
+    Measure FrameDecoder throughput for common payload sizes.
+
+    Each run encodes `frames` DATA frames back to back and feeds the stream to
+    one decoder in 64 KiB slices, as a recv loop would, so frames are both
+    split across and packed into feeds.
+
+    Args:
+        frames (int): Number of frames decoded per payload size.
+
+    Returns:
+        List[Dict]: Per-size results (frames/s, MiB/s).
+    """
+    results = []
+    for size in (1024, 16 * 1024, 64 * 1024):
+        count = max(1, frames * 1024 // size)
+        stream = encode_frame(FRAME_DATA, os.urandom(size)) * count
+        view = memoryview(stream)
+        decoder = FrameDecoder()
+        decoded = 0
+        start_time = time.perf_counter()
+        for offset in range(0, len(stream), 65536):
+            decoded += len(decoder.feed(view[offset:offset + 65536]))
+        elapsed = time.perf_counter() - start_time
+        if decoded != count:
+            raise RuntimeError(f"Decoded {decoded} of {count} {size}-byte frames")
+        results.append({
+            "payload": size,
+            "frames_per_s": count / elapsed,
+            "mib_per_s": count * size / elapsed / (1024 * 1024)
+        })
+    table = Table(title="Frame decoder (64 KiB reads)")
+    for column in ["Payload", "Frames/s", "MiB/s"]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(f"{result['payload'] // 1024} KiB", f"{result['frames_per_s']:,.0f}", f"{result['mib_per_s']:.0f}")
+    console.print(table)
+    logging.info(f"Frame decoder benchmark: {results}")
+    return results
+
+def benchmark_hop_crypto(chunks: int = 200, chunk_size: int = 8192) -> List[Dict]:
+    """
+    Compare per-hop encryption throughput with and without a session key.
+
+    "per-chunk RSA" is the pre-session scheme: encrypt_data/decrypt_data wrap
+    and unwrap the key with RSA-OAEP for every chunk. "session key" is the
+    HopCodec scheme: one RSA wrap when the link opens, then Fernet only.
+
+    Args:
+        chunks (int): Number of chunks relayed per mode.
+        chunk_size (int): Relay chunk size in bytes.
+
+    Returns:
+        List[Dict]: Per-mode results (MiB/s per hop, microseconds per chunk).
+    """
+    chain = ProxyChain()
+    sender, receiver = chain.create_node(), chain.create_node()
+    chunk = os.urandom(chunk_size)
+    def per_chunk_rsa():
+        return receiver.decrypt_data(sender.encrypt_data(chunk, receiver), sender)
+    outbound, inbound = HopCodec(sender, receiver), HopCodec(receiver, sender)
+    def session_key():
+        return inbound.unseal(outbound.seal(chunk))[0]
+    results = []
+    for mode, relay_chunk in (("per-chunk RSA", per_chunk_rsa), ("session key", session_key)):
+        start_time = time.perf_counter()
+        for _ in range(chunks):
+            if relay_chunk() != chunk:
+                raise RuntimeError(f"{mode} round trip corrupted the chunk")
+        elapsed = time.perf_counter() - start_time
+        results.append({
+            "mode": mode,
+            "mib_per_s": chunks * chunk_size / elapsed / (1024 * 1024),
+            "us_per_chunk": elapsed / chunks * 1e6
+        })
+    table = Table(title=f"Hop encryption ({chunk_size // 1024} KiB chunks)")
+    for column in ["Mode", "MiB/s per hop", "us/chunk"]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(result["mode"], f"{result['mib_per_s']:.1f}", f"{result['us_per_chunk']:.0f}")
+    console.print(table)
+    logging.info(f"Hop encryption benchmark: {results}")
+    chain.stop()
+    return results
+
+def benchmark_ciphers(megabytes: int = 16, chunk_size: int = 8192) -> List[Dict]:
+    """
+    Compare hop link ciphers by wire size and CPU cost.
+
+    Relays `megabytes` of random payload in `chunk_size` DATA frames through
+    one sealing and one opening session per cipher, the work a hop does for
+    each chunk it forwards.
+
+    Args:
+        megabytes (int): Payload relayed per cipher, in MiB.
+        chunk_size (int): Relay chunk size in bytes.
+
+    Returns:
+        List[Dict]: Per-cipher results (wire bytes per MiB, overhead, CPU ms per MiB).
+    """
+    chunk = os.urandom(chunk_size)
+    chunks = megabytes * 1024 * 1024 // chunk_size
+    results = []
+    for name, cipher in SESSION_CIPHERS.items():
+        key = os.urandom(32)
+        sender, receiver = cipher(key, initiator=True), cipher(key, initiator=False)
+        wire_bytes = 0
+        start_cpu = time.process_time()
+        for _ in range(chunks):
+            payload = sender.seal(chunk)
+            wire_bytes += FRAME_HEADER.size + len(payload)
+            receiver.open(payload)
+        cpu = time.process_time() - start_cpu
+        results.append({
+            "cipher": name,
+            "wire_bytes_per_mib": wire_bytes / megabytes,
+            "overhead_pct": (wire_bytes / (chunks * chunk_size) - 1) * 100,
+            "cpu_ms_per_mib": cpu / megabytes * 1000
+        })
+    table = Table(title=f"Hop link ciphers ({chunk_size // 1024} KiB frames, per hop)")
+    for column in ["Cipher", "Wire bytes/MiB", "Overhead", "CPU ms/MiB"]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(result["cipher"], f"{result['wire_bytes_per_mib']:,.0f}",
+                      f"{result['overhead_pct']:.1f}%", f"{result['cpu_ms_per_mib']:.2f}")
+    console.print(table)
+    logging.info(f"Cipher benchmark: {results}")
+    return results
+
+def benchmark_relay_allocations(megabytes: int = 4, chunk_size: int = 8192) -> List[Dict]:
+    """
+    Measure memory allocated by the relay hot loop with tracemalloc.
+
+    Relays `megabytes` through one RelayPump per link shape over socket
+    pairs, one chunk at a time, and sums the traced allocation peak of each
+    step. "copying" is the recv/seal/sendall loop the relay used before the
+    buffer pool; "pooled" is DuplexRelay.fill. Hop links use
+    ChaCha20-Poly1305 sessions.
+
+    Args:
+        megabytes (int): Payload relayed per link shape, in MiB.
+        chunk_size (int): Relay chunk size in bytes.
+
+    Returns:
+        List[Dict]: Per-shape results (KiB allocated per MiB relayed, copying vs pooled).
+    """
+    chain = ProxyChain()
+    sender, relay_node, receiver = chain.create_node(), chain.create_node(), chain.create_node()
+    for node in (sender, relay_node, receiver):
+        node.cipher = "chacha20-poly1305"
+    chunk = os.urandom(chunk_size)
+    chunks = megabytes * 1024 * 1024 // chunk_size
+    tracemalloc.start()
+    results = []
+    try:
+        for shape, framed_source, framed_destination in (("raw -> raw", False, False), ("raw -> link", False, True),
+                                                         ("link -> raw", True, False), ("link -> link", True, True)):
+            row = {"shape": shape}
+            for mode in ("copying", "pooled"):
+                source_in, source_out = socket.socketpair()
+                destination_in, destination_out = socket.socketpair()
+                destination_out.setblocking(False)
+                upstream = HopCodec(sender, relay_node)
+                source_codec = destination_codec = None
+                if framed_source:
+                    source_codec = HopCodec(relay_node, sender)
+                    source_codec.open(upstream.frame(FRAME_CONNECT, b"")[FRAME_HEADER.size:])
+                if framed_destination:
+                    destination_codec = HopCodec(relay_node, receiver)
+                    destination_codec.frame(FRAME_CONNECT, b"")
+                pump = RelayPump(source_out, destination_in, source_codec, destination_codec)
+                relay = DuplexRelay(pump, RelayPump(destination_in, source_out), buffer_size=chunk_size, min_buffer_size=chunk_size)
+                inputs = [upstream.seal(chunk) if framed_source else chunk for _ in range(chunks)]
+                allocated = 0
+                for data in inputs:
+                    source_in.sendall(data)
+                    tracemalloc.reset_peak()
+                    baseline = tracemalloc.get_traced_memory()[0]
+                    if mode == "pooled":
+                        relay.fill(pump)
+                    else:
+                        received = b""
+                        while not received:
+                            received = source_out.recv(chunk_size)
+                            if source_codec:
+                                received = source_codec.unseal(received)[0]
+                        destination_in.sendall(destination_codec.seal(received) if destination_codec else received)
+                        del received
+                    allocated += tracemalloc.get_traced_memory()[1] - baseline
+                    try:
+                        while destination_out.recv(65536):
+                            pass
+                    except BlockingIOError:
+                        pass
+                row[mode] = allocated / megabytes / 1024
+                for sock in (source_in, source_out, destination_in, destination_out):
+                    sock.close()
+            results.append(row)
+    finally:
+        tracemalloc.stop()
+        chain.stop()
+    table = Table(title=f"Relay allocations ({chunk_size // 1024} KiB chunks, KiB allocated per MiB relayed)")
+    for column in ["Link shape", "Copying", "Pooled"]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(result["shape"], f"{result['copying']:,.1f}", f"{result['pooled']:,.1f}")
+    console.print(table)
+    logging.info(f"Relay allocation benchmark: {results}")
+    return results
+
+def benchmark_relay_buffers(megabytes: int = 32, round_trips: int = 500) -> List[Dict]:
+    """
+    Compare fixed and adaptive relay read sizes on bulk and interactive traffic.
+
+    Bulk: `megabytes` relayed from a raw socket into a ChaCha20-Poly1305 hop
+    link, counting the frames sealed. Interactive: `round_trips` 64-byte
+    echoes relayed raw to raw, then the buffer memory the relay still holds.
+
+    Args:
+        megabytes (int): Bulk payload in MiB.
+        round_trips (int): Interactive request/response pairs.
+
+    Returns:
+        List[Dict]: Per-mode bulk throughput, frames per MiB, interactive median RTT and buffer bytes held.
+    """
+    chain = ProxyChain()
+    relay_node, receiver = chain.create_node(), chain.create_node()
+    relay_node.cipher = "chacha20-poly1305"
+    payload = os.urandom(1024 * 1024)
+    results = []
+    try:
+        for mode, minimum, maximum in (("fixed 8 KiB", 8192, 8192), ("fixed 256 KiB", 262144, 262144),
+                                       ("adaptive", CONFIG["RELAY_BUFFER_MIN"], CONFIG["RELAY_BUFFER_MAX"])):
+            # Bulk: client -> relay -> framed link -> receiver
+            client, relay_client = socket.socketpair()
+            relay_target, target = socket.socketpair()
+            link_codec = HopCodec(relay_node, receiver)
+            target_codec = HopCodec(receiver, relay_node)
+            target_codec.open(link_codec.frame(FRAME_CONNECT, b"")[FRAME_HEADER.size:])
+            relay = DuplexRelay(RelayPump(relay_client, relay_target, None, link_codec),
+                                RelayPump(relay_target, relay_client, link_codec, None),
+                                buffer_size=maximum, min_buffer_size=minimum)
+            relay_thread = threading.Thread(target=relay.run, daemon=True)
+            relay_thread.start()
+            def send():
+                for _ in range(megabytes):
+                    client.sendall(payload)
+                client.shutdown(socket.SHUT_WR)
+            start_time = time.perf_counter()
+            threading.Thread(target=send, daemon=True).start()
+            frames = received = 0
+            while True:
+                frame_type, data = target_codec.read_frame(target)
+                if frame_type == FRAME_EOF:
+                    break
+                frames += 1
+                received += len(data)
+            elapsed = time.perf_counter() - start_time
+            target.sendall(target_codec.seal_eof())
+            relay_thread.join(timeout=10)
+            for sock in (client, relay_client, relay_target, target):
+                sock.close()
+            # Interactive: client <-> relay <-> echo server, raw
+            client, relay_client = socket.socketpair()
+            relay_target, target = socket.socketpair()
+            upstream, downstream = RelayPump(relay_client, relay_target), RelayPump(relay_target, relay_client)
+            relay = DuplexRelay(upstream, downstream, buffer_size=maximum, min_buffer_size=minimum)
+            relay_thread = threading.Thread(target=relay.run, daemon=True)
+            relay_thread.start()
+            def echo():
+                while data := target.recv(65536):
+                    target.sendall(data)
+                target.shutdown(socket.SHUT_WR)
+            threading.Thread(target=echo, daemon=True).start()
+            rtts = []
+            for _ in range(round_trips):
+                sent_at = time.perf_counter()
+                client.sendall(b"k" * 64)
+                recv_exactly(client, 64)
+                rtts.append(time.perf_counter() - sent_at)
+            held = len(upstream.buffer) + len(downstream.buffer)
+            client.shutdown(socket.SHUT_WR)
+            relay_thread.join(timeout=10)
+            for sock in (client, relay_client, relay_target, target):
+                sock.close()
+            results.append({
+                "mode": mode,
+                "bulk_mib_s": received / elapsed / (1024 * 1024),
+                "frames_per_mib": frames / megabytes,
+                "interactive_rtt_us": sorted(rtts)[len(rtts) // 2] * 1e6,
+                "buffer_bytes_held": held
+            })
+    finally:
+        chain.stop()
+    table = Table(title=f"Relay read sizes ({megabytes} MiB bulk, {round_trips} interactive round trips)")
+    for column in ["Mode", "Bulk (MiB/s)", "Frames/MiB", "Interactive RTT (µs)", "Buffers held (KiB)"]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(result["mode"], f"{result['bulk_mib_s']:.1f}", f"{result['frames_per_mib']:.1f}",
+                      f"{result['interactive_rtt_us']:.0f}", f"{result['buffer_bytes_held'] / 1024:.0f}")
+    console.print(table)
+    logging.info(f"Relay buffer benchmark: {results}")
+    return results
+
+def benchmark_hop_pool(hops: int = 5, count: int = 40) -> List[Dict]:
+    """
+    Measure client time-to-first-byte through a chain with and without warm hop links.
+
+    Each request opens a SOCKS5 session at the entry node, CONNECTs to a
+    local echo server and times until the first echoed byte arrives, so it
+    includes every hop's link setup.
+
+    Args:
+        hops (int): Chain length.
+        count (int): Sequential requests per mode.
+
+    Returns:
+        List[Dict]: Per-mode results (median and p95 time-to-first-byte in ms, pool hits).
+    """
+    chain = ProxyChain()
+    listener = socket.create_server(("127.0.0.1", 0))
+    def echo():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            with conn:
+                conn.sendall(conn.recv(1))
+    threading.Thread(target=echo, daemon=True).start()
+    request = b"\x05\x01\x00\x01" + socket.inet_aton("127.0.0.1") + listener.getsockname()[1].to_bytes(2, "big")
+    results = []
+    try:
+        for mode, pool_size in (("fresh TLS per hop", 0), ("warm pool", CONFIG["HOP_POOL_SIZE"] or 2)):
+            nodes = [chain.create_node() for _ in range(hops)]
+            for node in nodes:
+                node.hop_pool_size = pool_size
+                node.rate_limit = count * 4
+                node.client_limits.limit = node.destination_limits.limit = count * 4
+            for i in reversed(range(hops)):
+                nodes[i].start(nodes[i + 1] if i + 1 < hops else None)
+            time.sleep(1)  # Let the pools warm up
+            timings = []
+            for _ in range(count):
+                start_time = time.perf_counter()
+                with open_socks_client(nodes[0].host, nodes[0].port) as client:
+                    client.sendall(request)
+                    client.recv(10)
+                    client.sendall(b"x")
+                    client.recv(1)
+                    timings.append((time.perf_counter() - start_time) * 1000)
+                time.sleep(0.02)
+            timings.sort()
+            results.append({
+                "mode": mode,
+                "median_ms": timings[len(timings) // 2],
+                "p95_ms": timings[int(len(timings) * 0.95) - 1],
+                "hits": sum(node.hop_pool.stats["hits"] for node in nodes if node.hop_pool)
+            })
+            for node in nodes:
+                node.stop()
+    finally:
+        listener.close()
+        chain.stop()
+    table = Table(title=f"Time to first byte through {hops} hops")
+    for column in ["Mode", "Median (ms)", "p95 (ms)", "Pool hits"]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(result["mode"], f"{result['median_ms']:.1f}", f"{result['p95_ms']:.1f}", str(result["hits"]))
+    console.print(table)
+    logging.info(f"Hop pool benchmark: {results}")
+    return results
+
+def benchmark_tls_handshakes(handshakes: int = 200) -> List[Dict]:
+    """
+    Measure connect-and-handshake time from a node to a TLS listener.
+
+    Compares building a new SSLContext for every link (the old behaviour),
+    the node's cached client context, and the cached context resuming the
+    most recent session.
+
+    Args:
+        handshakes (int): Sequential links per mode.
+
+    Returns:
+        List[Dict]: Per-mode results (median and p95 handshake time in ms, resumed links).
+    """
+    chain = ProxyChain()
+    server_context, client_context = chain.create_node().tls_contexts()
+    listener = socket.create_server(("127.0.0.1", 0))
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            try:
+                with server_context.wrap_socket(conn, server_side=True) as link:
+                    link.sendall(b"x")  # Session tickets go out ahead of this byte
+                    link.recv(1)
+            except (OSError, ssl.SSLError):
+                pass
+    threading.Thread(target=serve, daemon=True).start()
+    def new_context() -> ssl.SSLContext:
+        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return context
+    results = []
+    try:
+        for mode, get_context, resume in (
+            ("new context per link", new_context, False),
+            ("cached context", lambda: client_context, False),
+            ("cached context + resumption", lambda: client_context, True)
+        ):
+            client_context.session = None
+            timings = []
+            resumed = 0
+            for _ in range(handshakes):
+                start_time = time.perf_counter()
+                sock = socket.create_connection(listener.getsockname(), timeout=5)
+                with get_context().wrap_socket(sock, server_hostname="127.0.0.1") as link:
+                    timings.append((time.perf_counter() - start_time) * 1000)
+                    resumed += link.session_reused
+                    link.recv(1)
+                    if resume:
+                        client_context.remember(link)
+                    link.sendall(b"x")
+            timings.sort()
+            results.append({
+                "mode": mode,
+                "median_ms": timings[len(timings) // 2],
+                "p95_ms": timings[int(len(timings) * 0.95) - 1],
+                "resumed": resumed
+            })
+    finally:
+        client_context.session = None
+        listener.close()
+        chain.stop()
+    table = Table(title=f"TLS link setup ({handshakes} links per mode)")
+    for column in ["Mode", "Median (ms)", "p95 (ms)", "Resumed"]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(result["mode"], f"{result['median_ms']:.2f}", f"{result['p95_ms']:.2f}", str(result["resumed"]))
+    console.print(table)
+    logging.info(f"TLS handshake benchmark: {results}")
+    return results
+
+def benchmark_socks_handshakes(handshakes: int = 300, parses: int = 100000) -> List[Dict]:
+    """
+    Measure SOCKS5 handshakes per second, in the parser alone and through a node.
+
+    The parser is fed each handshake whole and one byte at a time. Through
+    a node of each engine, clients either wait for the method selection
+    before sending the request or send greeting and request in one write;
+    the TLS handshake is excluded from the timing.
+
+    Args:
+        handshakes (int): Sequential client handshakes per engine and mode.
+        parses (int): Handshakes fed to the parser per mode.
+
+    Returns:
+        List[Dict]: Handshakes per second and median time for each mode.
+    """
+    greeting = b"\x05\x01\x00"
+    request = b"\x05\x01\x00\x03\x09localhost\x00\x50"
+    results = []
+    for mode, chunks in (("parser, one read", [greeting + request]),
+                         ("parser, byte by byte", [bytes([b]) for b in greeting + request])):
+        start = time.perf_counter()
+        for _ in range(parses):
+            handshake = SocksHandshake()
+            for chunk in chunks:
+                handshake.feed(chunk)
+        elapsed = time.perf_counter() - start
+        results.append({"mode": mode, "handshakes_per_s": parses / elapsed, "median_ms": elapsed / parses * 1000})
+    listener = socket.create_server(("127.0.0.1", 0), backlog=128)
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            conn.close()
+    threading.Thread(target=serve, daemon=True).start()
+    dest = b"\x01" + socket.inet_aton("127.0.0.1") + listener.getsockname()[1].to_bytes(2, "big")
+    request = b"\x05\x01\x00" + dest
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    try:
+        for engine in NODE_ENGINES:
+            chain = ProxyChain()
+            node = chain.create_node(engine)
+            node.rate_limit = 1000
+            node.client_limits.limit = node.destination_limits.limit = 1000
+            node.start()
+            try:
+                for mode, pipelined in (("request after reply", False), ("greeting + request pipelined", True)):
+                    timings = []
+                    for _ in range(handshakes):
+                        sock = socket.create_connection((node.host, node.port), timeout=5)
+                        with context.wrap_socket(sock, server_hostname=node.host) as client:
+                            start = time.perf_counter()
+                            if pipelined:
+                                client.sendall(greeting + request)
+                            else:
+                                client.sendall(greeting)
+                                recv_exactly(client, 2)
+                                client.sendall(request)
+                            reply = recv_exactly(client, (2 if pipelined else 0) + 3 + len(dest))
+                            timings.append(time.perf_counter() - start)
+                            if not reply.endswith(b"\x05\x00\x00" + dest):
+                                raise ConnectionError(f"Node {node.port} refused the benchmark CONNECT")
+                    timings.sort()
+                    results.append({
+                        "mode": f"{engine}, {mode}",
+                        "handshakes_per_s": len(timings) / sum(timings),
+                        "median_ms": timings[len(timings) // 2] * 1000
+                    })
+            finally:
+                node.stop()
+                chain.stop()
+    finally:
+        listener.close()
+    table = Table(title="SOCKS5 Handshake Benchmark")
+    table.add_column("Mode", style="cyan")
+    table.add_column("Handshakes/s", style="green")
+    table.add_column("Median (ms)", style="yellow")
+    for result in results:
+        table.add_row(result["mode"], f"{result['handshakes_per_s']:.0f}", f"{result['median_ms']:.3f}")
+    console.print(table)
+    logging.info(f"SOCKS5 handshake benchmark: {results}")
+    return results
+
+def benchmark_socket_profiles(hops: int = 3, round_trips: int = 200) -> List[Dict]:
+    """
+    Compare per-hop latency of small interactive exchanges under each socket profile.
+
+    Every round trip writes a 16-byte header and a 48-byte body separately,
+    as request/response protocols often do, and waits for both to be echoed
+    back. Per-hop latency is the median round trip less the median of the
+    same exchange made directly with the echo server, over the hops.
+
+    Args:
+        hops (int): Nodes in each chain.
+        round_trips (int): Exchanges timed per engine and profile.
+
+    Returns:
+        List[Dict]: Median and p95 round trip and per-hop latency (ms) for each engine and profile.
+    """
+    listener = socket.create_server(("127.0.0.1", 0))
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            def echo(conn=conn):
+                with conn:
+                    while data := conn.recv(65536):
+                        conn.sendall(data)
+            threading.Thread(target=echo, daemon=True).start()
+    threading.Thread(target=serve, daemon=True).start()
+    header, body = b"h" * 16, b"b" * 48
+
+    def exchange(sock: socket.socket) -> List[float]:
+        timings = []
+        for _ in range(round_trips):
+            start = time.perf_counter()
+            sock.sendall(header)
+            sock.sendall(body)
+            recv_exactly(sock, len(header) + len(body))
+            timings.append((time.perf_counter() - start) * 1000)
+        return sorted(timings)
+
+    results = []
+    try:
+        with socket.create_connection(listener.getsockname()) as direct:
+            direct.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            baseline = exchange(direct)[round_trips // 2]
+        dest = b"\x01" + socket.inet_aton("127.0.0.1") + listener.getsockname()[1].to_bytes(2, "big")
+        for engine in NODE_ENGINES:
+            for profile in SOCKET_PROFILES:
+                chain = ProxyChain()
+                nodes = [chain.create_node(engine) for _ in range(hops)]
+                for node in nodes:
+                    node.rate_limit = 1000
+                    node.client_limits.limit = node.destination_limits.limit = 1000
+                    node.bandwidth = ShapingClass(None)
+                    node.socket_profile = profile
+                for i in reversed(range(hops)):
+                    nodes[i].start(nodes[i + 1] if i + 1 < hops else None)
+                try:
+                    with open_socks_client(nodes[0].host, nodes[0].port) as client:
+                        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                        client.sendall(b"\x05\x01\x00" + dest)
+                        if recv_exactly(client, 3 + len(dest))[:2] != b"\x05\x00":
+                            raise ConnectionError(f"Node {nodes[0].port} refused the benchmark CONNECT")
+                        timings = exchange(client)
+                finally:
+                    for node in nodes:
+                        node.stop()
+                    chain.stop()
+                results.append({
+                    "engine": engine,
+                    "profile": profile,
+                    "median_ms": timings[round_trips // 2],
+                    "p95_ms": timings[int(round_trips * 0.95) - 1],
+                    "per_hop_ms": (timings[round_trips // 2] - baseline) / hops
+                })
+    finally:
+        listener.close()
+    table = Table(title=f"Socket Profile Latency ({hops} hops, 16 + 48 byte writes, direct round trip {baseline:.3f} ms)")
+    table.add_column("Engine", style="cyan")
+    table.add_column("Profile", style="magenta")
+    table.add_column("Median (ms)", style="green")
+    table.add_column("p95 (ms)", style="yellow")
+    table.add_column("Per hop (ms)", style="green")
+    for result in results:
+        table.add_row(result["engine"], result["profile"], f"{result['median_ms']:.3f}", f"{result['p95_ms']:.3f}", f"{result['per_hop_ms']:.3f}")
+    console.print(table)
+    logging.info(f"Socket profile benchmark: {results}")
+    return results
+
+def benchmark_node_workers(worker_counts: Tuple[int, ...] = (1, 2, 4, 8), seconds: float = 3,
+                           client_processes: int = 4, concurrency: int = 16) -> List[Dict]:
+    """
+    Measure an exit node's request throughput as it is spread over more worker processes.
+
+    Clients and the echo destination run in their own processes so that
+    only the node's workers compete for its GIL. Each request is a full TLS
+    handshake, SOCKS5 CONNECT and a 1 KiB echo.
+
+    Args:
+        worker_counts (Tuple[int, ...]): Worker process counts to measure.
+        seconds (float): Measurement time per count.
+        client_processes (int): Load-generating processes.
+        concurrency (int): Concurrent connections per client process.
+
+    Returns:
+        List[Dict]: Per-count results (requests per second, speedup over the first count).
+    """
+    context = multiprocessing.get_context("fork")
+    listener = socket.create_server(("127.0.0.1", 0))
+    def serve_echo():
+        async def echo(reader, writer):
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+            writer.close()
+        async def serve():
+            server = await asyncio.start_server(echo, sock=listener)
+            await server.serve_forever()
+        asyncio.run(serve())
+    echo_process = context.Process(target=serve_echo, daemon=True)
+    echo_process.start()
+    request = b"\x05\x01\x00\x01" + socket.inet_aton("127.0.0.1") + listener.getsockname()[1].to_bytes(2, "big")
+    def load(host: str, port: int, deadline: float, results):
+        client_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        client_context.check_hostname = False
+        client_context.verify_mode = ssl.CERT_NONE
+        async def client() -> int:
+            completed = 0
+            while time.time() < deadline:
+                try:
+                    reader, writer = await asyncio.open_connection(host, port, ssl=client_context)
+                    writer.write(b"\x05\x01\x00")
+                    await reader.readexactly(2)
+                    writer.write(request)
+                    await reader.readexactly(10)
+                    writer.write(b"x" * 1024)
+                    await reader.readexactly(1024)
+                    writer.close()
+                    completed += 1
+                except (OSError, asyncio.IncompleteReadError):
+                    pass
+            return completed
+        async def run():
+            return sum(await asyncio.gather(*(client() for _ in range(concurrency))))
+        results.put(asyncio.run(run()))
+    chain = ProxyChain()
+    results = []
+    try:
+        for count in worker_counts:
+            node = chain.create_node("asyncio")
+            node.workers = count
+            node.rate_limit = 10 ** 6
+            node.client_limits.limit = node.destination_limits.limit = 10 ** 6
+            node.bandwidth = ShapingClass(None)
+            node.start()
+            time.sleep(0.5)
+            completed = context.Queue()
+            deadline = time.time() + seconds
+            clients = [context.Process(target=load, args=(node.host, node.port, deadline, completed), daemon=True)
+                       for _ in range(client_processes)]
+            for process in clients:
+                process.start()
+            total = sum(completed.get(timeout=seconds + 30) for _ in clients)
+            for process in clients:
+                process.join(timeout=5)
+            node.stop()
+            results.append({"workers": count, "requests_per_s": total / seconds})
+    finally:
+        echo_process.terminate()
+        listener.close()
+        chain.stop()
+    for result in results:
+        result["speedup"] = result["requests_per_s"] / max(results[0]["requests_per_s"], 1e-9)
+    table = Table(title=f"Exit node throughput by worker processes ({os.cpu_count()} CPUs)")
+    for column in ["Workers", "Requests/s", "Speedup"]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(str(result["workers"]), f"{result['requests_per_s']:.0f}", f"{result['speedup']:.2f}x")
+    console.print(table)
+    logging.info(f"Node worker benchmark: {results}")
+    return results
+
+def benchmark_timer_wheel(timers: int = 100000) -> List[Dict]:
+    """
+    Measure timer wheel operation costs with `timers` connection deadlines pending.
+
+    Args:
+        timers (int): Timers scheduled at once.
+
+    Returns:
+        List[Dict]: Per-operation cost in microseconds.
+    """
+    wheel = TimerWheel()
+    results = []
+    start_time = time.perf_counter()
+    pending = [wheel.schedule(CONFIG["IDLE_TIMEOUT"] + (i % 1000) / 10, lambda: None) for i in range(timers)]
+    results.append({"operation": "schedule", "us": (time.perf_counter() - start_time) / timers * 1e6})
+    start_time = time.perf_counter()
+    for timer in pending:
+        wheel.reschedule(timer, CONFIG["CONNECT_TIMEOUT"])
+    results.append({"operation": "reschedule", "us": (time.perf_counter() - start_time) / timers * 1e6})
+    start_time = time.perf_counter()
+    ticks = 100
+    for _ in range(ticks):
+        wheel.advance(wheel.origin + (wheel.current + 1) * wheel.tick)
+    results.append({"operation": "tick (no timer due)", "us": (time.perf_counter() - start_time) / ticks * 1e6})
+    start_time = time.perf_counter()
+    for timer in pending[::2]:
+        wheel.cancel(timer)
+    results.append({"operation": "cancel", "us": (time.perf_counter() - start_time) / (timers // 2) * 1e6})
+    start_time = time.perf_counter()
+    wheel.advance(time.monotonic() + CONFIG["CONNECT_TIMEOUT"] + 1)
+    results.append({"operation": "fire", "us": (time.perf_counter() - start_time) / (timers - timers // 2) * 1e6})
+    table = Table(title=f"Timer wheel ({timers:,} timers, {len(wheel.slots)} slots)")
+    for column in ["Operation", "Cost (µs)"]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(result["operation"], f"{result['us']:.2f}")
+    console.print(table)
+    logging.info(f"Timer wheel benchmark: {results}")
+    return results
+
+def benchmark_rate_limiter(threads: int = 64, decisions: int = 5000, limit: int = CONFIG["RATE_LIMIT"]) -> List[Dict]:
+    """
+    Measure rate-limit decisions per second with many threads deciding at once.
+
+    Compares the sliding-window ring against the request log it replaced:
+    a queue.Queue of timestamps drained and scanned under the node lock.
+
+    Args:
+        threads (int): Threads deciding concurrently.
+        decisions (int): Decisions per thread.
+        limit (int): Requests allowed per 60-second window.
+
+    Returns:
+        List[Dict]: Decisions per second and requests allowed for each limiter.
+    """
+    def request_log() -> Callable[[], bool]:
+        lock = threading.Lock()
+        timestamps = queue.Queue()
+        def check() -> bool:
+            with lock:
+                current_time = time.time()
+                while not timestamps.empty() and timestamps.qsize() > limit:
+                    timestamps.get()
+                while not timestamps.empty():
+                    if current_time - timestamps.queue[0] > 60:
+                        timestamps.get()
+                    else:
+                        break
+                timestamps.put(current_time)
+                return timestamps.qsize() <= limit
+        return check
+
+    results = []
+    for name, check in (("queue scan under lock (old)", request_log()),
+                        ("sliding-window ring", SlidingWindowLimiter(limit).allow)):
+        allowed = [0] * threads
+        barrier = threading.Barrier(threads + 1)
+        def decide(index: int):
+            barrier.wait()
+            allowed[index] = sum(check() for _ in range(decisions))
+        workers = [threading.Thread(target=decide, args=(i,)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        results.append({
+            "limiter": name,
+            "decisions_per_s": threads * decisions / elapsed,
+            "allowed": sum(allowed)
+        })
+    table = Table(title=f"Rate Limiter Benchmark ({threads} threads x {decisions} decisions, limit {limit}/min)")
+    table.add_column("Limiter", style="cyan")
+    table.add_column("Decisions/s", style="green")
+    table.add_column("Allowed", style="yellow")
+    for result in results:
+        table.add_row(result["limiter"], f"{result['decisions_per_s']:.0f}", str(result["allowed"]))
+    console.print(table)
+    logging.info(f"Rate limiter benchmark: {results}")
+    return results
+
+def benchmark_chain_runtime(node_count: int = 99) -> List[Dict]:
+    """
+    Measure chain startup time, idle memory and thread count per runtime.
+
+    Each mode runs in a forked process so its memory is measured from a
+    clean baseline; nodes are created (keys generated) before timing starts.
+
+    Args:
+        node_count (int): Nodes in the chain.
+
+    Returns:
+        List[Dict]: Per-mode startup seconds, idle RSS growth (MiB) and threads.
+    """
+    context = multiprocessing.get_context("fork")
+    def measure(engine: str, runtime: str, results):
+        chain = ProxyChain()
+        chain.config["runtime"] = runtime
+        chain.nodes.extend(chain.create_node(engine) for _ in range(node_count))
+        process = psutil.Process()
+        rss, threads = process.memory_info().rss, threading.active_count()
+        start_time = time.perf_counter()
+        chain.start_nodes()
+        startup = time.perf_counter() - start_time
+        time.sleep(2)  # Let hop pools warm up before sampling idle state
+        results.put({
+            "mode": f"{runtime} ({engine})" if runtime == "per-node" else runtime,
+            "startup_s": startup,
+            "idle_rss_mib": (process.memory_info().rss - rss) / 2 ** 20,
+            "threads": threading.active_count() - threads
+        })
+        chain.stop()
+    results = []
+    for engine, runtime in (("threaded", "per-node"), ("asyncio", "per-node"), ("asyncio", "shared")):
+        queue_ = context.Queue()
+        process = context.Process(target=measure, args=(engine, runtime, queue_))
+        process.start()
+        results.append(queue_.get(timeout=600))
+        process.join(timeout=60)
+    table = Table(title=f"Chain runtime at {node_count} nodes")
+    for column in ["Mode", "Startup (s)", "Idle RSS (MiB)", "Threads"]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(result["mode"], f"{result['startup_s']:.2f}", f"{result['idle_rss_mib']:.1f}", str(result["threads"]))
+    console.print(table)
+    logging.info(f"Chain runtime benchmark: {results}")
+    return results
+
+# Benchmarks runnable with BENCHMARK=<name> (or BENCHMARK=all)
+def benchmark_udp_associate(datagrams: int = 20000, size: int = 512, window: int = 128, hops: int = 3) -> List[Dict]:
+    """
+    Measure datagrams per second echoed through a UDP ASSOCIATE on a chain, per engine and batch size.
 
-## Features
-- **SOCKS5 Proxy Nodes**: Configurable nodes (5–99) with SSL/TLS encryption, rate limiting, and bandwidth throttling.
-- **Locale Simulation**: Emulates 99 different geographic locales with corresponding timezones and IP ranges.
-- **Hidden Services**: Tor-compatible hidden services for anonymous website hosting.
-- **Website Management**: Create multi-page websites with HTML, CSS, and JavaScript, including chatrooms and review systems.
-- **WYSIWYG Editor**: Browser-based editor for real-time website content management.
-- **GUI Interface**: Tkinter-based interface for managing nodes, websites, and monitoring performance.
-- **Security**: Fernet and RSA encryption for data, self-signed SSL certificates, and CSRF protection.
-- **Monitoring**: Real-time node status, performance statistics, and logging.
+    A client keeps `window` datagrams in flight to a local UDP echo server;
+    datagrams unanswered after 200 ms count as lost and are replaced.
 
-## Installation
-1. Ensure Python 3.8+ is installed.
-2. Install Tor (`tor` package) on your system.
-3. Run the script with root privileges for virtual IP assignment:
-   ```bash
-   sudo python3 99proxys.py
-   ```
-4. The script automatically installs required Python packages (scapy, rich, psutil, etc.).
+    Args:
+        datagrams (int): Datagrams echoed per run.
+        size (int): Datagram payload size in bytes.
+        window (int): Datagrams kept in flight.
+        hops (int): Nodes in the chain.
 
-## Configuration
-Configuration is stored in `config/99proxys_config.json`. Default settings:
-- **Node Count**: 5 (configurable 5–99)
-- **IP Range**: 192.168.0.0/16
-- **Port Range**: 1024–65535
-- **Bandwidth Limit**: 1000 kbps
-- **Rate Limit**: 100 requests/min
-- **Health Check Interval**: 30 seconds
+    Returns:
+        List[Dict]: Echoed datagrams per second and loss for each engine and batch size.
+    """
+    echo = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    echo.bind(("127.0.0.1", 0))
 
-## Usage
-1. **Start the Application**:
-   - Run the script to launch the GUI.
-   - The Flask server starts on `http://127.0.0.1:5000` for the WYSIWYG editor and API.
+    def serve_echo():
+        while True:
+            try:
+                data, sender = echo.recvfrom(65535)
+                echo.sendto(data, sender)
+            except OSError:
+                return
+
+    threading.Thread(target=serve_echo, daemon=True).start()
+    header = b"\x00\x00\x00" + socks_address(*echo.getsockname())
+    payload = os.urandom(size)
+    results = []
+    try:
+        for engine in NODE_ENGINES:
+            for batch in (1, CONFIG["UDP_BATCH"]):
+                chain = ProxyChain()
+                nodes = [chain.create_node(engine) for _ in range(hops)]
+                for node in nodes:
+                    node.rate_limit = 1000
+                    node.client_limits.limit = node.destination_limits.limit = 1000
+                    node.udp_batch = batch
+                for i in reversed(range(hops)):
+                    nodes[i].start(nodes[i + 1] if i + 1 < hops else None)
+                try:
+                    control, relay = open_udp_associate(nodes[0].host, nodes[0].port)
+                    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    client.connect(relay)
+                    client.settimeout(0.2)
+                    sent = received = lost = 0
+                    start = time.perf_counter()
+                    while received < datagrams:
+                        while sent - received < window:
+                            client.send(header + payload)
+                            sent += 1
+                        try:
+                            client.recv(65535)
+                            received += 1
+                        except socket.timeout:
+                            lost += sent - received  # Give up on what is still in flight
+                            sent = received
+                    elapsed = time.perf_counter() - start
+                    client.close()
+                    control.close()
+                finally:
+                    for node in nodes:
+                        node.stop()
+                    chain.stop()
+                results.append({
+                    "engine": engine,
+                    "batch": batch,
+                    "pps": datagrams / elapsed,
+                    "mbps": datagrams * size * 8 / elapsed / 1e6,
+                    "lost": lost
+                })
+    finally:
+        echo.close()
+    table = Table(title=f"UDP ASSOCIATE Benchmark ({hops} hops, {size}-byte datagrams, {window} in flight)")
+    table.add_column("Engine", style="cyan")
+    table.add_column("Batch", style="magenta")
+    table.add_column("Datagrams/s", style="green")
+    table.add_column("Mbit/s", style="yellow")
+    table.add_column("Lost", style="red")
+    for result in results:
+        table.add_row(result["engine"], str(result["batch"]), f"{result['pps']:.0f}", f"{result['mbps']:.1f}", str(result["lost"]))
+    console.print(table)
+    logging.info(f"UDP ASSOCIATE benchmark: {results}")
+    return results
+
+def benchmark_link_scheduling(bulk_streams: int = 4, pings: int = 200, chunk_size: int = 65536) -> List[Dict]:
+    """
+    Measure interactive latency across a multiplexed link, alone and alongside bulk uploads.
 
-2. **Manage Proxy Nodes**:
-   - Use the "Nodes" tab to start, stop, or restart the proxy chain.
-   - View node status, including host, port, locale, virtual IP/MAC, and performance metrics.
+    Two asyncio nodes carry one interactive stream, which sends a 64-byte
+    ping and waits for its echo, to a port in the nodes' interactive
+    ports, and then the same stream again while `bulk_streams` uploads of
+    `chunk_size` writes share the link.
 
-3. **Create Websites**:
-   - In the "Websites" tab, enter a website name and click "Create Website".
-   - A default page is created, and a Tor hidden service is set up.
-   - Access the WYSIWYG editor at `http://127.0.0.1:5000/editor/<website_name>`.
+    Args:
+        bulk_streams (int): Uploads competing with the interactive stream.
+        pings (int): Round trips timed per scenario.
+        chunk_size (int): Bytes per bulk write.
 
-4. **Import Assets**:
-   - Select HTML, CSS, and JavaScript files to import as new pages for a website.
+    Returns:
+        List[Dict]: Per scenario: ping round trip median and p99, the entry node's frame wait
+            percentiles per class (ms), and bulk throughput (MB/s).
+    """
+    echo_listener = socket.create_server(("127.0.0.1", 0))
+    sink_listener = socket.create_server(("127.0.0.1", 0))
+    def serve(listener: socket.socket, echo: bool):
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            def handle(conn=conn):
+                with conn:
+                    while data := conn.recv(65536):
+                        if echo:
+                            conn.sendall(data)
+            threading.Thread(target=handle, daemon=True).start()
+    threading.Thread(target=serve, args=(echo_listener, True), daemon=True).start()
+    threading.Thread(target=serve, args=(sink_listener, False), daemon=True).start()
+
+    def connect(node: ProxyNode, listener: socket.socket) -> ssl.SSLSocket:
+        dest = b"\x01" + socket.inet_aton("127.0.0.1") + listener.getsockname()[1].to_bytes(2, "big")
+        client = open_socks_client(node.host, node.port)
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client.sendall(b"\x05\x01\x00" + dest)
+        if recv_exactly(client, 3 + len(dest))[:2] != b"\x05\x00":
+            raise ConnectionError(f"Node {node.port} refused the benchmark CONNECT")
+        return client
+
+    results = []
+    try:
+        for scenario, uploads in (("idle", 0), ("bulk", bulk_streams)):
+            chain = ProxyChain()
+            nodes = [chain.create_node("asyncio") for _ in range(2)]
+            for node in nodes:
+                node.rate_limit = 1000
+                node.client_limits.limit = node.destination_limits.limit = 1000
+                node.bandwidth = ShapingClass(None)
+                node.interactive_ports = {echo_listener.getsockname()[1]}
+            nodes[1].start()
+            nodes[0].start(nodes[1])
+            stopping = threading.Event()
+            uploaded = [0] * uploads
+            def upload(index: int):
+                with connect(nodes[0], sink_listener) as client:
+                    chunk = b"b" * chunk_size
+                    while not stopping.is_set():
+                        client.sendall(chunk)
+                        uploaded[index] += chunk_size
+            threads = [threading.Thread(target=upload, args=(i,), daemon=True) for i in range(uploads)]
+            try:
+                with connect(nodes[0], echo_listener) as client:
+                    for thread in threads:
+                        thread.start()
+                    time.sleep(0.5 if uploads else 0)  # Let the uploads fill the link
+                    start_time = time.perf_counter()
+                    timings = []
+                    for _ in range(pings):
+                        ping_start = time.perf_counter()
+                        client.sendall(b"p" * 64)
+                        recv_exactly(client, 64)
+                        timings.append((time.perf_counter() - ping_start) * 1000)
+                        time.sleep(0.005)
+                    elapsed = time.perf_counter() - start_time
+                    sent = sum(uploaded)
+                    stopping.set()
+                    for thread in threads:
+                        thread.join(timeout=5)
+            finally:
+                stopping.set()
+                for node in nodes:
+                    node.stop()
+                chain.stop()
+            timings.sort()
+            waits = {traffic_class: samples.percentiles() for traffic_class, samples in nodes[0].scheduling.items()}
+            results.append({
+                "scenario": scenario,
+                "ping_median_ms": timings[pings // 2],
+                "ping_p99_ms": timings[int(pings * 0.99) - 1],
+                "interactive_wait_p99_ms": waits["interactive"]["p99_ms"],
+                "default_wait_p99_ms": waits["default"]["p99_ms"],
+                "bulk_mbps": sent / elapsed / 1e6
+            })
+    finally:
+        echo_listener.close()
+        sink_listener.close()
+    table = Table(title=f"Link Scheduling (64-byte pings, {bulk_streams} bulk uploads of {chunk_size}-byte writes)")
+    table.add_column("Scenario", style="cyan")
+    table.add_column("Ping median (ms)", style="green")
+    table.add_column("Ping p99 (ms)", style="yellow")
+    table.add_column("Interactive wait p99 (ms)", style="green")
+    table.add_column("Default wait p99 (ms)", style="yellow")
+    table.add_column("Bulk (MB/s)", style="magenta")
+    def cell(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.3f}"
+    for result in results:
+        table.add_row(result["scenario"], cell(result["ping_median_ms"]), cell(result["ping_p99_ms"]),
+                      cell(result["interactive_wait_p99_ms"]), cell(result["default_wait_p99_ms"]),
+                      f"{result['bulk_mbps']:.1f}")
+    console.print(table)
+    logging.info(f"Link scheduling benchmark: {results}")
+    return results
+
+BENCHMARKS = {
+    "engines": benchmark_node_engines,
+    "framing": benchmark_frame_decoder,
+    "hopcrypto": benchmark_hop_crypto,
+    "ciphers": benchmark_ciphers,
+    "allocations": benchmark_relay_allocations,
+    "buffers": benchmark_relay_buffers,
+    "hoppool": benchmark_hop_pool,
+    "tls": benchmark_tls_handshakes,
+    "workers": benchmark_node_workers,
+    "runtime": benchmark_chain_runtime,
+    "timers": benchmark_timer_wheel,
+    "udp": benchmark_udp_associate,
+    "handshakes": benchmark_socks_handshakes,
+    "sockets": benchmark_socket_profiles,
+    "ratelimit": benchmark_rate_limiter,
+    "scheduling": benchmark_link_scheduling
+}
 
-5. **Monitor Logs and Stats**:
-   - The "Logs" tab displays real-time log output.
-   - The "Statistics" tab shows bar charts of node requests and errors.
+def run_benchmarks(name: str):
+    """
+    Run one registered benchmark, or all of them.
 
-## Security Considerations
-- **Root Privileges**: Required for assigning virtual IPs. Use `sudo` or configure `setcap` for the Python executable.
-- **SSL/TLS**: Self-signed certificates are generated for secure communication.
-- **Encryption**: Data is encrypted using Fernet for symmetric encryption and RSA for key exchange between nodes.
-- **CSRF Protection**: Enabled for web forms to prevent cross-site request forgery.
+    Args:
+        name (str): Benchmark name from BENCHMARKS, or "all".
+    """
+    selected = BENCHMARKS if name == "all" else {name: BENCHMARKS.get(name)}
+    for bench_name, bench in selected.items():
+        if bench is None:
+            console.print(f"[red]Unknown benchmark '{bench_name}'. Available: {', '.join(BENCHMARKS)}[/red]")
+            continue
+        console.print(f"[cyan]Running benchmark '{bench_name}'...[/cyan]")
+        bench()
+
+def start_test_chain(chain: ProxyChain, engines: Tuple[str, ...], limit: int = 1000,
+                     max_handlers: Optional[int] = None, **overrides) -> List[ProxyNode]:
+    """
+    Create a chain of nodes for a test and start it from the exit node, with no rate limits or shaping in the way.
 
-## Directory Structure
-- `config/`: Configuration files.
-- `logs/`: Log files.
-- `data/`: Database and temporary data.
-- `assets/`: Static assets for websites.
-- `certs/`: SSL certificates and encryption keys.
-- `tor_data/`: Tor data directories.
-- `hidden_services/`: Tor hidden service configurations.
-- `uploads/`: Uploaded assets.
-- `sites/`: Website files.
-- `docs/`: Documentation.
+    Args:
+        chain (ProxyChain): Chain the nodes belong to; its stop() stops them.
+        engines (Tuple[str, ...]): Engine of each node, entry node first.
+        limit (int): Node, per-client and per-destination rate limit.
+        max_handlers (Optional[int]): Give each node its own AdmissionControl of this size.
+        **overrides: Node attributes set on every node before it starts.
 
-## Troubleshooting
-- **Tor Not Found**: Ensure the `tor` executable is installed and accessible.
-- **Port Conflicts**: Check the configured port range and ensure no other services are using them.
-- **Permission Errors**: Run with `sudo` or configure `setcap` for network capabilities.
-- **Log Files**: Check `logs/` for detailed error messages.
+    Returns:
+        List[ProxyNode]: The started nodes, entry node first.
+    """
+    nodes = [chain.create_node(engine) for engine in engines]
+    for node in nodes:
+        node.rate_limit = limit
+        node.client_limits.limit = node.destination_limits.limit = limit
+        node.bandwidth = ShapingClass(None)
+        if max_handlers:
+            node.admission = AdmissionControl(max_handlers=max_handlers)
+        for name, value in overrides.items():
+            setattr(node, name, value)
+    chain.nodes.extend(nodes)
+    for i in reversed(range(len(nodes))):
+        nodes[i].start(nodes[i + 1] if i + 1 < len(nodes) else None)
+    return nodes
+
+def echo_server(host: str = "127.0.0.1", **kwargs) -> socket.socket:
+    """
+    Start a TCP echo server for tests, echoing each connection on its own thread.
 
-## License
-Proprietary software by BG Gremlin Group. Unauthorized use or distribution is prohibited. Contact https://github.com/BGGremlin-Group for licensing inquiries.
+    Args:
+        host (str): Address to listen on.
+        **kwargs: Passed to socket.create_server, e.g. family or backlog.
 
-## Contact
-For support or inquiries, contact the BG Gremlin Group at https://github.com/BGGremlin-Group.
-"""
-        with open(DOCS_DIR / "README.md", "w") as f:
-            f.write(doc_content)
-        console.print("[green]Documentation generated at docs/README.md[/green]")
-        logging.info("Documentation generated")
-    except Exception as e:
-        console.print(f"[red]Error generating documentation: {e}[/red]")
-        logging.error(f"Error generating documentation: {e}")
+    Returns:
+        socket.socket: The listening socket; closing it stops the server.
+    """
+    listener = socket.create_server((host, 0), **kwargs)
+    def echo(conn):
+        with conn:
+            while data := conn.recv(65536):
+                conn.sendall(data)
+    def accept():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=echo, args=(conn,), daemon=True).start()
+    threading.Thread(target=accept, daemon=True).start()
+    return listener
 
 class TestProxyChain(unittest.TestCase):
     """
@@ -2551,6 +9181,1583 @@ class TestProxyChain(unittest.TestCase):
     def tearDown(self):
         self.chain.stop()
 
+class TestDuplexRelay(unittest.TestCase):
+    """
+    Unit tests for the full-duplex tunnel relay.
+    """
+    def setUp(self):
+        self.listeners = []
+        self.server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        self.server_context.load_cert_chain(certfile=CERT_FILE, keyfile=KEY_FILE)
+        self.client_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        self.client_context.check_hostname = False
+        self.client_context.verify_mode = ssl.CERT_NONE
+
+    def start_listener(self, handler, tls: bool = False) -> int:
+        listener = socket.create_server(("127.0.0.1", 0))
+        self.listeners.append(listener)
+        def accept():
+            conn, _ = listener.accept()
+            if tls:
+                conn = self.server_context.wrap_socket(conn, server_side=True)
+            handler(conn)
+        threading.Thread(target=accept, daemon=True).start()
+        return listener.getsockname()[1]
+
+    def build_chain(self, server_handler, hops: int = 5, tls: bool = False) -> int:
+        """Start a destination server behind `hops` relays and return the first relay's port."""
+        port = self.start_listener(server_handler, tls)
+        for _ in range(hops):
+            def relay(conn, next_port=port):
+                target = socket.create_connection(("127.0.0.1", next_port))
+                if tls:
+                    target = self.client_context.wrap_socket(target, server_hostname="127.0.0.1")
+                try:
+                    DuplexRelay(RelayPump(conn, target), RelayPump(target, conn)).run()
+                finally:
+                    conn.close()
+                    target.close()
+            port = self.start_listener(relay, tls)
+        return port
+
+    def read_all(self, sock: socket.socket) -> bytes:
+        chunks = []
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                return b"".join(chunks)
+            chunks.append(data)
+
+    def test_bulk_download_through_five_hops(self):
+        payload_size = 32 * 1024 * 1024
+        def server(conn):
+            chunk = b"x" * 65536
+            with conn:
+                for _ in range(payload_size // len(chunk)):
+                    conn.sendall(chunk)
+        port = self.build_chain(server)
+        start_time = time.time()
+        with socket.create_connection(("127.0.0.1", port)) as client:
+            received = len(self.read_all(client))
+        elapsed = time.time() - start_time
+        self.assertEqual(received, payload_size)
+        console.print(f"[cyan]5-hop bulk download: {payload_size / elapsed / (1024 * 1024):.1f} MiB/s[/cyan]")
+
+    def test_bulk_download_through_five_tls_hops(self):
+        payload_size = 8 * 1024 * 1024
+        def server(conn):
+            with conn:
+                conn.sendall(b"x" * payload_size)
+        port = self.build_chain(server, tls=True)
+        with self.client_context.wrap_socket(socket.create_connection(("127.0.0.1", port)), server_hostname="127.0.0.1") as client:
+            self.assertEqual(len(self.read_all(client)), payload_size)
+
+    def test_half_close_through_five_hops(self):
+        request = b"ping" * 10000
+        def server(conn):
+            with conn:
+                conn.sendall(self.read_all(conn)[::-1])
+        port = self.build_chain(server)
+        with socket.create_connection(("127.0.0.1", port)) as client:
+            client.sendall(request)
+            half_close(client)
+            self.assertEqual(self.read_all(client), request[::-1])
+
+    def test_buffer_sizer_grows_on_bulk_and_shrinks_when_quiet(self):
+        sizer = RelayBufferSizer(4096, 262144)
+        for _ in range(20):
+            sizer.record(sizer.size)
+        self.assertEqual(sizer.size, 262144)
+        for _ in range(sizer.shrink_after * 3):
+            sizer.record(100)
+        self.assertEqual(sizer.size, 262144 // 8)
+        sizer.last_read -= sizer.idle_after + 1
+        sizer.record(100)
+        self.assertEqual(sizer.size, 4096)
+
+    def tearDown(self):
+        for listener in self.listeners:
+            listener.close()
+
+class TestFrameDecoder(unittest.TestCase):
+    """
+    Unit tests for inter-node frame encoding and decoding.
+    """
+    def test_reassembles_byte_by_byte(self):
+        payload = os.urandom(5000)
+        stream = encode_frame(FRAME_DATA, payload)
+        decoder = FrameDecoder()
+        frames = []
+        for i in range(len(stream)):
+            frames.extend(decoder.feed(stream[i:i + 1]))
+        self.assertEqual(frames, [(FRAME_DATA, payload)])
+        self.assertEqual(decoder.buffered, 0)
+
+    def test_many_frames_per_feed(self):
+        payloads = [os.urandom(n) for n in (0, 1, 100, 4096)]
+        stream = b"".join(encode_frame(FRAME_DATA, p) for p in payloads) + encode_frame(FRAME_EOF, b"")
+        frames = FrameDecoder().feed(stream)
+        self.assertEqual(frames, [(FRAME_DATA, p) for p in payloads] + [(FRAME_EOF, b"")])
+
+    def test_payload_containing_delimiter(self):
+        payload = b"||" * 100 + b"\x12\x00\x00\x00\x05||"
+        decoder = FrameDecoder()
+        stream = encode_frame(FRAME_CONNECT, payload) * 2
+        self.assertEqual(decoder.feed(stream[:7]), [])
+        self.assertEqual(decoder.feed(stream[7:]), [(FRAME_CONNECT, payload)] * 2)
+
+    def test_frame_larger_than_buffer(self):
+        payload = os.urandom(200 * 1024)
+        stream = encode_frame(FRAME_DATA, b"a") + encode_frame(FRAME_DATA, payload)
+        decoder = FrameDecoder(capacity=4096)
+        frames = []
+        for offset in range(0, len(stream), 3000):
+            frames.extend(decoder.feed(stream[offset:offset + 3000]))
+        self.assertEqual(frames, [(FRAME_DATA, b"a"), (FRAME_DATA, payload)])
+
+    def test_oversized_frame_rejected(self):
+        with self.assertRaises(ValueError):
+            FrameDecoder().feed(FRAME_HEADER.pack(FRAME_DATA, FRAME_MAX_PAYLOAD + 1))
+
+    def test_unknown_frame_type_rejected(self):
+        with self.assertRaises(ValueError):
+            FrameDecoder().feed(FRAME_HEADER.pack(0x05, 3) + b"abc")
+
+class TestHopSession(unittest.TestCase):
+    """
+    Unit tests for per-circuit session keys on hop links.
+    """
+    def setUp(self):
+        self.chain = ProxyChain()
+        self.sender, self.receiver = self.chain.create_node(), self.chain.create_node()
+        self.outbound = HopCodec(self.sender, self.receiver)
+        self.inbound = HopCodec(self.receiver, self.sender)
+
+    def test_key_wrapped_once_per_link(self):
+        first = self.outbound.seal(b"a" * 100)
+        second = self.outbound.seal(b"a" * 100)
+        self.assertGreater(len(first) - len(second), 256)  # RSA-2048 wrapped key only on the first frame
+        self.assertEqual(self.inbound.unseal(first + second), (b"a" * 200, False))
+
+    def test_both_directions_share_session(self):
+        self.inbound.unseal(self.outbound.seal(b"request"))
+        self.assertEqual(self.outbound.unseal(self.inbound.seal(b"response")), (b"response", False))
+
+    def test_aead_ciphers(self):
+        for name in ("chacha20-poly1305", "aes-256-gcm"):
+            self.sender.cipher = name
+            outbound, inbound = HopCodec(self.sender, self.receiver), HopCodec(self.receiver, self.sender)
+            inbound.unseal(outbound.seal(b"open"))
+            self.assertEqual(inbound.session.name, name)
+            frame = outbound.seal(b"x" * 1000)
+            self.assertEqual(len(frame), FRAME_HEADER.size + 1000 + 16)  # tag only, nonce is implicit
+            self.assertEqual(inbound.unseal(frame), (b"x" * 1000, False))
+            self.assertEqual(outbound.unseal(inbound.seal(b"reply")), (b"reply", False))
+            with self.assertRaises(InvalidToken):
+                inbound.unseal(frame)  # replayed frame
+
+    def test_incomplete_cipher_rejected_at_construction(self):
+        class SealOnly(SessionCipher):
+            def seal(self, data: bytes) -> bytes:
+                return data
+        with self.assertRaises(TypeError):
+            SealOnly(bytes(32), True)
+
+    def test_tampered_frame_rejected(self):
+        self.inbound.unseal(self.outbound.seal(b"hello"))
+        frame = bytearray(self.outbound.seal(b"world"))
+        frame[-1] ^= 1
+        with self.assertRaises(InvalidToken):
+            self.inbound.unseal(bytes(frame))
+
+    def tearDown(self):
+        self.chain.stop()
+
+class TestHopConnectionPool(unittest.TestCase):
+    """
+    Unit tests for warm hop-to-hop TLS links.
+    """
+    def setUp(self):
+        self.chain = ProxyChain()
+        self.node, self.next_node = self.chain.create_node(), self.chain.create_node()
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.next_node.port = self.listener.getsockname()[1]
+        self.accepted = []
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(certfile=CERT_FILE, keyfile=KEY_FILE)
+        def accept():
+            while True:
+                try:
+                    conn, _ = self.listener.accept()
+                    self.accepted.append(context.wrap_socket(conn, server_side=True))
+                except OSError:
+                    return
+        threading.Thread(target=accept, daemon=True).start()
+
+    def start_pool(self, **kwargs) -> HopConnectionPool:
+        pool = HopConnectionPool(self.node, self.next_node, **kwargs)
+        pool.maintenance_interval = 0.05
+        pool.start()
+        self.addCleanup(pool.stop)
+        self.wait_for(lambda: len(pool.idle) >= pool.target)
+        return pool
+
+    def wait_for(self, condition, timeout: float = 5):
+        deadline = time.time() + timeout
+        while not condition():
+            self.assertLess(time.time(), deadline, "condition not reached")
+            time.sleep(0.01)
+
+    def test_links_use_node_socket_profile(self):
+        for name, profile in SOCKET_PROFILES.items():
+            self.node.socket_profile = name
+            pool = self.start_pool(size=1)
+            link = pool.idle[0][0]
+            self.assertEqual(link.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY), int(profile.nodelay), name)
+            self.assertEqual(link.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE), 1, name)
+            self.assertEqual(link.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE), profile.keepalive[0], name)
+            pool.stop()
+
+    def test_checkout_uses_warm_link(self):
+        pool = self.start_pool(size=2)
+        link = pool.checkout()
+        self.addCleanup(link.close)
+        self.assertEqual(pool.stats["hits"], 1)
+        self.wait_for(lambda: len(pool.idle) == 2)  # Refilled in the background
+
+    def test_empty_pool_grows_target(self):
+        pool = self.start_pool(size=1, max_size=3)
+        for _ in range(3):
+            pool.take()
+        self.assertEqual(pool.stats["misses"], 2)
+        self.assertEqual(pool.target, 3)
+
+    def test_idle_links_evicted(self):
+        pool = self.start_pool(size=1, max_size=3, idle_timeout=0.2)
+        pool.take(), pool.take()
+        self.wait_for(lambda: pool.stats["evicted"] > 0)
+        self.assertEqual(pool.target, 1)
+
+    def test_dead_links_discarded(self):
+        pool = self.start_pool(size=2)
+        for conn in self.accepted:
+            conn.close()
+        self.wait_for(lambda: pool.stats["dead"] >= 2)
+        self.wait_for(lambda: len(pool.idle) == 2)
+        self.assertTrue(all(pool.alive(link) for link, _ in pool.idle))
+
+    def test_reconnect_resumes_session(self):
+        pool = self.start_pool(size=1)
+        time.sleep(0.1)  # TLS 1.3 session tickets arrive after the handshake
+        self.addCleanup(pool.take().close)
+        link = pool.open_link()
+        self.addCleanup(link.close)
+        self.assertTrue(link.session_reused)
+        self.assertEqual(pool.stats["handshakes"], 1)
+        self.assertGreaterEqual(pool.stats["resumed"], 1)
+
+    def tearDown(self):
+        self.listener.close()
+        for conn in self.accepted:
+            conn.close()
+        self.chain.stop()
+
+class TestDNSCache(unittest.TestCase):
+    """
+    Unit tests for the exit node resolver cache.
+    """
+    def setUp(self):
+        self.calls = []
+        self.answers = {"example.test": (["192.0.2.1"], None)}
+        self.release = threading.Event()
+        self.release.set()
+
+    def resolver(self, host: str) -> Tuple[List[str], Optional[float]]:
+        self.calls.append(host)
+        self.release.wait(5)
+        if host not in self.answers:
+            raise socket.gaierror(socket.EAI_NONAME, host)
+        return self.answers[host]
+
+    def test_hit_within_ttl(self):
+        cache = DNSCache(resolver=self.resolver)
+        self.assertEqual(cache.lookup("example.test"), ["192.0.2.1"])
+        self.assertEqual(cache.lookup("EXAMPLE.test"), ["192.0.2.1"])
+        self.assertEqual(self.calls, ["example.test"])
+        self.assertEqual(cache.stats["hit_rate"], 0.5)
+
+    def test_record_ttl_respected(self):
+        self.answers["example.test"] = (["192.0.2.1"], 0.05)
+        cache = DNSCache(resolver=self.resolver)
+        cache.lookup("example.test")
+        time.sleep(0.1)
+        cache.lookup("example.test")
+        self.assertEqual(len(self.calls), 2)
+
+    def test_negative_caching(self):
+        cache = DNSCache(resolver=self.resolver, negative_ttl=60)
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                cache.lookup("missing.test")
+        self.assertEqual(self.calls, ["missing.test"])
+        self.assertEqual(cache.stats["negative_hits"], 1)
+
+    def test_size_bounded(self):
+        self.answers.update({f"host{i}.test": ([f"192.0.2.{i}"], None) for i in range(3)})
+        cache = DNSCache(max_entries=2, resolver=self.resolver)
+        for i in range(3):
+            cache.lookup(f"host{i}.test")
+        self.assertEqual(list(cache.entries), ["host1.test", "host2.test"])
+        self.assertEqual(cache.stats["evicted"], 1)
+
+    def test_concurrent_lookups_coalesced(self):
+        cache = DNSCache(resolver=self.resolver)
+        self.release.clear()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.lookup("example.test"))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        async def lookup_async():
+            return await asyncio.gather(*(cache.lookup_async("example.test") for _ in range(10)))
+        loop_thread = threading.Thread(target=lambda: results.extend(asyncio.run(lookup_async())))
+        loop_thread.start()
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads + [loop_thread]:
+            thread.join(5)
+        self.assertEqual(results, [["192.0.2.1"]] * 20)
+        self.assertEqual(self.calls, ["example.test"])
+        self.assertEqual(cache.stats["coalesced"], 19)
+
+    def test_cancelled_waiter_leaves_coalesced_lookup(self):
+        cache = DNSCache(resolver=self.resolver)
+        self.release.clear()
+        results = []
+        thread = threading.Thread(target=lambda: results.append(cache.lookup("example.test")))
+        async def lookups():
+            first = asyncio.ensure_future(cache.lookup_async("example.test"))
+            second = asyncio.ensure_future(cache.lookup_async("example.test"))
+            await asyncio.sleep(0.05)
+            thread.start()
+            first.cancel()  # e.g. the client hung up
+            await asyncio.sleep(0.05)
+            self.release.set()
+            return await asyncio.wait_for(second, timeout=5), first.cancelled()
+        self.assertEqual(asyncio.run(lookups()), (["192.0.2.1"], True))
+        thread.join(5)
+        self.assertEqual(results, [["192.0.2.1"]])
+        self.assertEqual(self.calls, ["example.test"])
+        self.assertEqual(cache.lookup("example.test"), ["192.0.2.1"])  # Cached despite the cancellation
+
+class TestNodeWorkers(unittest.TestCase):
+    """
+    Tests for serving one node's port from several SO_REUSEPORT worker processes.
+    """
+    def setUp(self):
+        self.chain = ProxyChain()
+        self.listener = echo_server()
+
+    def test_workers_share_port_and_report_stats(self):
+        for engine in NODE_ENGINES:
+            node = self.chain.create_node(engine)
+            node.workers = 2
+            node.rate_limit = 1000
+            node.client_limits.limit = node.destination_limits.limit = 1000
+            node.start()
+            self.addCleanup(node.stop)
+            time.sleep(0.5)
+            request = b"\x05\x01\x00\x01" + socket.inet_aton("127.0.0.1") + self.listener.getsockname()[1].to_bytes(2, "big")
+            for _ in range(40):
+                with open_socks_client(node.host, node.port) as client:
+                    client.sendall(request)
+                    self.assertEqual(recv_exactly(client, 10)[:2], b"\x05\x00")
+                    client.sendall(b"ping")
+                    self.assertEqual(recv_exactly(client, 4), b"ping")
+            workers = node.worker_pool
+            self.assertEqual(workers.alive(), 2)
+            node.stop()
+            self.assertEqual(workers.alive(), 0)
+            self.assertGreaterEqual(node.stats["requests"], 40)
+            rows = [workers.shared[index * len(workers.FIELDS)] for index in range(2)]
+            self.assertTrue(all(rows), "both workers should have served requests")
+
+    def test_workers_share_the_chain_ceiling(self):
+        self.chain.bandwidth = ShapingClass(4000)
+        nodes = [self.chain.create_node("threaded") for _ in range(4)]
+        nodes[0].bandwidth.rate = 3000
+        self.assertEqual(NodeWorkers(nodes[0], None, 2).worker_bandwidth().rate, 4000 / 4 / 2)
+        nodes[1].bandwidth.rate = 600
+        self.assertEqual(NodeWorkers(nodes[1], None, 2).worker_bandwidth().rate, 600 / 2)
+        nodes[2].bandwidth = ShapingClass(None)
+        self.assertIsNone(NodeWorkers(nodes[2], None, 2).worker_bandwidth().rate)
+
+    def tearDown(self):
+        self.listener.close()
+        self.chain.stop()
+
+class TestAdmissionControl(unittest.TestCase):
+    """
+    Tests for capping concurrent connection handlers and refusing the overflow.
+    """
+    def test_admits_queues_then_refuses(self):
+        admission = AdmissionControl(max_handlers=2, backlog=1)
+        started = []
+        self.assertEqual([admission.admit(lambda i=i: started.append(i)) for i in range(4)], [True, True, True, False])
+        self.assertEqual(started, [0, 1])
+        admission.release()
+        self.assertEqual(started, [0, 1, 2])
+        admission.release()
+        admission.release()
+        self.assertEqual(admission.active, 0)
+        self.assertEqual((admission.stats["admitted"], admission.stats["queued"], admission.stats["rejected"]), (3, 1, 1))
+        self.assertEqual(admission.stats["peak_active"], 2)
+
+    def test_release_skips_abandoned_waiters(self):
+        admission = AdmissionControl(max_handlers=1, backlog=2)
+        started = []
+        admission.admit(lambda: None)
+        admission.admit(lambda: False)  # Connection gone before a handler freed up
+        admission.admit(lambda: started.append("waiting"))
+        admission.release()
+        self.assertEqual(started, ["waiting"])
+        admission.release()
+        self.assertEqual(admission.active, 0)
+
+    def test_burst_degrades_into_fast_refusals(self):
+        listener = echo_server()
+        self.addCleanup(listener.close)
+        request = b"\x05\x01\x00\x01" + socket.inet_aton("127.0.0.1") + listener.getsockname()[1].to_bytes(2, "big")
+        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        chain = ProxyChain()
+        for engine in NODE_ENGINES:
+            node = chain.create_node(engine)
+            node.admission = AdmissionControl(max_handlers=4, backlog=4)
+            node.rate_limit = 1000
+            node.client_limits.limit = node.destination_limits.limit = 1000
+            node.start()
+            self.addCleanup(node.stop)
+            clients = 40
+            barrier = threading.Barrier(clients)
+            outcomes = []
+            def client():
+                barrier.wait()
+                try:
+                    with context.wrap_socket(socket.create_connection((node.host, node.port), timeout=10),
+                                             server_hostname=node.host) as sock:
+                        sock.sendall(b"\x05\x01\x00")
+                        greeting = recv_exactly(sock, 2)
+                        if greeting == SOCKS_REFUSED[:2]:
+                            outcomes.append("refused")
+                            return
+                        sock.sendall(request)
+                        if recv_exactly(sock, 10)[:2] != b"\x05\x00":
+                            outcomes.append("failed")
+                            return
+                        sock.sendall(b"ping")
+                        time.sleep(0.2)  # Hold the handler so the burst overlaps
+                        outcomes.append("served" if recv_exactly(sock, 4) == b"ping" else "failed")
+                except Exception as e:
+                    outcomes.append(f"error: {e}")
+            threads = [threading.Thread(target=client) for _ in range(clients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=30)
+            self.assertEqual(len(outcomes), clients, engine)
+            self.assertEqual(outcomes.count("served") + outcomes.count("refused"), clients, f"{engine}: {outcomes}")
+            self.assertGreaterEqual(outcomes.count("served"), 8, engine)
+            self.assertGreater(outcomes.count("refused"), 0, engine)
+            self.assertLessEqual(node.admission.stats["peak_active"], 4, engine)
+            self.assertGreaterEqual(node.stats["rejected"], outcomes.count("refused"), engine)  # Health checks may be refused too
+            self.assertGreater(node.stats["queue_ms"], 0, engine)
+            # The node keeps serving once the burst is over
+            with open_socks_client(node.host, node.port) as sock:
+                sock.sendall(request)
+                self.assertEqual(recv_exactly(sock, 10)[:2], b"\x05\x00", engine)
+            node.stop()
+            self.assertEqual(node.admission.active, 0, engine)
+
+    def test_silent_peers_in_burst_do_not_lock_out_clients(self):
+        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        chain = ProxyChain()
+        for engine in NODE_ENGINES:
+            node = chain.create_node(engine)
+            node.admission = AdmissionControl(max_handlers=4, backlog=4)
+            node.rate_limit = 1000
+            node.client_limits.limit = node.destination_limits.limit = 1000
+            node.timeouts = dict(node.timeouts, handshake=1)
+            node.start()
+            self.addCleanup(node.stop)
+            silent = [socket.create_connection((node.host, node.port)) for _ in range(12)]  # No ClientHello
+            for sock in silent:
+                self.addCleanup(sock.close)
+            outcomes = []
+            deadline = time.monotonic() + 10
+            while "served" not in outcomes and time.monotonic() < deadline:
+                # Every attempt is answered promptly, refused at worst, while silent peers hold handlers
+                with context.wrap_socket(socket.create_connection((node.host, node.port), timeout=2),
+                                         server_hostname=node.host) as sock:
+                    sock.sendall(b"\x05\x01\x00")
+                    outcomes.append("refused" if recv_exactly(sock, 2) == SOCKS_REFUSED[:2] else "served")
+                if outcomes[-1] == "refused":
+                    time.sleep(0.2)
+            self.assertEqual(outcomes[-1], "served", f"{engine}: {outcomes}")
+            for sock in silent:  # Handlers still waiting on them fail their handshakes and leave
+                sock.close()
+            deadline = time.monotonic() + 5
+            while node.admission.active and time.monotonic() < deadline:
+                time.sleep(0.05)
+            node.stop()
+            self.assertEqual(node.admission.active, 0, engine)
+
+class TestSlidingWindowLimiter(unittest.TestCase):
+    """
+    Tests for the request rate limiter.
+    """
+    @staticmethod
+    def request_log(limit: int, window: float):
+        """The queue-scanning limiter the ring replaced, as the reference for its decisions."""
+        timestamps = deque()
+        def check(now: float) -> bool:
+            while timestamps and len(timestamps) > limit:
+                timestamps.popleft()
+            while timestamps and now - timestamps[0] > window:
+                timestamps.popleft()
+            timestamps.append(now)
+            return len(timestamps) <= limit
+        return check
+
+    def test_matches_request_log(self):
+        rng = random.Random(21)
+        for limit in (1, 3, 10):
+            limiter, reference = SlidingWindowLimiter(limit, window=60), self.request_log(limit, 60)
+            now = 0.0
+            for _ in range(5000):
+                now += rng.choice((0, rng.expovariate(limit / 60), 60))
+                self.assertEqual(limiter.allow(now), reference(now), (limit, now))
+            self.assertLessEqual(len(limiter.arrivals), limit)
+
+    def test_concurrent_decisions_allow_exactly_the_limit(self):
+        limiter = SlidingWindowLimiter(1000)
+        allowed = []
+        def decide():
+            allowed.append(sum(limiter.allow() for _ in range(200)))
+        threads = [threading.Thread(target=decide) for _ in range(64)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(allowed), 1000)
+
+    def test_node_follows_rate_limit_changes(self):
+        chain = ProxyChain()
+        self.addCleanup(chain.stop)
+        node = chain.create_node()
+        node.rate_limit = 2
+        self.assertEqual([node.check_rate_limit() for _ in range(3)], [True, True, False])
+        node.rate_limit = 3
+        self.assertEqual([node.check_rate_limit() for _ in range(4)], [True, True, True, False])
+
+    def test_links_closed_unused_not_counted(self):
+        chain = ProxyChain()
+        self.addCleanup(chain.stop)
+        listener = echo_server()
+        self.addCleanup(listener.close)
+        request = b"\x05\x01\x00\x01" + socket.inet_aton("127.0.0.1") + listener.getsockname()[1].to_bytes(2, "big")
+        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        for engine in NODE_ENGINES:
+            node = chain.create_node(engine)
+            node.rate_limit = 2  # The start-up health check and one client
+            node.start()
+            self.addCleanup(node.stop)
+            for _ in range(5):  # Like warm links the previous node closes without using
+                context.wrap_socket(socket.create_connection((node.host, node.port), timeout=5),
+                                    server_hostname=node.host).close()
+            time.sleep(0.2)
+            with open_socks_client(node.host, node.port) as client:
+                client.sendall(request)
+                self.assertEqual(recv_exactly(client, 10)[:2], b"\x05\x00", engine)
+            self.assertLessEqual(node.stats["requests"], 2, engine)
+
+class TestTrafficShaper(unittest.TestCase):
+    """
+    Tests for the hierarchical traffic shaper.
+    """
+    def test_fair_shares(self):
+        self.assertEqual(fair_shares(100, [(0, math.inf), (0, math.inf)]), [50, 50])
+        shares = fair_shares(100, [(0, 10), (0, math.inf), (60, math.inf)])
+        self.assertEqual(shares[0], 10)
+        self.assertAlmostEqual(shares[1], 30)
+        self.assertAlmostEqual(shares[2], 60)
+        self.assertEqual(fair_shares(100, [(80, math.inf), (80, math.inf), (0, math.inf)]), [100 / 3] * 3)
+        self.assertEqual(fair_shares(math.inf, [(0, 10), (0, math.inf)]), [10, math.inf])
+
+    def test_quiet_flows_lend_their_share(self):
+        node = ShapingClass(100000)
+        busy, quiet, capped = node.flow(), node.flow(), node.flow(max_rate=10000)
+        busy.reserve(1)
+        self.assertEqual(busy.bucket.rate, 100000)
+        quiet.reserve(1)
+        self.assertEqual((busy.bucket.rate, quiet.bucket.rate), (50000, 50000))
+        time.sleep(SHAPING_IDLE + 0.05)
+        busy.reserve(1)
+        capped.reserve(1)
+        self.assertAlmostEqual(busy.bucket.rate, 90000)
+        self.assertEqual(capped.bucket.rate, 10000)
+
+    def test_chain_ceiling_spans_nodes(self):
+        chain = ShapingClass(100000)
+        first, second = ShapingClass(80000, parent=chain), ShapingClass(80000, parent=chain)
+        first_flow, second_flow = first.flow(), second.flow()
+        first_flow.reserve(1)
+        self.assertEqual(first_flow.bucket.rate, 80000)  # The node ceiling binds
+        second_flow.reserve(1)
+        self.assertEqual((first_flow.bucket.rate, second_flow.bucket.rate), (50000, 50000))
+        self.assertEqual(chain.busy_flows, 2)
+
+    def test_fifty_competing_flows(self):
+        rate, min_rate, warmup, duration = 500000, CONFIG["MIN_SPEED_KBPS"] * 1000 / 8, 0.5, 2.5
+        chain = ShapingClass(rate * 2)
+        node = ShapingClass(rate, parent=chain, flow_min_rate=min_rate)
+        sent = [0] * 50
+        start_time = time.monotonic()
+        def stream(index: int):
+            flow = node.flow()
+            chunk_size = 8192 if index == 0 else 1024  # One bulk flow among interactive ones
+            while True:
+                wait = flow.reserve(chunk_size)
+                sent_at = time.monotonic() - start_time + wait
+                if sent_at > duration:
+                    break
+                if sent_at >= warmup:  # Count the steady state, once every flow has joined
+                    sent[index] += chunk_size
+                time.sleep(wait)
+        threads = [threading.Thread(target=stream, args=(i,)) for i in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Jain's fairness index: 1.0 when every flow got the same
+        fairness = sum(sent) ** 2 / (len(sent) * sum(count ** 2 for count in sent))
+        self.assertGreater(fairness, 0.95, sent)
+        self.assertLess(sum(sent), rate * (duration - warmup) * 1.05)  # The node ceiling holds
+        self.assertGreater(min(sent), min_rate * (duration - warmup))  # Every flow got MIN_SPEED_KBPS
+
+class TestRateLimitTable(unittest.TestCase):
+    """
+    Tests for the per-client and per-destination rate limit tables.
+    """
+    def test_keys_are_limited_independently(self):
+        table = RateLimitTable(3)
+        self.assertEqual([table.allow("10.0.0.1", now=0) for _ in range(5)], [True, True, True, False, False])
+        self.assertTrue(all(table.allow(f"10.0.0.{i}", now=1) for i in range(2, 50)))
+        self.assertFalse(table.allow("10.0.0.1", now=2))
+        self.assertTrue(table.allow("10.0.0.1", now=61))
+        self.assertEqual(table.snapshot()["keys"]["10.0.0.1"]["refused"], 3)
+
+    def test_lru_bound_under_churn(self):
+        table = RateLimitTable(2, max_keys=64)
+        for i in range(10000):
+            table.allow("noisy", now=i * 0.001)
+            table.allow(f"client-{i}", now=i * 0.001)
+            self.assertLessEqual(len(table), 64)
+        self.assertIn("noisy", table.entries)  # Kept warm by its own traffic
+        self.assertFalse(table.allow("noisy", now=10))
+        self.assertEqual(table.stats["evicted"], 10000 - 63)
+
+    def test_idle_keys_expire(self):
+        table = RateLimitTable(1, window=60, ttl=300)
+        table.allow("a", now=0)
+        table.allow("b", now=200)
+        table.allow("c", now=301)
+        self.assertEqual(list(table.entries), ["b", "c"])
+        self.assertTrue(table.allow("a", now=302))  # Forgotten, so it starts afresh
+
+    def test_clients_refused_over_limit(self):
+        for engine in NODE_ENGINES:
+            with self.subTest(engine=engine):
+                chain = ProxyChain()
+                self.addCleanup(chain.stop)
+                node = chain.create_node(engine)
+                node.client_limits.limit = 1
+                node.start()
+                self.addCleanup(node.stop)
+                replies = []
+                for _ in range(2):
+                    with open_socks_client(node.host, node.port) as client:
+                        client.sendall(b"\x05\x01\x00\x03\x09localhost" + (1).to_bytes(2, "big"))
+                        replies.append(recv_exactly(client, 2))
+                self.assertNotEqual(replies[0], b"\x05\x02")
+                self.assertEqual(replies[1], b"\x05\x02")
+                self.assertEqual(node.destination_limits.snapshot()["keys"]["localhost"]["allowed"], 1)
+
+    def test_status_reports_rate_limits(self):
+        chain = ProxyChain()
+        self.addCleanup(chain.stop)
+        node = chain.create_node()
+        chain.nodes.append(node)
+        node.check_keyed_limits("127.0.0.1", "Example.com")
+        flask_app.config["PROXY_CHAIN"] = chain
+        self.addCleanup(flask_app.config.pop, "PROXY_CHAIN")
+        status = flask_app.test_client().get("/status?keys=1").get_json()
+        limits = status["nodes"][0]["rate_limits"]
+        self.assertEqual(list(limits["client"]["keys"]), ["127.0.0.1"])
+        self.assertEqual(limits["client"]["keys"]["127.0.0.1"]["allowed"], 1)
+        self.assertEqual(list(limits["destination"]["keys"]), ["example.com"])
+
+class TestTokenBucket(unittest.TestCase):
+    """
+    Tests for the reservation-based bandwidth limiter.
+    """
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=1000, capacity=500)
+        self.assertEqual(bucket.reserve(500), 0.0)
+        self.assertAlmostEqual(bucket.reserve(100), 0.1, delta=0.01)
+        self.assertAlmostEqual(bucket.reserve(100), 0.2, delta=0.01)
+        self.assertLess(bucket.tokens, 0)
+        self.assertEqual(bucket.stats["delayed"], 2)
+        self.assertEqual(TokenBucket(None).reserve(10 ** 9), 0.0)
+
+    def test_waiting_holds_no_node_lock(self):
+        chain = ProxyChain()
+        node = chain.create_node()
+        self.addCleanup(chain.stop)
+        node.bandwidth = TokenBucket(rate=10000, capacity=0)
+        throttled = threading.Thread(target=node.throttle_bandwidth, args=(10000,))
+        throttled.start()
+        time.sleep(0.1)
+        self.assertTrue(throttled.is_alive())
+        # Stats updates and rate-limit checks go ahead while the throttled caller waits
+        start_time = time.monotonic()
+        self.assertTrue(node.check_rate_limit())
+        node.account_downstream(100)
+        self.assertLess(time.monotonic() - start_time, 0.1)
+        throttled.join()
+
+    def test_concurrent_streams_progress_in_parallel(self):
+        rate, streams, chunks, chunk_size = 200000, 4, 10, 5000
+        bucket = TokenBucket(rate=rate, capacity=chunk_size)
+        progress = [[] for _ in range(streams)]
+        start_time = time.monotonic()
+        def stream(index: int):
+            for _ in range(chunks):
+                time.sleep(bucket.reserve(chunk_size))
+                progress[index].append(time.monotonic() - start_time)
+        threads = [threading.Thread(target=stream, args=(i,)) for i in range(streams)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start_time
+        expected = (streams * chunks - 1) * chunk_size / rate
+        self.assertGreater(elapsed, expected * 0.9)  # The combined rate is enforced
+        self.assertLess(elapsed, expected * 1.5 + 0.2)
+        # Every stream is halfway through by the midpoint, rather than one stream at a time
+        for times in progress:
+            self.assertGreaterEqual(sum(t <= expected / 2 + 0.05 for t in times), chunks // 2 - 1)
+
+class TestTimerWheel(unittest.TestCase):
+    """
+    Tests for the hashed timer wheel and per-connection deadlines.
+    """
+    def test_hundred_thousand_timers(self):
+        wheel = TimerWheel(tick=0.01)
+        wheel.thread = threading.current_thread()  # Advanced by hand below; timing is left to BENCHMARK=timers
+        fired = []
+        start_time = time.monotonic()
+        timers = [wheel.schedule(1 + (i % 100) / 200, lambda i=i: fired.append(i)) for i in range(100000)]
+        for timer in timers[::2]:
+            wheel.cancel(timer)
+        for timer in timers[1::4]:
+            wheel.reschedule(timer, 1.5)
+        wheel.advance(start_time + 0.9)
+        self.assertEqual(fired, [])
+        wheel.advance(time.monotonic() + 2)
+        self.assertEqual(len(fired), 50000)
+        self.assertEqual(set(fired), set(range(1, 100000, 2)))
+        expiries = [timers[i].expires for i in fired]
+        self.assertEqual(expiries, sorted(expiries))
+        self.assertEqual(wheel.stats, {"scheduled": 100000, "fired": 50000, "cancelled": 50000, "pending": 0})
+
+    def test_timers_fire_in_deadline_order(self):
+        wheel = TimerWheel(tick=0.01)
+        fired = []
+        for delay in (0.3, 0.1, 0.2, 6.0):  # 6 s wraps the 512-slot wheel
+            wheel.schedule(delay, lambda delay=delay: fired.append(delay))
+        time.sleep(0.5)
+        self.assertEqual(fired, [0.1, 0.2, 0.3])
+
+    def test_stalled_and_idle_connections_are_reaped(self):
+        listener = echo_server()
+        self.addCleanup(listener.close)
+        request = b"\x05\x01\x00\x01" + socket.inet_aton("127.0.0.1") + listener.getsockname()[1].to_bytes(2, "big")
+        chain = ProxyChain()
+        for engine in NODE_ENGINES:
+            node = chain.create_node(engine)
+            node.rate_limit = 1000
+            node.client_limits.limit = node.destination_limits.limit = 1000
+            node.timeouts = {"handshake": 0.5, "connect": 5, "idle": 1}
+            node.start()
+            self.addCleanup(node.stop)
+            stalled = open_socks_client(node.host, node.port)  # Greeting done, request never sent
+            stalled.sendall(request[:3])
+            idle, busy = open_socks_client(node.host, node.port), open_socks_client(node.host, node.port)
+            for sock in (idle, busy):
+                sock.sendall(request)
+                self.assertEqual(recv_exactly(sock, 10)[:2], b"\x05\x00", engine)
+            for _ in range(8):  # 2 s of traffic on the busy tunnel only
+                busy.sendall(b"ping")
+                self.assertEqual(recv_exactly(busy, 4), b"ping", engine)
+                time.sleep(0.25)
+            for sock in (stalled, idle):
+                self.assertEqual(sock.recv(1), b"", engine)
+                sock.close()
+            busy.sendall(b"pong")
+            self.assertEqual(recv_exactly(busy, 4), b"pong", engine)
+            busy.close()
+            self.assertEqual(node.stats["reaped"], 2, engine)
+
+    def test_silent_peer_does_not_stall_tls_handshakes(self):
+        chain = ProxyChain()
+        for engine in NODE_ENGINES:
+            node = chain.create_node(engine)
+            node.rate_limit = 1000
+            node.client_limits.limit = node.destination_limits.limit = 1000
+            node.timeouts = dict(node.timeouts, handshake=3)
+            node.start()
+            self.addCleanup(node.stop)
+            silent = socket.create_connection((node.host, node.port))  # Never sends a ClientHello
+            self.addCleanup(silent.close)
+            time.sleep(0.1)
+            # Served while the silent peer's handshake is still pending
+            with open_socks_client(node.host, node.port, timeout=2) as client:
+                client.sendall(b"\x05\x07\x00\x01" + bytes(6))
+                self.assertEqual(recv_exactly(client, 2), b"\x05\x07", engine)
+            silent.settimeout(10)
+            try:
+                closed = silent.recv(1) == b""
+            except ConnectionResetError:
+                closed = True
+            self.assertTrue(closed, f"{engine}: silent peer outlived the handshake deadline")
+
+class TestExitConnector(unittest.TestCase):
+    """
+    Tests for racing destination addresses at the exit node.
+
+    The IPv6 listener never accepts and its backlog is full, so connects to
+    it hang like a blackholed address; the IPv4 listener on the same port answers.
+    """
+    def setUp(self):
+        if not socket.has_ipv6:
+            self.skipTest("IPv6 unavailable")
+        for _ in range(10):  # The port free on ::1 may be taken on 127.0.0.1
+            self.stalled = socket.socket(socket.AF_INET6)
+            self.stalled.bind(("::1", 0))
+            self.port = self.stalled.getsockname()[1]
+            try:
+                self.listener = socket.create_server(("127.0.0.1", self.port))
+                break
+            except OSError:
+                self.stalled.close()
+        else:
+            self.skipTest("No port free on both ::1 and 127.0.0.1")
+        self.stalled.listen(0)
+        self.backlog = []
+        for _ in range(3):
+            sock = socket.socket(socket.AF_INET6)
+            sock.setblocking(False)
+            sock.connect_ex(("::1", self.port))
+            self.backlog.append(sock)
+
+    def test_order_interleaves_families(self):
+        self.assertEqual(ExitConnector.order(["::1", "::2", "10.0.0.1", "10.0.0.2", "::3"]),
+                         ["::1", "10.0.0.1", "::2", "10.0.0.2", "::3"])
+
+    def test_stalled_address_loses_race(self):
+        connector = ExitConnector(attempt_delay=0.1)
+        start_time = time.monotonic()
+        with connector.connect("dual.test", ["::1", "127.0.0.1"], self.port) as sock:
+            self.assertEqual(sock.getpeername()[0], "127.0.0.1")
+        self.assertLess(time.monotonic() - start_time, 1)
+        self.assertEqual(connector.latency[f"dual.test:{self.port}"]["address"], "127.0.0.1")
+
+    def test_socket_profile_applied_to_racing_attempts(self):
+        connector = ExitConnector(attempt_delay=0.1)
+        profile = SOCKET_PROFILES["bulk"]
+        with connector.connect("dual.test", ["::1", "127.0.0.1"], self.port, profile) as sock:
+            self.assertEqual(sock.getpeername()[0], "127.0.0.1")
+            self.assertEqual(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY), 0)
+            self.assertEqual(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE), 1)
+        async def connect():
+            reader, writer = await connector.connect_async("dual.test", ["::1", "127.0.0.1"], self.port, profile)
+            sock = writer.get_extra_info("socket")
+            options = (writer.get_extra_info("peername")[0], sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY),
+                       sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+            writer.close()
+            return options
+        self.assertEqual(asyncio.run(connect()), ("127.0.0.1", 0, 1))
+
+    def test_stalled_address_loses_race_async(self):
+        connector = ExitConnector(attempt_delay=0.1)
+        async def connect():
+            reader, writer = await connector.connect_async("dual.test", ["::1", "127.0.0.1"], self.port)
+            writer.close()
+            return writer.get_extra_info("peername")[0]
+        start_time = time.monotonic()
+        self.assertEqual(asyncio.run(connect()), "127.0.0.1")
+        self.assertLess(time.monotonic() - start_time, 1)
+        self.assertEqual(connector.latency[f"dual.test:{self.port}"]["connects"], 1)
+        self.assertEqual(connector.snapshot()[f"dual.test:{self.port}"]["address"], "127.0.0.1")
+
+    def test_refused_address_skips_delay(self):
+        self.stalled.close()
+        connector = ExitConnector(attempt_delay=3)
+        start_time = time.monotonic()
+        connector.connect("dual.test", ["::1", "127.0.0.1"], self.port).close()
+        self.assertLess(time.monotonic() - start_time, 1)
+
+    def test_unreachable_address_skips_delay(self):
+        connector = ExitConnector(attempt_delay=0.5)
+        start_time = time.monotonic()
+        # ::1 stalls in flight, the broadcast address fails with ENETUNREACH when its turn comes
+        with connector.connect("dual.test", ["::1", "255.255.255.255", "127.0.0.1"], self.port) as sock:
+            self.assertEqual(sock.getpeername()[0], "127.0.0.1")
+        self.assertLess(time.monotonic() - start_time, 2 * 0.5)
+
+    def test_all_addresses_fail(self):
+        connector = ExitConnector(attempt_delay=0.05, timeout=0.3)
+        self.listener.close()
+        with self.assertRaises(OSError):
+            connector.connect("dual.test", ["::1", "127.0.0.1"], self.port)
+        with self.assertRaises((OSError, asyncio.TimeoutError)):
+            asyncio.run(connector.connect_async("dual.test", ["::1", "127.0.0.1"], self.port))
+
+    def tearDown(self):
+        for sock in self.backlog + [self.stalled, self.listener]:
+            sock.close()
+
+class TestSocksAddress(unittest.TestCase):
+    """
+    Unit tests for SOCKS5 destination parsing.
+    """
+    def test_address_types(self):
+        self.assertEqual(parse_socks_address(b"\x01\x7f\x00\x00\x01\x00\x50"), ("127.0.0.1", 80))
+        self.assertEqual(parse_socks_address(b"\x03\x0bexample.com\x01\xbb"), ("example.com", 443))
+        self.assertEqual(parse_socks_address(b"\x04" + socket.inet_pton(socket.AF_INET6, "::1") + b"\x00\x16"), ("::1", 22))
+
+    def test_malformed_addresses_rejected(self):
+        for dest in (b"", b"\x01\x7f\x00\x00\x01\x00", b"\x03\x00\x00\x50", b"\x03\x05abc\x00\x50", b"\x02\x00\x00\x00"):
+            with self.assertRaises(ValueError):
+                parse_socks_address(dest)
+
+    def test_forwarded_request_must_be_connect(self):
+        self.assertEqual(parse_socks_request(b"\x05\x01\x00\x03\x01a\x00\x50"), b"\x03\x01a\x00\x50")
+        self.assertEqual(parse_socks_request(SOCKS_UDP_ASSOCIATE_REQUEST, SOCKS_CMD_UDP_ASSOCIATE), b"\x01" + b"\x00" * 6)
+        with self.assertRaises(ValueError):
+            parse_socks_request(b"\x05\x02\x00\x03\x01a\x00\x50")
+
+    def test_datagram_batches_round_trip(self):
+        datagrams = [(socks_address("127.0.0.1", 53), b"query"), (socks_address("::1", 5353), b""),
+                     (socks_address("example.com", 443), os.urandom(1400))]
+        self.assertEqual(unpack_datagrams(pack_datagrams(datagrams)), datagrams)
+        with self.assertRaises(ValueError):
+            unpack_datagrams(pack_datagrams(datagrams)[:-1])
+
+    def test_oversize_datagram_dropped(self):
+        datagrams = [(socks_address("::1", 53), b"x" * 65527), (socks_address("127.0.0.1", 53), b"fits"),
+                     (socks_address(".".join(["a" * 63] * 4), 53), b"x" * 65507)]
+        self.assertEqual(unpack_datagrams(pack_datagrams(datagrams)), datagrams[1:2])
+        self.assertEqual(pack_datagrams(datagrams[:1]), b"")
+
+class TestSocksHandshake(unittest.TestCase):
+    """
+    Unit and fuzz tests for the incremental SOCKS5 handshake parser.
+    """
+    VALID = [
+        (b"\x05\x01\x00", b"\x05\x01\x00\x01\x7f\x00\x00\x01\x00\x50"),
+        (b"\x05\x03\x02\x01\x00", b"\x05\x01\x00\x03\x0bexample.com\x01\xbb"),
+        (b"\x05\x01\x00", b"\x05\x03\x00\x04" + socket.inet_pton(socket.AF_INET6, "::1") + b"\x00\x35"),
+        (b"\x05\x02\x00\x02", b"\x05\x02\x07\x03\x01a\x00\x00"),
+    ]
+    # Malformed handshakes and the reply that ends each one
+    CORPUS = [
+        (b"\x04\x01\x00", b"\x05\xff"),
+        (b"\x05\x00", b"\x05\xff"),
+        (b"\x05\x01\x02", b"\x05\xff"),
+        (b"\x05\x01\x00\x04\x01\x00\x01\x7f\x00\x00\x01\x00\x50", b"\x05\x00\x05\x01\x00\x01" + b"\x00" * 6),
+        (b"\x05\x01\x00\x05\x01\x00\x02\x00\x00", b"\x05\x00\x05\x08\x00\x01" + b"\x00" * 6),
+        (b"\x05\x01\x00\x05\x01\x00\x03\x00\x00\x50", b"\x05\x00\x05\x08\x00\x01" + b"\x00" * 6),
+        (b"\x05\x01\x00\x05\x01\x00\xff\x00", b"\x05\x00\x05\x08\x00\x01" + b"\x00" * 6),
+        (b"\x05\x01\x00\x05\x01\x00\x03\x02\xc3\xa9\x00\x50", b"\x05\x00\x05\x01\x00\x01" + b"\x00" * 6),
+    ]
+
+    def parse(self, data: bytes, splits: List[int]) -> Tuple[SocksHandshake, bytes]:
+        handshake = SocksHandshake()
+        replies = b""
+        start = 0
+        for end in splits + [len(data)]:
+            replies += handshake.feed(data[start:end])
+            start = end
+            if handshake.finished:
+                break
+        return handshake, replies
+
+    def test_valid_handshakes_however_split(self):
+        rng = random.Random(18)
+        for greeting, connect_request in self.VALID:
+            data = greeting + connect_request + b"early data"
+            for splits in ([], list(range(1, len(data))), [len(greeting)], sorted(rng.sample(range(1, len(data)), 5))):
+                handshake, replies = self.parse(data, splits)
+                self.assertEqual(handshake.state, "done")
+                self.assertEqual(replies, b"\x05\x00")
+                self.assertEqual(handshake.command, connect_request[1])
+                self.assertEqual(handshake.destination, connect_request[3:])
+                # Whatever followed the request in the same reads is left for the tunnel
+                self.assertTrue(b"early data".startswith(bytes(handshake.buffer)))
+
+    def test_incomplete_handshake_waits(self):
+        greeting, connect_request = self.VALID[1]
+        for end in range(len(greeting + connect_request)):
+            handshake, replies = self.parse((greeting + connect_request)[:end], [])
+            self.assertFalse(handshake.finished)
+            self.assertEqual(replies, b"\x05\x00" if end >= len(greeting) else b"")
+
+    def test_malformed_corpus(self):
+        for data, expected in self.CORPUS:
+            for splits in ([], list(range(1, len(data)))):
+                handshake, replies = self.parse(data, splits)
+                self.assertEqual(handshake.state, "failed", data)
+                self.assertEqual(replies, expected, data)
+
+    def test_random_mutations_parse_consistently(self):
+        rng = random.Random(1928)
+        for _ in range(3000):
+            greeting, request = rng.choice(self.VALID)
+            data = bytearray(greeting + request)
+            for _ in range(rng.randint(1, 4)):
+                position = rng.randrange(len(data))
+                action = rng.randrange(3)
+                if action == 0:
+                    data[position] = rng.randrange(256)
+                elif action == 1:
+                    del data[position]
+                else:
+                    data.insert(position, rng.randrange(256))
+            data = bytes(data)
+            whole, whole_replies = self.parse(data, [])
+            splits = sorted(rng.sample(range(1, len(data)), min(3, len(data) - 1))) if len(data) > 1 else []
+            split, split_replies = self.parse(data, splits)
+            self.assertEqual((whole.state, whole.command, whole.destination, whole_replies),
+                             (split.state, split.command, split.destination, split_replies), data)
+            if whole.state == "done":
+                parse_socks_address(whole.destination)
+
+class TestFramedChain(unittest.TestCase):
+    """
+    End-to-end tests for a chain speaking the inter-node frame protocol.
+    """
+    def setUp(self):
+        self.chain = ProxyChain()
+        self.listener = echo_server()
+
+    def echo_through(self, nodes: List[ProxyNode], payload: bytes, address: bytes = None) -> bytes:
+        dest = (address or b"\x01" + socket.inet_aton("127.0.0.1")) + self.listener.getsockname()[1].to_bytes(2, "big")
+        with open_socks_client(nodes[0].host, nodes[0].port) as client:
+            client.sendall(b"\x05\x01\x00" + dest)
+            reply = recv_exactly(client, 3 + len(dest))
+            self.assertEqual(reply, b"\x05\x00\x00" + dest)
+            client.sendall(payload)
+            received = b""
+            while len(received) < len(payload):
+                data = client.recv(65536)
+                if not data:
+                    break
+                received += data
+            return received
+
+    def test_threaded_chain_echo(self):
+        payload = os.urandom(256 * 1024) + b"||" * 1000
+        self.assertEqual(self.echo_through(start_test_chain(self.chain, ("threaded",) * 3), payload), payload)
+
+    def test_async_chain_echo(self):
+        payload = os.urandom(256 * 1024) + b"||" * 1000
+        self.assertEqual(self.echo_through(start_test_chain(self.chain, ("asyncio",) * 3), payload), payload)
+
+    def test_domain_name_resolved_at_exit(self):
+        for engine in NODE_ENGINES:
+            nodes = start_test_chain(self.chain, (engine,) * 3)
+            for _ in range(3):
+                self.assertEqual(self.echo_through(nodes, b"ping", b"\x03\x09localhost"), b"ping")
+            self.assertEqual(nodes[-1].dns_cache.stats["misses"], 1)
+            self.assertEqual(nodes[-1].stats["dns_hit_rate"], 2 / 3)
+            self.assertEqual(nodes[0].dns_cache.stats["misses"], 0)
+
+    def test_pipelined_handshake_and_early_data(self):
+        dest = b"\x01" + socket.inet_aton("127.0.0.1") + self.listener.getsockname()[1].to_bytes(2, "big")
+        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        for engine in NODE_ENGINES:
+            nodes = start_test_chain(self.chain, (engine,) * 3)
+            with context.wrap_socket(socket.create_connection((nodes[0].host, nodes[0].port), timeout=5),
+                                     server_hostname=nodes[0].host) as client:
+                # Greeting, request and the first payload in a single write
+                client.sendall(b"\x05\x01\x00" + b"\x05\x01\x00" + dest + b"ping")
+                self.assertEqual(recv_exactly(client, 2 + 3 + len(dest)), b"\x05\x00" + b"\x05\x00\x00" + dest, engine)
+                self.assertEqual(recv_exactly(client, 4), b"ping", engine)
+
+    def test_ipv6_destination(self):
+        if not socket.has_ipv6:
+            self.skipTest("IPv6 unavailable")
+        self.listener.close()
+        self.listener = echo_server("::1", family=socket.AF_INET6)
+        for engine in NODE_ENGINES:
+            nodes = start_test_chain(self.chain, (engine,) * 3)
+            self.assertEqual(self.echo_through(nodes, b"ping", b"\x04" + socket.inet_pton(socket.AF_INET6, "::1")), b"ping")
+
+    def tearDown(self):
+        self.listener.close()
+        self.chain.stop()
+
+class TestLinkEmulation(unittest.TestCase):
+    """
+    Tests for emulating the links between nodes from their locales.
+    """
+    NEW_YORK = {"country": "United States", "lat": 40.7128, "lon": -74.0060}
+    LONDON = {"country": "United Kingdom", "lat": 51.5074, "lon": -0.1278}
+
+    def setUp(self):
+        self.chain = ProxyChain()
+        self.listener = echo_server(backlog=256)
+
+    def start_nodes(self, engine: str) -> List[ProxyNode]:
+        nodes = start_test_chain(self.chain, (engine,) * 2, link_emulation=True, link_jitter=0, link_loss=0)
+        nodes[0].locale, nodes[1].locale = self.NEW_YORK, self.LONDON  # Links are emulated from first use
+        return nodes
+
+    def test_delay_from_locale_distance(self):
+        self.assertAlmostEqual(great_circle_km(self.NEW_YORK, self.LONDON), 5570, delta=15)
+        self.assertEqual(great_circle_km(self.LONDON, self.LONDON), 0)
+        emulator = LinkEmulator(self.NEW_YORK, self.LONDON, jitter=0, loss=0)
+        self.assertAlmostEqual(emulator.delay, 5570 * ROUTE_STRETCH / FIBRE_KM_PER_S, delta=0.001)
+        self.assertEqual(emulator.arrival(10.0), 10.0 + emulator.delay)
+
+    def test_jitter_and_loss_keep_stream_order(self):
+        emulator = LinkEmulator(self.NEW_YORK, self.LONDON, jitter=0.005, loss=0.1, rng=random.Random(7))
+        line = DelayLine(emulator)
+        for i in range(1000):
+            line.push(i.to_bytes(4, "big"), i / 1000)
+        dues = [due for due, _ in line.chunks]
+        self.assertEqual(dues, sorted(dues))
+        self.assertEqual(emulator.stats["chunks"], 1000)
+        self.assertTrue(50 <= emulator.stats["lost"] <= 150, emulator.stats)
+        self.assertGreaterEqual(max(dues) - 0.999, emulator.delay + LINK_RTO_MIN - 0.05)
+        self.assertEqual([int.from_bytes(line.pop(), "big") for _ in range(1000)], list(range(1000)))
+        self.assertEqual((len(line), line.held, line.due), (0, 0, None))
+
+    def test_delay_line_holds_a_bounded_amount(self):
+        line = DelayLine(LinkEmulator(self.NEW_YORK, self.LONDON, jitter=0, loss=0))
+        chunk = bytes(64 * 1024)
+        while not line.full:
+            line.push(chunk, 0.0)
+        self.assertEqual(line.held, LINK_EMULATION_HOLD)
+        line.pop()
+        self.assertFalse(line.full)
+
+    def test_round_trip_crosses_the_link_twice(self):
+        for engine in NODE_ENGINES:
+            nodes = self.start_nodes(engine)
+            delay = nodes[0].link_emulator(nodes[1]).delay
+            dest = b"\x01" + socket.inet_aton("127.0.0.1") + self.listener.getsockname()[1].to_bytes(2, "big")
+            with open_socks_client(nodes[0].host, nodes[0].port) as client:
+                client.sendall(b"\x05\x01\x00" + dest)
+                self.assertEqual(recv_exactly(client, 3 + len(dest)), b"\x05\x00\x00" + dest)
+                start = time.monotonic()
+                client.sendall(b"ping")
+                self.assertEqual(recv_exactly(client, 4), b"ping", engine)
+                self.assertGreaterEqual(time.monotonic() - start, 2 * delay, engine)
+            self.assertGreater(nodes[0].emulators[nodes[1].port].stats["chunks"], 0)
+            self.assertGreater(nodes[1].emulators[nodes[0].port].stats["chunks"], 0)
+
+    def test_concurrent_streams_wait_on_timers_not_threads(self):
+        nodes = self.start_nodes("asyncio")
+        delay = nodes[0].link_emulator(nodes[1]).delay
+        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        threads = threading.active_count()
+
+        async def client(index: int) -> bool:
+            reader, writer = await asyncio.open_connection(nodes[0].host, nodes[0].port, ssl=context)
+            try:
+                writer.write(b"\x05\x01\x00")
+                await reader.readexactly(2)
+                writer.write(b"\x05\x01\x00\x01" + socket.inet_aton("127.0.0.1") + port.to_bytes(2, "big"))
+                await reader.readexactly(10)
+                for round_trip in range(5):
+                    payload = (index * 5 + round_trip).to_bytes(4, "big")
+                    writer.write(payload)
+                    if await reader.readexactly(4) != payload:
+                        return False
+                return True
+            finally:
+                writer.close()
+
+        async def echo(reader, writer):
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+            writer.close()
+
+        async def run() -> Tuple[List[bool], float, int]:
+            nonlocal port
+            server = await asyncio.start_server(echo, "127.0.0.1", 0, backlog=256)
+            port = server.sockets[0].getsockname()[1]
+            most_threads = threads
+            start = time.monotonic()
+            streams = asyncio.gather(*(client(i) for i in range(200)))
+            while not streams.done() and time.monotonic() - start < 60:
+                most_threads = max(most_threads, threading.active_count())
+                await asyncio.wait([streams], timeout=0.01)
+            server.close()
+            return await asyncio.wait_for(streams, timeout=1), time.monotonic() - start, most_threads
+
+        port = None
+        results, elapsed, most_threads = asyncio.run(run())
+        self.assertEqual(results.count(True), 200)
+        # 1000 round trips of at least 2 * delay each, overlapped rather than queued behind one another
+        self.assertLess(elapsed, 100 * 2 * delay)
+        self.assertLessEqual(most_threads - threads, 2)  # The timer wheel and a resolver thread, not one per stream
+
+    def tearDown(self):
+        self.listener.close()
+        self.chain.stop()
+
+class TestUDPAssociate(unittest.TestCase):
+    """
+    End-to-end tests for SOCKS5 UDP ASSOCIATE through a chain.
+    """
+    def setUp(self):
+        self.chain = ProxyChain()
+        # Dual-stack, so a domain destination answers on whichever address the exit picks
+        self.echo_sock = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+        self.echo_sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+        self.echo_sock.bind(("::", 0))
+        self.port = self.echo_sock.getsockname()[1]
+        threading.Thread(target=self.echo, daemon=True).start()
+
+    def echo(self):
+        while True:
+            try:
+                data, sender = self.echo_sock.recvfrom(65535)
+                self.echo_sock.sendto(data, sender)
+            except OSError:
+                return
+
+    def associate(self, node: ProxyNode) -> Tuple[ssl.SSLSocket, socket.socket]:
+        control, relay = open_udp_associate(node.host, node.port)
+        self.addCleanup(control.close)
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        client.connect(relay)
+        client.settimeout(5)
+        self.addCleanup(client.close)
+        return control, client
+
+    def test_echo_through_chain(self):
+        for engines in (("threaded",) * 3, ("asyncio",) * 3, ("threaded", "asyncio", "threaded")):
+            nodes = start_test_chain(self.chain, engines)
+            _, client = self.associate(nodes[0])
+            destination = socks_address("127.0.0.1", self.port)
+            sent = [os.urandom(64) + bytes([i]) for i in range(50)]
+            for data in sent:
+                client.send(b"\x00\x00\x00" + destination + data)
+            replies = [client.recv(65535) for _ in sent]
+            for reply in replies:
+                self.assertEqual(reply[:3], b"\x00\x00\x00", engines)
+                source, _ = split_socks_address(reply[3:])
+                self.assertEqual(source, destination, engines)
+            self.assertEqual(sorted(reply[3 + len(destination):] for reply in replies), sorted(sent), engines)
+            self.assertEqual(nodes[1].stats["datagrams"], 2 * len(sent), engines)
+
+    def test_domain_destination_resolved_at_exit(self):
+        for engine in NODE_ENGINES:
+            nodes = start_test_chain(self.chain, (engine,) * 3)
+            _, client = self.associate(nodes[0])
+            client.send(b"\x00\x00\x00" + socks_address("localhost", self.port) + b"ping")
+            reply = client.recv(65535)
+            source, data = split_socks_address(reply[3:])
+            self.assertEqual(data, b"ping", engine)
+            self.assertIn(parse_socks_address(source), (("127.0.0.1", self.port), ("::1", self.port)), engine)
+            self.assertEqual(nodes[0].dns_cache.stats["misses"], 0, engine)
+
+    def test_association_ends_with_control_connection(self):
+        for engine in NODE_ENGINES:
+            nodes = start_test_chain(self.chain, (engine,) * 3)
+            control, client = self.associate(nodes[0])
+            client.send(b"\x00\x00\x00" + socks_address("127.0.0.1", self.port) + b"ping")
+            self.assertTrue(client.recv(65535).endswith(b"ping"))
+            control.close()
+            # The relay socket closes, so the kernel refuses further datagrams
+            deadline = time.time() + 5
+            closed = False
+            while not closed and time.time() < deadline:
+                try:
+                    client.send(b"\x00\x00\x00" + socks_address("127.0.0.1", self.port) + b"ping")
+                    client.settimeout(0.1)
+                    client.recv(65535)
+                except ConnectionRefusedError:
+                    closed = True
+                except socket.timeout:
+                    pass
+            self.assertTrue(closed, engine)
+
+    def test_backed_up_link_drops_instead_of_blocking(self):
+        sender, receiver = self.chain.create_node(), self.chain.create_node()
+        near, far = socket.socketpair()
+        link = LinkDatagrams(near, HopCodec(sender, receiver))
+        self.addCleanup(link.close)
+        self.addCleanup(far.close)
+        destination = socks_address("127.0.0.1", self.port)
+        sent = []
+        while not link.dropped:  # Nothing reads the far end, so this would block in sendall
+            sent.append(bytes([len(sent) % 256]) * 60000)
+            link.send([(destination, sent[-1])])
+        self.assertGreaterEqual(len(link.outbound), MUX_HIGH_WATER)
+        # Once the peer reads, every batch queued before the drop arrives in order
+        peer = LinkDatagrams(far, HopCodec(receiver, sender))
+        received = []
+        deadline = time.time() + 10
+        while len(received) < len(sent) - 1 and time.time() < deadline:
+            link.flush()
+            select.select([far], [], [], 0.1)
+            received.extend(data for _, data in peer.receive())
+        self.assertEqual(received, sent[:-1])
+        self.assertFalse(link.writing)
+
+    def tearDown(self):
+        self.echo_sock.close()
+        self.chain.stop()
+
+class TestDeficitRoundRobin(unittest.TestCase):
+    """
+    Tests for the link scheduler.
+    """
+    def drain(self, scheduler: DeficitRoundRobin, count: int) -> List[str]:
+        return [scheduler.pop()[0] for _ in range(count)]
+
+    def test_bytes_shared_evenly_whatever_the_item_size(self):
+        scheduler = DeficitRoundRobin(quantum=1000)
+        for _ in range(100):
+            scheduler.push("bulk", b"", 1000)
+        for _ in range(1000):
+            scheduler.push("small", b"", 100)
+        order = self.drain(scheduler, 330)
+        self.assertEqual(order.count("bulk") * 1000, order.count("small") * 100)
+
+    def test_class_weights(self):
+        scheduler = DeficitRoundRobin(quantum=1000, weights={"interactive": 2, "default": 1})
+        for _ in range(100):
+            scheduler.push("ssh", b"", 500, "interactive")
+            scheduler.push("download", b"", 500)
+        order = self.drain(scheduler, 60)
+        self.assertEqual(order.count("ssh"), 2 * order.count("download"))
+
+    def test_newly_busy_flow_goes_first(self):
+        latency = {traffic_class: LatencySamples() for traffic_class in SCHEDULING_CLASSES}
+        scheduler = DeficitRoundRobin(quantum=16384, latency=latency)
+        for flow in range(8):
+            for _ in range(50):
+                scheduler.push(f"bulk-{flow}", b"", 16384)
+        self.drain(scheduler, 20)
+        scheduler.push("keystroke", b"k", 1, "interactive")
+        self.assertEqual(scheduler.pop(), ("keystroke", b"k"))
+        self.assertEqual(len(scheduler), 8 * 50 - 20)
+        self.assertEqual(latency["interactive"].count, 1)
+        self.assertEqual(latency["default"].count, 20)
+        self.drain(scheduler, len(scheduler))
+        self.assertIsNone(scheduler.pop())
+        self.assertEqual(scheduler.flows, {})
+
+    def test_latency_percentiles(self):
+        samples = LatencySamples(size=100)
+        for i in range(1, 201):
+            samples.add(i / 1000)
+        stats = samples.percentiles()
+        self.assertEqual(stats["samples"], 200)
+        self.assertEqual((stats["p50_ms"], stats["p99_ms"], stats["max_ms"]), (151.0, 200.0, 200.0))
+
+class TestStreamMultiplexing(unittest.TestCase):
+    """
+    Tests for stream multiplexing over one link between asyncio nodes.
+    """
+    def setUp(self):
+        self.chain = ProxyChain()
+
+    def start_nodes(self, window: int = CONFIG["MUX_WINDOW"]) -> List[ProxyNode]:
+        return start_test_chain(self.chain, ("asyncio",) * 3, limit=10 ** 6, max_handlers=2048, mux_window=window)
+
+    async def echo_streams(self, nodes: List[ProxyNode], streams: int, size: int) -> List[bool]:
+        async def echo(reader, writer):
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(echo, "127.0.0.1", 0, backlog=streams)
+        port = server.sockets[0].getsockname()[1]
+        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+
+        async def client(index: int) -> bool:
+            payload = index.to_bytes(4, "big") * (size // 4)
+            reader, writer = await asyncio.open_connection(nodes[0].host, nodes[0].port, ssl=context)
+            try:
+                writer.write(b"\x05\x01\x00")
+                if await reader.readexactly(2) != b"\x05\x00":
+                    return False
+                writer.write(b"\x05\x01\x00\x01" + socket.inet_aton("127.0.0.1") + port.to_bytes(2, "big"))
+                if (await reader.readexactly(10))[:2] != b"\x05\x00":
+                    return False
+                writer.write(payload)
+                return await reader.readexactly(len(payload)) == payload
+            finally:
+                writer.close()
+
+        try:
+            return await asyncio.wait_for(asyncio.gather(*(client(i) for i in range(streams))), timeout=120)
+        finally:
+            server.close()
+
+    def test_thousand_parallel_streams_share_one_link(self):
+        nodes = self.start_nodes()
+        results = asyncio.run(self.echo_streams(nodes, 1000, 4096))
+        self.assertEqual(results.count(True), 1000)
+        for node in nodes[:-1]:
+            self.assertEqual(node.async_engine.mux_stats, {"links": 1, "streams": 1000})
+            self.assertGreaterEqual(node.scheduling["default"].count, 1000)  # Every stream's data went through it
+
+    def test_small_window_bulk_transfer(self):
+        nodes = self.start_nodes(window=16384)
+        self.assertEqual(asyncio.run(self.echo_streams(nodes, 4, 1024 * 1024)), [True] * 4)
+
+    def test_link_reopened_after_failure(self):
+        nodes = self.start_nodes()
+        self.assertEqual(asyncio.run(self.echo_streams(nodes, 2, 4096)), [True, True])
+        engine = nodes[0].async_engine
+        engine.loop.call_soon_threadsafe(engine.link.close)
+        time.sleep(0.2)
+        self.assertEqual(asyncio.run(self.echo_streams(nodes, 2, 4096)), [True, True])
+        self.assertEqual(engine.mux_stats["links"], 2)
+
+    def tearDown(self):
+        self.chain.stop()
+
+class TestChainRuntime(unittest.TestCase):
+    """
+    Tests for hosting a whole chain on one shared event loop.
+    """
+    def setUp(self):
+        self.chain = ProxyChain()
+        self.chain.config["runtime"] = "shared"
+        self.listener = echo_server()
+
+    def test_chain_on_one_loop_with_in_process_hops(self):
+        threads = set(threading.enumerate())
+        for engine in ("threaded", "asyncio", "threaded", "asyncio", "threaded"):
+            node = self.chain.create_node(engine)
+            node.rate_limit = 1000
+            node.client_limits.limit = node.destination_limits.limit = 1000
+            node.bandwidth = ShapingClass(None)
+            self.chain.nodes.append(node)
+        self.chain.start_nodes()
+        self.addCleanup(self.chain.runtime.stop)
+        self.addCleanup(lambda: [node.stop() for node in self.chain.nodes])
+        # Earlier tests' health checks may exit meanwhile, so only new threads count
+        self.assertEqual(set(threading.enumerate()) - threads, {self.chain.runtime.thread})
+        self.assertEqual({node.async_engine.loop for node in self.chain.nodes}, {self.chain.runtime.loop})
+        payload = os.urandom(512 * 1024)
+        request = b"\x05\x01\x00\x01" + socket.inet_aton("127.0.0.1") + self.listener.getsockname()[1].to_bytes(2, "big")
+        for _ in range(3):
+            with open_socks_client(self.chain.nodes[0].host, self.chain.nodes[0].port) as client:
+                client.sendall(request)
+                self.assertEqual(recv_exactly(client, 10)[:2], b"\x05\x00")
+                client.sendall(payload)
+                self.assertEqual(recv_exactly(client, len(payload)), payload)
+        for node in self.chain.nodes:
+            self.assertEqual(node.stats["requests"], 3)
+            self.assertEqual(node.async_engine.mux_stats["links"], 0)
+
+    def test_restarted_node_still_health_checked(self):
+        self.chain.config["health_check_interval"] = 0.2
+        for _ in range(2):
+            self.chain.nodes.append(self.chain.create_node("asyncio"))
+        self.chain.start_nodes()
+        self.addCleanup(self.chain.runtime.stop)
+        self.addCleanup(lambda: [node.stop() for node in self.chain.nodes])
+        node = self.chain.nodes[1]
+        node.restart()
+        requests = node.stats["requests"]
+        time.sleep(1)
+        self.assertGreater(node.stats["requests"], requests)  # Only the runtime's health check greets it
+
+    def test_stopping_one_node_leaves_others_serving(self):
+        for _ in range(2):
+            node = self.chain.create_node("asyncio")
+            self.chain.nodes.append(node)
+        self.chain.start_nodes()
+        self.addCleanup(self.chain.runtime.stop)
+        self.addCleanup(lambda: [node.stop() for node in self.chain.nodes])
+        self.chain.nodes[1].stop()
+        with open_socks_client(self.chain.nodes[0].host, self.chain.nodes[0].port) as client:
+            client.sendall(b"\x05\x01\x00\x01" + socket.inet_aton("127.0.0.1") + self.listener.getsockname()[1].to_bytes(2, "big"))
+            self.assertEqual(recv_exactly(client, 10)[:2], b"\x05\x01")
+
+    def tearDown(self):
+        self.listener.close()
+        self.chain.stop()
+
+class TestAsyncNodeEngine(unittest.TestCase):
+    """
+    Unit tests for the asyncio node data plane.
+    """
+    def setUp(self):
+        self.chain = ProxyChain()
+        self.node = self.chain.create_node("asyncio")
+        self.node.start()
+
+    def test_socks5_greeting(self):
+        with open_socks_client(self.node.host, self.node.port) as client:
+            client.sendall(b"\x05\x02\x00\x01" + socket.inet_aton("127.0.0.1") + (80).to_bytes(2, "big"))
+            self.assertEqual(client.recv(2), b"\x05\x07")
+
+    def test_many_connections_single_thread(self):
+        clients = [open_socks_client(self.node.host, self.node.port)]  # Starts the shared timer wheel thread
+        threads = set(threading.enumerate())
+        clients += [open_socks_client(self.node.host, self.node.port) for _ in range(49)]
+        # Earlier tests' health checks may exit meanwhile, so only new threads count
+        self.assertEqual(set(threading.enumerate()) - threads, set())
+        for client in clients:
+            client.close()
+
+    def test_stop_closes_listener(self):
+        self.node.stop()
+        with self.assertRaises(OSError):
+            open_socks_client(self.node.host, self.node.port, timeout=1)
+
+    def tearDown(self):
+        self.node.stop()
+        self.chain.stop()
+
 def main():
     """
     Main entry point for the 99Proxys application.
@@ -2560,8 +10767,12 @@ def main():
     logging.info("Starting 99Proxys v5.0.0")
     
     try:
+        if os.getenv("BENCHMARK"):
+            run_benchmarks(os.getenv("BENCHMARK"))
+            return
         create_documentation()
         chain = ProxyChain()
+        flask_app.config['PROXY_CHAIN'] = chain  # Reported by /status
         threading.Thread(
             target=lambda: socketio.run(
                 flask_app,